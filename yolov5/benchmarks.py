@@ -23,6 +23,9 @@ Requirements:
 
 Usage:
     $ python benchmarks.py --weights yolov5s.pt --img 640
+    $ python benchmarks.py --weights yolov5s.pt --img 640 --nms  # per-image vs batched NMS
+    $ python benchmarks.py --img 640 --hsv  # exact vs fast augment_hsv()
+    $ python benchmarks.py --img 640 --batch-size 16 --targets  # ComputeLoss target assignment
 """
 
 import argparse
@@ -31,7 +34,9 @@ import sys
 import time
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import torch
 
 FILE = Path(__file__).resolve()
 ROOT = FILE.parents[0]  # YOLOv5 root directory
@@ -41,10 +46,12 @@ if str(ROOT) not in sys.path:
 
 import export
 from models.experimental import attempt_load
-from models.yolo import SegmentationModel
+from models.yolo import Model, SegmentationModel
 from segment.val import run as val_seg
 from utils import notebook_init
-from utils.general import LOGGER, check_yaml, file_size, print_args
+from utils.augmentations import augment_hsv, letterbox
+from utils.general import LOGGER, Profile, check_yaml, cv2, file_size, non_max_suppression, print_args, yaml_load
+from utils.loss import ComputeLoss
 from utils.torch_utils import select_device
 from val import run as val_det
 
@@ -218,6 +225,183 @@ def test(
     return py
 
 
+def run_nms(
+    weights=ROOT / "yolov5s.pt",  # weights path
+    imgsz=640,  # inference size (pixels)
+    batch_sizes=(1, 8, 32, 64),  # batch sizes
+    device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
+    conf_thres=0.001,  # confidence threshold
+    iou_thres=0.6,  # NMS IoU threshold
+    max_det=300,  # maximum detections per image
+    n=10,  # timed iterations
+):
+    """
+    Benchmark per-image vs batched `non_max_suppression()` on YOLOv5 outputs at several batch sizes.
+
+    Batches are built by repeating the images in data/images, and NMS uses val.py defaults (multi-label, conf 0.001).
+
+    Args:
+        weights (Path | str): Path to the model weights file (default: ROOT / "yolov5s.pt").
+        imgsz (int): Inference size in pixels (default: 640).
+        batch_sizes (tuple[int]): Batch sizes to benchmark (default: (1, 8, 32, 64)).
+        device (str): CUDA device, e.g., '0' or '0,1,2,3' or 'cpu' (default: "").
+        conf_thres (float): Confidence threshold (default: 0.001).
+        iou_thres (float): NMS IoU threshold (default: 0.6).
+        max_det (int): Maximum detections per image (default: 300).
+        n (int): Number of timed NMS iterations per batch size (default: 10).
+
+    Returns:
+        pd.DataFrame: Loop and batched NMS times in ms per batch and the resulting speedup for each batch size.
+
+    Examples:
+        ```python
+        $ python benchmarks.py --weights yolov5s.pt --img 640 --nms
+        ```
+    """
+    device = select_device(device)
+    model = attempt_load(weights, device=device)
+    ims = [letterbox(cv2.imread(str(f)), imgsz, auto=False)[0] for f in sorted((ROOT / "data/images").glob("*.jpg"))]
+    y = []
+    for bs in batch_sizes:
+        im = np.stack([ims[i % len(ims)] for i in range(bs)])[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BCHW
+        im = torch.from_numpy(np.ascontiguousarray(im)).to(device).float() / 255
+        with torch.no_grad():
+            pred = model(im)[0]
+        t = []
+        for batched in False, True:
+            non_max_suppression(pred, conf_thres, iou_thres, multi_label=True, max_det=max_det, batched=batched)
+            dt = Profile(device=device)
+            for _ in range(n):
+                with dt:
+                    non_max_suppression(pred, conf_thres, iou_thres, multi_label=True, max_det=max_det, batched=batched)
+            t.append(dt.t / n * 1e3)  # ms per batch
+        y.append([bs, round(t[0], 2), round(t[1], 2), round(t[0] / t[1], 2)])
+
+    # Print results
+    py = pd.DataFrame(y, columns=["Batch size", "Loop NMS (ms)", "Batched NMS (ms)", "Speedup"])
+    LOGGER.info(f"\nNMS benchmarks complete for {weights} at --img {imgsz} on {device}")
+    LOGGER.info(str(py))
+    return py
+
+
+def run_hsv(
+    imgsz=640,  # image size (pixels)
+    gains=(0.015, 0.7, 0.4),  # hue, saturation, value gains of hyp.scratch-low.yaml
+    n=100,  # timed iterations per image
+):
+    """
+    Benchmark exact vs fast (fitted color matrix) `augment_hsv()` per image, and the similarity of their outputs.
+
+    Both are applied with the same random gains to the images in data/images resized to `imgsz` x `imgsz`. Similarity is
+    the mean absolute difference of fast to exact outputs, reported next to the mean change made by the augmentation.
+
+    Args:
+        imgsz (int): Image size in pixels (default: 640).
+        gains (tuple[float]): Hue, saturation and value gains (default: (0.015, 0.7, 0.4)).
+        n (int): Number of timed iterations per image (default: 100).
+
+    Returns:
+        pd.DataFrame: Exact and fast times in ms per image, speedup, mean absolute error and augmentation magnitude.
+
+    Examples:
+        ```python
+        $ python benchmarks.py --img 640 --hsv
+        ```
+    """
+    y = []
+    for f in sorted((ROOT / "data/images").glob("*.jpg")):
+        im = cv2.resize(cv2.imread(str(f)), (imgsz, imgsz))
+        t = []
+        for fast in False, True:
+            dt = Profile()
+            for _ in range(n):
+                x = im.copy()
+                with dt:
+                    augment_hsv(x, *gains, fast=fast)
+            t.append(dt.t / n * 1e3)  # ms per image
+        err, change = [], []
+        for seed in range(n):
+            x = []
+            for fast in False, True:
+                np.random.seed(seed)
+                x.append(im.copy())
+                augment_hsv(x[-1], *gains, fast=fast)
+            a, b = (x.astype(np.float32) for x in x)  # exact, fast
+            err.append(np.abs(b - a).mean())
+            change.append(np.abs(a - im).mean())
+        e, m = round(float(np.mean(err)), 2), round(float(np.mean(change)), 2)
+        y.append([f.name, round(t[0], 3), round(t[1], 3), round(t[0] / t[1], 2), e, m])
+
+    # Print results
+    c = ["Image", "Exact (ms)", "Fast (ms)", "Speedup", "Fast error (MAE)", "Augmentation (MAE)"]
+    py = pd.DataFrame(y, columns=c)
+    LOGGER.info(f"\naugment_hsv() benchmarks complete at --img {imgsz} with gains {gains}")
+    LOGGER.info(str(py))
+    return py
+
+
+def run_targets(
+    cfg=ROOT / "models/yolov5s.yaml",  # model.yaml path
+    imgsz=640,  # training size (pixels)
+    batch_size=16,  # batch size
+    targets=(100, 1000, 10000),  # targets per batch
+    device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
+    n=20,  # timed iterations
+):
+    """
+    Benchmark `ComputeLoss.build_targets()` target assignment and the full loss at several numbers of targets per batch.
+
+    Targets are uniformly distributed over the batch with random classes, centers and sizes up to 0.3 of the image, and
+    predictions are random outputs of the `cfg` model at `imgsz`, so the model itself is not run.
+
+    Args:
+        cfg (Path | str): Path to the model.yaml file (default: ROOT / "models/yolov5s.yaml").
+        imgsz (int): Training size in pixels (default: 640).
+        batch_size (int): Batch size (default: 16).
+        targets (tuple[int]): Numbers of targets per batch to benchmark (default: (100, 1000, 10000)).
+        device (str): CUDA device, e.g., '0' or '0,1,2,3' or 'cpu' (default: "").
+        n (int): Number of timed iterations per number of targets (default: 20).
+
+    Returns:
+        pd.DataFrame: Assigned targets, build_targets() and loss times in ms per batch, and the build_targets() share.
+
+    Examples:
+        ```python
+        $ python benchmarks.py --img 640 --batch-size 16 --targets
+        ```
+    """
+    device = select_device(device)
+    model = Model(cfg).to(device)
+    model.hyp = yaml_load(ROOT / "data/hyps/hyp.scratch-low.yaml")
+    compute_loss = ComputeLoss(model)
+    m = model.model[-1]  # Detect()
+    p = [torch.randn(batch_size, m.na, imgsz // s, imgsz // s, m.no, device=device) for s in m.stride.int().tolist()]
+    y = []
+    for nt in targets:
+        b = torch.randint(0, batch_size, (nt, 1)).sort(0)[0]  # image indices, sorted as by the dataloader
+        x = torch.cat((b, torch.randint(0, m.nc, (nt, 1)), torch.rand(nt, 2), torch.rand(nt, 2) * 0.3 + 0.001), 1)
+        x = x.float().to(device)
+        t = []
+        for f in compute_loss.build_targets, compute_loss.__call__:
+            f(p, x)  # warmup
+            dt = Profile(device=device)
+            for _ in range(n):
+                with dt:
+                    f(p, x)
+            t.append(dt.t / n * 1e3)  # ms per batch
+        matches = sum(len(c) for c in compute_loss.build_targets(p, x)[0])
+        y.append([nt, matches, round(t[0], 2), round(t[1], 2), f"{t[0] / t[1]:.0%}"])
+
+    # Print results
+    c = ["Targets", "Assigned", "build_targets (ms)", "Loss (ms)", "build_targets share"]
+    py = pd.DataFrame(y, columns=c)
+    LOGGER.info(
+        f"\nTarget assignment benchmarks complete for {Path(cfg).name} at --img {imgsz} --batch-size {batch_size}"
+    )
+    LOGGER.info(str(py))
+    return py
+
+
 def parse_opt():
     """
     Parses command-line arguments for YOLOv5 model inference configuration.
@@ -233,6 +417,9 @@ def parse_opt():
         pt_only (bool): Test PyTorch only. This is a flag and defaults to False.
         hard_fail (bool | str): Throw an error on benchmark failure. Can be a boolean or a string representing a minimum
             metric floor, e.g., '0.29'. Defaults to False.
+        nms (bool): Benchmark per-image vs batched NMS only. This is a flag and defaults to False.
+        hsv (bool): Benchmark exact vs fast augment_hsv() only. This is a flag and defaults to False.
+        targets (bool): Benchmark ComputeLoss target assignment only. This is a flag and defaults to False.
 
     Returns:
         argparse.Namespace: Parsed command-line arguments encapsulated in an argparse Namespace object.
@@ -251,6 +438,9 @@ def parse_opt():
     parser.add_argument("--test", action="store_true", help="test exports only")
     parser.add_argument("--pt-only", action="store_true", help="test PyTorch only")
     parser.add_argument("--hard-fail", nargs="?", const=True, default=False, help="Exception on error or < min metric")
+    parser.add_argument("--nms", action="store_true", help="benchmark per-image vs batched NMS only")
+    parser.add_argument("--hsv", action="store_true", help="benchmark exact vs fast augment_hsv() only")
+    parser.add_argument("--targets", action="store_true", help="benchmark ComputeLoss target assignment only")
     opt = parser.parse_args()
     opt.data = check_yaml(opt.data)  # check YAML
     print_args(vars(opt))
@@ -286,7 +476,15 @@ def main(opt):
         $ python benchmarks.py --weights yolov5s.pt --img 640
         ```
     """
-    test(**vars(opt)) if opt.test else run(**vars(opt))
+    if opt.nms:
+        run_nms(opt.weights, opt.imgsz, device=opt.device)
+    elif opt.hsv:
+        run_hsv(opt.imgsz)
+    elif opt.targets:
+        run_targets(imgsz=opt.imgsz, batch_size=opt.batch_size, device=opt.device)
+    else:
+        kwargs = {k: v for k, v in vars(opt).items() if k not in {"nms", "hsv", "targets"}}  # benchmark-only modes
+        test(**kwargs) if opt.test else run(**kwargs)
 
 
 if __name__ == "__main__":
@@ -48,6 +48,7 @@ from ultralytics.utils.plotting import Annotator
 from models.common import DetectMultiBackend
 from utils.augmentations import classify_transforms
 from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImages, LoadScreenshots, LoadStreams
+from utils.decoders import DECODERS
 from utils.general import (
     LOGGER,
     Profile,
@@ -83,6 +84,7 @@ def run(
     half=False,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
     vid_stride=1,  # video frame-rate stride
+    decoder="opencv",  # image/video decoder: 'opencv', 'pyav', 'turbojpeg', 'pillow' or utils.decoders.Decoder
 ):
     """Conducts YOLOv5 classification inference on diverse input sources and saves results."""
     source = str(source)
@@ -108,12 +110,16 @@ def run(
     bs = 1  # batch_size
     if webcam:
         view_img = check_imshow(warn=True)
-        dataset = LoadStreams(source, img_size=imgsz, transforms=classify_transforms(imgsz[0]), vid_stride=vid_stride)
+        dataset = LoadStreams(
+            source, img_size=imgsz, transforms=classify_transforms(imgsz[0]), vid_stride=vid_stride, decoder=decoder
+        )
         bs = len(dataset)
     elif screenshot:
         dataset = LoadScreenshots(source, img_size=imgsz, stride=stride, auto=pt)
     else:
-        dataset = LoadImages(source, img_size=imgsz, transforms=classify_transforms(imgsz[0]), vid_stride=vid_stride)
+        dataset = LoadImages(
+            source, img_size=imgsz, transforms=classify_transforms(imgsz[0]), vid_stride=vid_stride, decoder=decoder
+        )
     vid_path, vid_writer = [None] * bs, [None] * bs
 
     # Run inference
@@ -197,6 +203,8 @@ def run(
     # Print results
     t = tuple(x.t / seen * 1e3 for x in dt)  # speeds per image
     LOGGER.info(f"Speed: %.1fms pre-process, %.1fms inference, %.1fms NMS per image at shape {(1, 3, *imgsz)}" % t)
+    if hasattr(dataset, "decoder"):
+        LOGGER.info(f"Decode {dataset.decoder}")
     if save_txt or save_img:
         s = f"\n{len(list(save_dir.glob('labels/*.txt')))} labels saved to {save_dir / 'labels'}" if save_txt else ""
         LOGGER.info(f"Results saved to {colorstr('bold', save_dir)}{s}")
@@ -224,6 +232,7 @@ def parse_opt():
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
     parser.add_argument("--vid-stride", type=int, default=1, help="video frame-rate stride")
+    parser.add_argument("--decoder", default="opencv", choices=DECODERS, help="image/video decoder")
     opt = parser.parse_args()
     opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
     print_args(vars(opt))
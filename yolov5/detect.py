@@ -29,12 +29,14 @@ Usage - formats:
 """
 
 import argparse
-import csv
+import contextlib
 import os
 import platform
 import sys
+import time
 from pathlib import Path
 
+import numpy as np
 import torch
 
 FILE = Path(__file__).resolve()
@@ -46,10 +48,13 @@ ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 from ultralytics.utils.plotting import Annotator, colors, save_one_box
 
 from models.common import DetectMultiBackend
+from models.yolo import Detect
 from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImages, LoadScreenshots, LoadStreams
+from utils.decoders import DECODERS
 from utils.general import (
     LOGGER,
     Profile,
+    WriterPool,
     check_file,
     check_img_size,
     check_imshow,
@@ -58,11 +63,12 @@ from utils.general import (
     cv2,
     increment_path,
     non_max_suppression,
+    prefetch,
     print_args,
     scale_boxes,
     strip_optimizer,
-    xyxy2xywh,
 )
+from utils.sinks import SINKS
 from utils.torch_utils import select_device, smart_inference_mode
 
 
@@ -75,11 +81,15 @@ def run(
     conf_thres=0.25,  # confidence threshold
     iou_thres=0.45,  # NMS IOU threshold
     max_det=1000,  # maximum detections per image
+    topk=0,  # maximum NMS candidates per image (0 to disable)
+    topk_cls=0,  # maximum NMS candidates per class (0 to disable)
+    argmax=False,  # decode best class only in Detect() head, PyTorch models only
     device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
     view_img=False,  # show results
     save_txt=False,  # save results to *.txt
     save_format=0,  # save boxes coordinates in YOLO format or Pascal-VOC format (0 for YOLO and 1 for Pascal-VOC)
     save_csv=False,  # save results in CSV format
+    sinks=(),  # extra result sinks: 'csv', 'txt', 'ndjson', 'parquet' or utils.sinks.ResultSink instances
     save_conf=False,  # save confidences in --save-txt labels
     save_crop=False,  # save cropped prediction boxes
     nosave=False,  # do not save images/videos
@@ -97,6 +107,11 @@ def run(
     half=False,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
     vid_stride=1,  # video frame-rate stride
+    stream_buffer=1,  # frames buffered per stream
+    stream_drop="oldest",  # frame dropped when a stream buffer is full, 'oldest' or 'newest'
+    pipeline=0,  # pipelined pre-process/inference/postprocess with this many writer threads (0 to disable)
+    decoder="opencv",  # image/video decoder: 'opencv', 'pyav', 'turbojpeg', 'pillow' or utils.decoders.Decoder
+    reduced_decode=False,  # decode large JPEGs at reduced resolution, results scaled to the reduced images
 ):
     """
     Runs YOLOv5 detection inference on various sources like images, videos, directories, streams, etc.
@@ -110,11 +125,18 @@ def run(
         conf_thres (float): Confidence threshold for detections. Default is 0.25.
         iou_thres (float): Intersection Over Union (IOU) threshold for non-max suppression. Default is 0.45.
         max_det (int): Maximum number of detections per image. Default is 1000.
+        topk (int): Maximum NMS candidates per image, selected by objectness before class scoring. Default is 0
+            (disabled).
+        topk_cls (int): Maximum NMS candidates per class. Default is 0 (disabled).
+        argmax (bool): If True, the Detect() head decodes only the best class per anchor instead of all class scores,
+            reducing the data passed to NMS. PyTorch models only. Default is False.
         device (str): CUDA device identifier (e.g., '0' or '0,1,2,3') or 'cpu'. Default is an empty string, which uses the
             best available device.
         view_img (bool): If True, display inference results using OpenCV. Default is False.
         save_txt (bool): If True, save results in a text file. Default is False.
         save_csv (bool): If True, save results in a CSV file. Default is False.
+        sinks (tuple[str | ResultSink]): Additional buffered result sinks, by name ('csv', 'txt', 'ndjson', 'parquet')
+            or as `utils.sinks.ResultSink` instances, closed at the end of the run. Default is ().
         save_conf (bool): If True, include confidence scores in the saved results. Default is False.
         save_crop (bool): If True, save cropped prediction boxes. Default is False.
         nosave (bool): If True, do not save inference images or videos. Default is False.
@@ -133,6 +155,15 @@ def run(
         half (bool): If True, use FP16 half-precision inference. Default is False.
         dnn (bool): If True, use OpenCV DNN backend for ONNX inference. Default is False.
         vid_stride (int): Stride for processing video frames, to skip frames between processing. Default is 1.
+        stream_buffer (int): Number of letterboxed frames buffered per stream. Default is 1 (latest frame only).
+        stream_drop (str): Frame to drop when a stream buffer is full, 'oldest' or 'newest'. Default is 'oldest'.
+        pipeline (int): If > 0, pre-process in a producer thread and postprocess, draw and write results on this many
+            writer threads, connected to inference by bounded queues. Frames of one source keep their order. Default
+            is 0 (sequential).
+        decoder (str | Decoder): Image and video decoding backend for file and stream sources, one of 'opencv', 'pyav',
+            'turbojpeg', 'pillow' or a `utils.decoders.Decoder` instance. Default is 'opencv'.
+        reduced_decode (bool): If True, decode JPEG images at least twice `imgsz` at a reduced DCT scale. Saved images
+            and pixel coordinates refer to the reduced images, normalized *.txt labels are unaffected. Default is False.
 
     Returns:
         None
@@ -156,6 +187,7 @@ def run(
     screenshot = source.lower().startswith("screen")
     if is_url and is_file:
         source = check_file(source)  # download
+    assert not (view_img and pipeline), "--view-img is not supported with --pipeline, OpenCV HighGUI is not thread-safe"
 
     # Directories
     save_dir = increment_path(Path(project) / name, exist_ok=exist_ok)  # increment run
@@ -166,154 +198,199 @@ def run(
     model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
     stride, names, pt = model.stride, model.names, model.pt
     imgsz = check_img_size(imgsz, s=stride)  # check image size
+    if argmax:
+        assert pt, "--argmax is only supported for PyTorch models"
+        for m in model.model.modules():
+            if type(m) is Detect:
+                m.argmax = True
 
     # Dataloader
     bs = 1  # batch_size
     if webcam:
-        view_img = check_imshow(warn=True)
-        dataset = LoadStreams(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        view_img = not pipeline and check_imshow(warn=True)  # imshow() runs on writer threads with --pipeline
+        dataset = LoadStreams(
+            source,
+            img_size=imgsz,
+            stride=stride,
+            auto=pt,
+            vid_stride=vid_stride,
+            buffer=stream_buffer,
+            drop=stream_drop,
+            device=model.device,
+            decoder=decoder,
+            waitkey=not pipeline,  # iterated on a producer thread with --pipeline
+        )
         bs = len(dataset)
     elif screenshot:
         dataset = LoadScreenshots(source, img_size=imgsz, stride=stride, auto=pt)
     else:
-        dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        dataset = LoadImages(
+            source,
+            img_size=imgsz,
+            stride=stride,
+            auto=pt,
+            vid_stride=vid_stride,
+            decoder=decoder,
+            reduced=reduced_decode,
+        )
     vid_path, vid_writer = [None] * bs, [None] * bs
 
-    # Run inference
-    model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
-    seen, windows, dt = 0, [], (Profile(device=device), Profile(device=device), Profile(device=device))
-    for path, im, im0s, vid_cap, s in dataset:
-        with dt[0]:
-            im = torch.from_numpy(im).to(model.device)
-            im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
-            im /= 255  # 0 - 255 to 0.0 - 1.0
-            if len(im.shape) == 3:
-                im = im[None]  # expand for batch dim
-            if model.xml and im.shape[0] > 1:
-                ims = torch.chunk(im, im.shape[0], 0)
-
-        # Inference
-        with dt[1]:
-            visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
-            if model.xml and im.shape[0] > 1:
-                pred = None
-                for image in ims:
-                    if pred is None:
-                        pred = model(image, augment=augment, visualize=visualize).unsqueeze(0)
-                    else:
-                        pred = torch.cat((pred, model(image, augment=augment, visualize=visualize).unsqueeze(0)), dim=0)
-                pred = [pred, None]
-            else:
-                pred = model(im, augment=augment, visualize=visualize)
-        # NMS
-        with dt[2]:
-            pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
-
-        # Second-stage classifier (optional)
-        # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
-
-        # Define the path for the CSV file
-        csv_path = save_dir / "predictions.csv"
-
-        # Create or append to the CSV file
-        def write_to_csv(image_name, prediction, confidence):
-            """Writes prediction data for an image to a CSV file, appending if the file exists."""
-            data = {"Image Name": image_name, "Prediction": prediction, "Confidence": confidence}
-            file_exists = os.path.isfile(csv_path)
-            with open(csv_path, mode="a", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=data.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(data)
-
-        # Process predictions
-        for i, det in enumerate(pred):  # per image
-            seen += 1
-            if webcam:  # batch_size >= 1
-                p, im0, frame = path[i], im0s[i].copy(), dataset.count
-                s += f"{i}: "
-            else:
-                p, im0, frame = path, im0s.copy(), getattr(dataset, "frame", 0)
-
-            p = Path(p)  # to Path
-            save_path = str(save_dir / p.name)  # im.jpg
-            txt_path = str(save_dir / "labels" / p.stem) + ("" if dataset.mode == "image" else f"_{frame}")  # im.txt
-            s += "{:g}x{:g} ".format(*im.shape[2:])  # print string
-            gn = torch.tensor(im0.shape)[[1, 0, 1, 0]]  # normalization gain whwh
-            imc = im0.copy() if save_crop else im0  # for save_crop
-            annotator = Annotator(im0, line_width=line_thickness, example=str(names))
-            if len(det):
-                # Rescale boxes from img_size to im0 size
-                det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
-
-                # Print results
-                for c in det[:, 5].unique():
-                    n = (det[:, 5] == c).sum()  # detections per class
-                    s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "  # add to string
-
-                # Write results
+    # Result sinks
+    sinks = dict.fromkeys([*(["txt"] if save_txt else []), *(["csv"] if save_csv else []), *sinks])  # dedupe, ordered
+    sinks = [SINKS[x](save_dir, names, save_conf, save_format) if isinstance(x, str) else x for x in sinks]
+
+    def preprocess():
+        """Yields preprocessed batches with the dataset state (mode, frame, video fps/size) captured at read time."""
+        scale = torch.tensor(255, dtype=torch.half if model.fp16 else torch.float, device=model.device)
+        for path, im, im0s, vid_cap, s in dataset:
+            with dt[0]:
+                im = torch.from_numpy(im).to(model.device) if isinstance(im, np.ndarray) else im  # LoadStreams tensor
+                im = torch.div(im, scale)  # uint8 to fp16/32 and 0 - 255 to 0.0 - 1.0 in one op
+                if len(im.shape) == 3:
+                    im = im[None]  # expand for batch dim
+            frame = dataset.count if webcam else getattr(dataset, "frame", 0)
+            vid = vid_cap and (
+                vid_cap.get(cv2.CAP_PROP_FPS),
+                int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            )
+            yield path, im, im0s, s, dataset.mode, frame, vid
+
+    @smart_inference_mode()  # also on writer threads, inference mode is thread-local
+    def postprocess(i, det, p, im0, shape, mode, frame, vid, s=""):
+        """Rescales, annotates and saves the detections of image `i` in a batch, returning its print string."""
+        p = Path(p)  # to Path
+        save_path = str(save_dir / p.name)  # im.jpg
+        s += "{:g}x{:g} ".format(*shape[2:])  # print string
+        imc = im0.copy() if save_crop else im0  # for save_crop
+        annotator = Annotator(im0, line_width=line_thickness, example=str(names))
+        if len(det):
+            # Rescale boxes from img_size to im0 size
+            det[:, :4] = scale_boxes(shape[2:], det[:, :4], im0.shape).round()
+
+            # Print results
+            for c in det[:, 5].unique():
+                n = (det[:, 5] == c).sum()  # detections per class
+                s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "  # add to string
+
+            # Draw results
+            if save_img or save_crop or view_img:
                 for *xyxy, conf, cls in reversed(det):
                     c = int(cls)  # integer class
-                    label = names[c] if hide_conf else f"{names[c]}"
-                    confidence = float(conf)
-                    confidence_str = f"{confidence:.2f}"
-
-                    if save_csv:
-                        write_to_csv(p.name, label, confidence_str)
-
-                    if save_txt:  # Write to file
-                        if save_format == 0:
-                            coords = (
-                                (xyxy2xywh(torch.tensor(xyxy).view(1, 4)) / gn).view(-1).tolist()
-                            )  # normalized xywh
-                        else:
-                            coords = (torch.tensor(xyxy).view(1, 4) / gn).view(-1).tolist()  # xyxy
-                        line = (cls, *coords, conf) if save_conf else (cls, *coords)  # label format
-                        with open(f"{txt_path}.txt", "a") as f:
-                            f.write(("%g " * len(line)).rstrip() % line + "\n")
-
-                    if save_img or save_crop or view_img:  # Add bbox to image
-                        c = int(cls)  # integer class
-                        label = None if hide_labels else (names[c] if hide_conf else f"{names[c]} {conf:.2f}")
-                        annotator.box_label(xyxy, label, color=colors(c, True))
+                    label = None if hide_labels else (names[c] if hide_conf else f"{names[c]} {conf:.2f}")
+                    annotator.box_label(xyxy, label, color=colors(c, True))  # Add bbox to image
                     if save_crop:
                         save_one_box(xyxy, imc, file=save_dir / "crops" / names[c] / f"{p.stem}.jpg", BGR=True)
 
-            # Stream results
-            im0 = annotator.result()
-            if view_img:
-                if platform.system() == "Linux" and p not in windows:
-                    windows.append(p)
-                    cv2.namedWindow(str(p), cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)  # allow window resize (Linux)
-                    cv2.resizeWindow(str(p), im0.shape[1], im0.shape[0])
-                cv2.imshow(str(p), im0)
-                cv2.waitKey(1)  # 1 millisecond
-
-            # Save results (image with detections)
-            if save_img:
-                if dataset.mode == "image":
-                    cv2.imwrite(save_path, im0)
-                else:  # 'video' or 'stream'
-                    if vid_path[i] != save_path:  # new video
-                        vid_path[i] = save_path
-                        if isinstance(vid_writer[i], cv2.VideoWriter):
-                            vid_writer[i].release()  # release previous video writer
-                        if vid_cap:  # video
-                            fps = vid_cap.get(cv2.CAP_PROP_FPS)
-                            w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                            h = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                        else:  # stream
-                            fps, w, h = 30, im0.shape[1], im0.shape[0]
-                        save_path = str(Path(save_path).with_suffix(".mp4"))  # force *.mp4 suffix on results videos
-                        vid_writer[i] = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
-                    vid_writer[i].write(im0)
-
-        # Print time (inference-only)
-        LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{dt[1].dt * 1e3:.1f}ms")
+        # Write results
+        for sink in sinks:
+            sink.write(p, det, im0.shape, None if mode == "image" else frame)
+
+        # Stream results
+        im0 = annotator.result()
+        if view_img:
+            if platform.system() == "Linux" and p not in windows:
+                windows.append(p)
+                cv2.namedWindow(str(p), cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)  # allow window resize (Linux)
+                cv2.resizeWindow(str(p), im0.shape[1], im0.shape[0])
+            cv2.imshow(str(p), im0)
+            cv2.waitKey(1)  # 1 millisecond
+
+        # Save results (image with detections)
+        if save_img:
+            if mode == "image":
+                cv2.imwrite(save_path, im0)
+            else:  # 'video' or 'stream'
+                if vid_path[i] != save_path:  # new video
+                    vid_path[i] = save_path
+                    if isinstance(vid_writer[i], cv2.VideoWriter):
+                        vid_writer[i].release()  # release previous video writer
+                    fps, w, h = vid or (30, im0.shape[1], im0.shape[0])  # video or stream
+                    save_path = str(Path(save_path).with_suffix(".mp4"))  # force *.mp4 suffix on results videos
+                    vid_writer[i] = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+                vid_writer[i].write(im0)
+        return s
+
+    def postprocess_log(t, *args):
+        """Runs postprocess() on a writer thread and logs its print string with the inference time `t` of its batch."""
+        s = postprocess(*args)
+        LOGGER.info(f"{s}{'' if len(args[1]) else '(no detections), '}{t * 1e3:.1f}ms")
+
+    # Run inference
+    model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
+    seen, windows = 0, []
+    dt = (Profile(device=None if pipeline else device), Profile(device=device), Profile(device=device))
+    batches, writers, t0 = preprocess(), None, time.time()
+    if pipeline:  # pre-process in a producer thread and postprocess on writer threads, connected by bounded queues
+        batches, writers = prefetch(batches, maxsize=2), WriterPool(pipeline, maxsize=2)
+    try:
+        for path, im, im0s, s, mode, frame, vid in batches:
+            # Inference
+            with dt[1]:
+                visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
+                if model.xml and im.shape[0] > 1:
+                    pred = None
+                    for image in torch.chunk(im, im.shape[0], 0):
+                        if pred is None:
+                            pred = model(image, augment=augment, visualize=visualize).unsqueeze(0)
+                        else:
+                            pred = torch.cat(
+                                (pred, model(image, augment=augment, visualize=visualize).unsqueeze(0)), dim=0
+                            )
+                    pred = [pred, None]
+                else:
+                    pred = model(im, augment=augment, visualize=visualize)
+            # NMS
+            with dt[2]:
+                pred = non_max_suppression(
+                    pred,
+                    conf_thres,
+                    iou_thres,
+                    classes,
+                    agnostic_nms,
+                    max_det=max_det,
+                    topk=topk,
+                    topk_cls=topk_cls,
+                    argmax=argmax,
+                )
+
+            # Second-stage classifier (optional)
+            # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
+
+            # Process predictions
+            for i, det in enumerate(pred):  # per image
+                seen += 1
+                if webcam:  # batch_size >= 1
+                    p, im0, si = path[i], im0s[i].copy(), f"{i}: "
+                else:
+                    p, im0, si = path, im0s.copy(), ""
+                if writers:  # frames of one source run in order on one writer, independent images are spread out
+                    k = i if mode != "image" else seen
+                    writers.submit(k, postprocess_log, dt[1].dt, i, det, p, im0, im.shape, mode, frame, vid, s + si)
+                else:
+                    s = postprocess(i, det, p, im0, im.shape, mode, frame, vid, s + si)
+
+            # Print time (inference-only)
+            if not writers:
+                LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{dt[1].dt * 1e3:.1f}ms")
+    finally:
+        with contextlib.ExitStack() as stack:  # also on errors and Ctrl-C, finishing queued results
+            for sink in sinks:
+                stack.push(sink)  # closed after the writers, even if closing them raises
+            if writers:
+                writers.close()
 
     # Print results
+    if writers:
+        u = [x.t / (time.time() - t0) * 100 for x in (*dt, *writers.dt)]  # busy time per stage/writer thread (%)
+        LOGGER.info(
+            "Pipeline utilization: %.0f%% pre-process, %.0f%% inference, %.0f%% NMS, %.0f%% postprocess (%g writers)"
+            % (*u[:3], sum(u[3:]) / pipeline, pipeline)
+        )
     t = tuple(x.t / seen * 1e3 for x in dt)  # speeds per image
     LOGGER.info(f"Speed: %.1fms pre-process, %.1fms inference, %.1fms NMS per image at shape {(1, 3, *imgsz)}" % t)
+    if hasattr(dataset, "decoder"):
+        LOGGER.info(f"Decode {dataset.decoder}")
     if save_txt or save_img:
         s = f"\n{len(list(save_dir.glob('labels/*.txt')))} labels saved to {save_dir / 'labels'}" if save_txt else ""
         LOGGER.info(f"Results saved to {colorstr('bold', save_dir)}{s}")
@@ -333,10 +410,14 @@ def parse_opt():
         --conf-thres (float, optional): Confidence threshold. Defaults to 0.25.
         --iou-thres (float, optional): NMS IoU threshold. Defaults to 0.45.
         --max-det (int, optional): Maximum number of detections per image. Defaults to 1000.
+        --topk (int, optional): Maximum NMS candidates per image by objectness, 0 to disable. Defaults to 0.
+        --topk-cls (int, optional): Maximum NMS candidates per class, 0 to disable. Defaults to 0.
+        --argmax (bool, optional): Flag to decode only the best class per anchor in the Detect() head. Defaults to False.
         --device (str, optional): CUDA device, i.e., '0' or '0,1,2,3' or 'cpu'. Defaults to "".
         --view-img (bool, optional): Flag to display results. Defaults to False.
         --save-txt (bool, optional): Flag to save results to *.txt files. Defaults to False.
         --save-csv (bool, optional): Flag to save results in CSV format. Defaults to False.
+        --sinks (list[str], optional): Additional result sinks, any of 'csv', 'txt', 'ndjson', 'parquet'. Defaults to [].
         --save-conf (bool, optional): Flag to save confidences in labels saved via --save-txt. Defaults to False.
         --save-crop (bool, optional): Flag to save cropped prediction boxes. Defaults to False.
         --nosave (bool, optional): Flag to prevent saving images/videos. Defaults to False.
@@ -355,6 +436,14 @@ def parse_opt():
         --dnn (bool, optional): Flag to use OpenCV DNN for ONNX inference. Defaults to False.
         --vid-stride (int, optional): Video frame-rate stride, determining the number of frames to skip in between
             consecutive frames. Defaults to 1.
+        --stream-buffer (int, optional): Number of frames buffered per stream. Defaults to 1.
+        --stream-drop (str, optional): Frame dropped when a stream buffer is full, 'oldest' or 'newest'. Defaults to
+            'oldest'.
+        --pipeline (int, optional): Number of writer threads for pipelined inference, 0 to run stages sequentially.
+            Defaults to 0.
+        --decoder (str, optional): Image and video decoder, one of 'opencv', 'pyav', 'turbojpeg', 'pillow'. Defaults to
+            'opencv'.
+        --reduced-decode (bool, optional): Flag to decode large JPEGs at reduced resolution. Defaults to False.
 
     Returns:
         argparse.Namespace: Parsed command-line arguments as an argparse.Namespace object.
@@ -373,6 +462,9 @@ def parse_opt():
     parser.add_argument("--conf-thres", type=float, default=0.25, help="confidence threshold")
     parser.add_argument("--iou-thres", type=float, default=0.45, help="NMS IoU threshold")
     parser.add_argument("--max-det", type=int, default=1000, help="maximum detections per image")
+    parser.add_argument("--topk", type=int, default=0, help="maximum NMS candidates per image (0 to disable)")
+    parser.add_argument("--topk-cls", type=int, default=0, help="maximum NMS candidates per class (0 to disable)")
+    parser.add_argument("--argmax", action="store_true", help="decode best class only in Detect() head (PyTorch)")
     parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
     parser.add_argument("--view-img", action="store_true", help="show results")
     parser.add_argument("--save-txt", action="store_true", help="save results to *.txt")
@@ -383,6 +475,7 @@ def parse_opt():
         help="whether to save boxes coordinates in YOLO format or Pascal-VOC format when save-txt is True, 0 for YOLO and 1 for Pascal-VOC",
     )
     parser.add_argument("--save-csv", action="store_true", help="save results in CSV format")
+    parser.add_argument("--sinks", nargs="+", default=[], choices=SINKS, help="result sinks: csv txt ndjson parquet")
     parser.add_argument("--save-conf", action="store_true", help="save confidences in --save-txt labels")
     parser.add_argument("--save-crop", action="store_true", help="save cropped prediction boxes")
     parser.add_argument("--nosave", action="store_true", help="do not save images/videos")
@@ -400,6 +493,11 @@ def parse_opt():
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
     parser.add_argument("--vid-stride", type=int, default=1, help="video frame-rate stride")
+    parser.add_argument("--stream-buffer", type=int, default=1, help="frames buffered per stream")
+    parser.add_argument("--stream-drop", default="oldest", choices=("oldest", "newest"), help="frame dropped when full")
+    parser.add_argument("--pipeline", type=int, default=0, help="pipelined inference writer threads (0 to disable)")
+    parser.add_argument("--decoder", default="opencv", choices=DECODERS, help="image/video decoder")
+    parser.add_argument("--reduced-decode", action="store_true", help="decode large JPEGs at reduced resolution")
     opt = parser.parse_args()
     opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
     print_args(vars(opt))
@@ -1300,6 +1300,7 @@ def run(
     topk_all=100,  # TF.js NMS: topk for all classes to keep
     iou_thres=0.45,  # TF.js NMS: IoU threshold
     conf_thres=0.25,  # TF.js NMS: confidence threshold
+    keep_classes=None,  # restrict Detect() head to class indices, i.e. [0] for person-only
 ):
     """
     Exports a YOLOv5 model to specified formats including ONNX, TensorRT, CoreML, and TensorFlow.
@@ -1330,6 +1331,8 @@ def run(
         iou_thres (float): IoU threshold for NMS. Default is 0.45.
         conf_thres (float): Confidence threshold for NMS. Default is 0.25.
         mlmodel (bool): Flag to use *.mlmodel for CoreML export. Default is False.
+        keep_classes (list[int] | None): Class indices to keep in the exported Detect() head, remapping `names`
+            accordingly. Default is None (all classes).
 
     Returns:
         None
@@ -1366,6 +1369,7 @@ def run(
             topk_all=100,
             iou_thres=0.45,
             conf_thres=0.25,
+            keep_classes=None,
         )
         ```
     """
@@ -1382,7 +1386,7 @@ def run(
     if half:
         assert device.type != "cpu" or coreml, "--half only compatible with GPU export, i.e. use --device 0"
         assert not dynamic, "--half not compatible with --dynamic, i.e. use either --half or --dynamic but not both"
-    model = attempt_load(weights, device=device, inplace=True, fuse=True)  # load FP32 model
+    model = attempt_load(weights, device=device, inplace=True, fuse=True, keep_classes=keep_classes)  # load FP32 model
 
     # Checks
     imgsz *= 2 if len(imgsz) == 1 else 1  # expand
@@ -1524,6 +1528,7 @@ def parse_opt(known=False):
     parser.add_argument("--topk-all", type=int, default=100, help="TF.js NMS: topk for all classes to keep")
     parser.add_argument("--iou-thres", type=float, default=0.45, help="TF.js NMS: IoU threshold")
     parser.add_argument("--conf-thres", type=float, default=0.25, help="TF.js NMS: confidence threshold")
+    parser.add_argument("--keep-classes", nargs="+", type=int, help="restrict Detect() head to class indices, i.e. 0")
     parser.add_argument(
         "--include",
         nargs="+",
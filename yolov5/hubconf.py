@@ -13,7 +13,9 @@ Usage:
 import torch
 
 
-def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbose=True, device=None):
+def _create(
+    name, pretrained=True, channels=3, classes=80, autoshape=True, verbose=True, device=None, keep_classes=None
+):
     """
     Creates or loads a YOLOv5 model, with options for pretrained weights and model customization.
 
@@ -26,6 +28,8 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
         verbose (bool, optional): If True, prints detailed information during the model creation/loading process. Defaults to True.
         device (str | torch.device | None, optional): Device to use for model parameters (e.g., 'cpu', 'cuda'). If None, selects
             the best available device. Defaults to None.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         (DetectMultiBackend | AutoShape): The loaded YOLOv5 model, potentially wrapped with AutoShape if specified.
@@ -43,6 +47,9 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
 
         # Load a model with specific input channels and classes
         model = _create('yolov5s', channels=1, classes=10)
+
+        # Load a person-only model, slicing the Detect() head to class 0
+        model = _create('yolov5s', keep_classes=[0])
         ```
 
     Notes:
@@ -67,7 +74,7 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
         device = select_device(device)
         if pretrained and channels == 3 and classes == 80:
             try:
-                model = DetectMultiBackend(path, device=device, fuse=autoshape)  # detection model
+                model = DetectMultiBackend(path, device=device, fuse=autoshape, keep_classes=keep_classes)
                 if autoshape:
                     if model.pt and isinstance(model.model, ClassificationModel):
                         LOGGER.warning(
@@ -82,7 +89,7 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
                     else:
                         model = AutoShape(model)  # for file/URI/PIL/cv2/np inputs and NMS
             except Exception:
-                model = attempt_load(path, device=device, fuse=False)  # arbitrary model
+                model = attempt_load(path, device=device, fuse=False, keep_classes=keep_classes)  # arbitrary model
         else:
             cfg = list((Path(__file__).parent / "models").rglob(f"{path.stem}.yaml"))[0]  # model.yaml path
             model = DetectionModel(cfg, channels, classes)  # create model
@@ -93,6 +100,8 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
                 model.load_state_dict(csd, strict=False)  # load
                 if len(ckpt["model"].names) == classes:
                     model.names = ckpt["model"].names  # set class names attribute
+            if keep_classes is not None:
+                model.keep_classes(keep_classes)  # restrict Detect() head to class subset
         if not verbose:
             LOGGER.setLevel(logging.INFO)  # reset to default
         return model.to(device)
@@ -103,7 +112,7 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
         raise Exception(s) from e
 
 
-def custom(path="path/to/model.pt", autoshape=True, _verbose=True, device=None):
+def custom(path="path/to/model.pt", autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Loads a custom or local YOLOv5 model from a given path with optional autoshaping and device specification.
 
@@ -115,6 +124,8 @@ def custom(path="path/to/model.pt", autoshape=True, _verbose=True, device=None):
             (default is True).
         device (str | torch.device | None): Device to load the model on, e.g., 'cpu', 'cuda', torch.device('cuda:0'), etc.
             (default is None, which automatically selects the best available device).
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         torch.nn.Module: A YOLOv5 model loaded with the specified parameters.
@@ -132,10 +143,10 @@ def custom(path="path/to/model.pt", autoshape=True, _verbose=True, device=None):
         model = torch.hub.load('.', 'custom', 'yolov5s.pt', source='local', autoshape=False, device='cpu')
         ```
     """
-    return _create(path, autoshape=autoshape, verbose=_verbose, device=device)
+    return _create(path, autoshape=autoshape, verbose=_verbose, device=device, keep_classes=keep_classes)
 
 
-def yolov5n(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5n(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Instantiates the YOLOv5-nano model with options for pretraining, input channels, class count, autoshaping,
     verbosity, and device.
@@ -149,6 +160,8 @@ def yolov5n(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
         _verbose (bool): If True, prints detailed information to the screen. Defaults to True.
         device (str | torch.device | None): Specifies the device to use for model computation. If None, uses the best device
             available (i.e., GPU if available, otherwise CPU). Defaults to None.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         DetectionModel | ClassificationModel | SegmentationModel: The instantiated YOLOv5-nano model, potentially with
@@ -170,10 +183,10 @@ def yolov5n(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
         model = yolov5n(device='cuda')
         ```
     """
-    return _create("yolov5n", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5n", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
-def yolov5s(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5s(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Create a YOLOv5-small (yolov5s) model with options for pretraining, input channels, class count, autoshaping,
     verbosity, and device configuration.
@@ -187,6 +200,8 @@ def yolov5s(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
         _verbose (bool, optional): Flag to print detailed information regarding model loading. Defaults to True.
         device (str | torch.device | None, optional): Device to use for model computation, can be 'cpu', 'cuda', or
             torch.device instances. If None, automatically selects the best available device. Defaults to None.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         torch.nn.Module: The YOLOv5-small model configured and loaded according to the specified parameters.
@@ -212,10 +227,10 @@ def yolov5s(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
         For more details on model loading and customization, visit
         the [YOLOv5 PyTorch Hub Documentation](https://pytorch.org/hub/ultralytics_yolov5/).
     """
-    return _create("yolov5s", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5s", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
-def yolov5m(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5m(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Instantiates the YOLOv5-medium model with customizable pretraining, channel count, class count, autoshaping,
     verbosity, and device.
@@ -229,6 +244,8 @@ def yolov5m(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
         _verbose (bool, optional): Whether to print detailed information to the screen. Default is True.
         device (str | torch.device | None, optional): Device specification to use for model parameters (e.g., 'cpu', 'cuda').
             Default is None.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         torch.nn.Module: The instantiated YOLOv5-medium model.
@@ -245,10 +262,10 @@ def yolov5m(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
 
     For more information, visit https://pytorch.org/hub/ultralytics_yolov5.
     """
-    return _create("yolov5m", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5m", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
-def yolov5l(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5l(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Creates YOLOv5-large model with options for pretraining, channels, classes, autoshaping, verbosity, and device
     selection.
@@ -261,6 +278,8 @@ def yolov5l(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
         _verbose (bool): Print all information to screen. Default is True.
         device (str | torch.device | None): Device to use for model parameters, e.g., 'cpu', 'cuda', or a torch.device instance.
             Default is None.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         YOLOv5 model (torch.nn.Module): The YOLOv5-large model instantiated with specified configurations and possibly
@@ -276,10 +295,10 @@ def yolov5l(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
         For additional details, refer to the PyTorch Hub models documentation:
         https://pytorch.org/hub/ultralytics_yolov5
     """
-    return _create("yolov5l", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5l", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
-def yolov5x(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5x(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Perform object detection using the YOLOv5-xlarge model with options for pretraining, input channels, class count,
     autoshaping, verbosity, and device specification.
@@ -293,6 +312,8 @@ def yolov5x(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
         _verbose (bool): If True, prints detailed information during model loading. Defaults to True.
         device (str | torch.device | None): Device specification for computing the model, e.g., 'cpu', 'cuda:0', torch.device('cuda').
             Defaults to None.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         torch.nn.Module: The YOLOv5-xlarge model loaded with the specified parameters, optionally with pretrained weights and
@@ -307,10 +328,10 @@ def yolov5x(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=Tr
     For additional details, refer to the official YOLOv5 PyTorch Hub models documentation:
     https://pytorch.org/hub/ultralytics_yolov5
     """
-    return _create("yolov5x", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5x", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
-def yolov5n6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5n6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Creates YOLOv5-nano-P6 model with options for pretraining, channels, classes, autoshaping, verbosity, and device.
 
@@ -322,6 +343,8 @@ def yolov5n6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
         _verbose (bool, optional): If True, prints all information to screen. Default is True.
         device (str | torch.device | None, optional): Device to use for model parameters. Can be 'cpu', 'cuda', or None.
             Default is None.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         torch.nn.Module: YOLOv5-nano-P6 model loaded with the specified configurations.
@@ -335,10 +358,10 @@ def yolov5n6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
     Notes:
         For more information on PyTorch Hub models, visit: https://pytorch.org/hub/ultralytics_yolov5
     """
-    return _create("yolov5n6", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5n6", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
-def yolov5s6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5s6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Instantiate the YOLOv5-small-P6 model with options for pretraining, input channels, number of classes, autoshaping,
     verbosity, and device selection.
@@ -352,6 +375,8 @@ def yolov5s6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
         _verbose (bool): If True, prints detailed information during model loading. Default is True.
         device (str | torch.device | None): Device specification for model parameters (e.g., 'cpu', 'cuda', or torch.device).
             Default is None, which selects an available device automatically.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         torch.nn.Module: The YOLOv5-small-P6 model instance.
@@ -373,10 +398,10 @@ def yolov5s6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
         Exception: If there is an error during model creation or loading, with a suggestion to visit the YOLOv5
             tutorials for help.
     """
-    return _create("yolov5s6", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5s6", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
-def yolov5m6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5m6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Create YOLOv5-medium-P6 model with options for pretraining, channel count, class count, autoshaping, verbosity, and
     device.
@@ -390,6 +415,8 @@ def yolov5m6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
         _verbose (bool): If True, prints detailed information to the screen. Default is True.
         device (str | torch.device | None): Device to use for model parameters. Default is None, which uses the
             best available device.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         torch.nn.Module: The YOLOv5-medium-P6 model.
@@ -408,10 +435,10 @@ def yolov5m6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
         - The model can be loaded with pre-trained weights for better performance on specific tasks.
         - The autoshape feature simplifies input handling by allowing various popular data formats.
     """
-    return _create("yolov5m6", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5m6", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
-def yolov5l6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5l6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Instantiate the YOLOv5-large-P6 model with options for pretraining, channel and class counts, autoshaping,
     verbosity, and device selection.
@@ -424,6 +451,8 @@ def yolov5l6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
         _verbose (bool, optional): If True, print all information to the screen. Default is True.
         device (str | torch.device | None, optional): Device to use for model parameters, e.g., 'cpu', 'cuda', or torch.device.
             If None, automatically selects the best available device. Default is None.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         torch.nn.Module: The instantiated YOLOv5-large-P6 model.
@@ -440,10 +469,10 @@ def yolov5l6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
     Note:
         Refer to [PyTorch Hub Documentation](https://pytorch.org/hub/ultralytics_yolov5/) for additional usage instructions.
     """
-    return _create("yolov5l6", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5l6", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
-def yolov5x6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
+def yolov5x6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None, keep_classes=None):
     """
     Creates the YOLOv5-xlarge-P6 model with options for pretraining, number of input channels, class count, autoshaping,
     verbosity, and device selection.
@@ -456,6 +485,8 @@ def yolov5x6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
         _verbose (bool): If True, prints all information to the screen. Default is True.
         device (str | torch.device | None): Device to use for model parameters, can be a string, torch.device object, or
             None for default device selection. Default is None.
+        keep_classes (list[int] | None): Class indices to keep in the Detect() head, i.e. [0] for person-only inference.
+            Defaults to None (all classes).
 
     Returns:
         torch.nn.Module: The instantiated YOLOv5-xlarge-P6 model.
@@ -470,7 +501,7 @@ def yolov5x6(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=T
         For more information on YOLOv5 models, visit the official documentation:
         https://docs.ultralytics.com/yolov5
     """
-    return _create("yolov5x6", pretrained, channels, classes, autoshape, _verbose, device)
+    return _create("yolov5x6", pretrained, channels, classes, autoshape, _verbose, device, keep_classes)
 
 
 if __name__ == "__main__":
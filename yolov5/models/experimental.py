@@ -85,11 +85,12 @@ class Ensemble(nn.ModuleList):
         return y, None  # inference, train output
 
 
-def attempt_load(weights, device=None, inplace=True, fuse=True):
+def attempt_load(weights, device=None, inplace=True, fuse=True, keep_classes=None):
     """
     Loads and fuses an ensemble or single YOLOv5 model from weights, handling device placement and model adjustments.
 
-    Example inputs: weights=[a,b,c] or a single model weights=[a] or weights=a.
+    Example inputs: weights=[a,b,c] or a single model weights=[a] or weights=a. Optional `keep_classes` slices the
+    Detect() head to those class indices, i.e. keep_classes=[0] for person-only inference.
     """
     from models.yolo import Detect, Model
 
@@ -103,6 +104,8 @@ def attempt_load(weights, device=None, inplace=True, fuse=True):
             ckpt.stride = torch.tensor([32.0])
         if hasattr(ckpt, "names") and isinstance(ckpt.names, (list, tuple)):
             ckpt.names = dict(enumerate(ckpt.names))  # convert to dict
+        if keep_classes is not None:
+            ckpt.keep_classes(keep_classes)  # restrict Detect() head to class subset
 
         model.append(ckpt.fuse().eval() if fuse and hasattr(ckpt, "fuse") else ckpt.eval())  # model in eval mode
 
@@ -12,6 +12,7 @@ import math
 import os
 import platform
 import sys
+from collections import OrderedDict
 from copy import deepcopy
 from pathlib import Path
 
@@ -75,6 +76,8 @@ class Detect(nn.Module):
     stride = None  # strides computed during build
     dynamic = False  # force grid reconstruction
     export = False  # export mode
+    argmax = False  # decode best class only, output(bs,n,7) = xywh, obj_conf, cls_conf, cls
+    grid_cache_size = 8  # number of (nx, ny, device, dtype) grids cached per layer
 
     def __init__(self, nc=80, anchors=(), ch=(), inplace=True):
         """Initializes YOLOv5 detection layer with specified classes, anchors, channels, and inplace operations."""
@@ -98,20 +101,29 @@ class Detect(nn.Module):
             x[i] = x[i].view(bs, self.na, self.no, ny, nx).permute(0, 1, 3, 4, 2).contiguous()
 
             if not self.training:  # inference
-                if self.dynamic or self.grid[i].shape[2:4] != x[i].shape[2:4]:
+                if self.dynamic:
                     self.grid[i], self.anchor_grid[i] = self._make_grid(nx, ny, i)
+                elif self.grid[i].shape[2:4] != x[i].shape[2:4]:
+                    self.grid[i], self.anchor_grid[i] = self._cached_grid(nx, ny, i)
 
                 if isinstance(self, Segment):  # (boxes + masks)
                     xy, wh, conf, mask = x[i].split((2, 2, self.nc + 1, self.no - self.nc - 5), 4)
                     xy = (xy.sigmoid() * 2 + self.grid[i]) * self.stride[i]  # xy
                     wh = (wh.sigmoid() * 2) ** 2 * self.anchor_grid[i]  # wh
                     y = torch.cat((xy, wh, conf.sigmoid(), mask), 4)
+                elif self.argmax:  # Detect (boxes and best class only)
+                    xywh, cls = x[i].split((5, self.nc), 4)
+                    xy, wh, conf = xywh.sigmoid().split((2, 2, 1), 4)
+                    xy = (xy * 2 + self.grid[i]) * self.stride[i]  # xy
+                    wh = (wh * 2) ** 2 * self.anchor_grid[i]  # wh
+                    cls, j = cls.max(4, keepdim=True)  # best class logit, sigmoid is monotonic
+                    y = torch.cat((xy, wh, conf, cls.sigmoid(), j.to(conf.dtype)), 4)
                 else:  # Detect (boxes only)
                     xy, wh, conf = x[i].sigmoid().split((2, 2, self.nc + 1), 4)
                     xy = (xy * 2 + self.grid[i]) * self.stride[i]  # xy
                     wh = (wh * 2) ** 2 * self.anchor_grid[i]  # wh
                     y = torch.cat((xy, wh, conf), 4)
-                z.append(y.view(bs, self.na * nx * ny, self.no))
+                z.append(y.view(bs, self.na * nx * ny, y.shape[-1]))
 
         return x if self.training else (torch.cat(z, 1),) if self.export else (torch.cat(z, 1), x)
 
@@ -126,6 +138,40 @@ class Detect(nn.Module):
         anchor_grid = (self.anchors[i] * self.stride[i]).view((1, self.na, 1, 1, 2)).expand(shape)
         return grid, anchor_grid
 
+    def _cached_grid(self, nx=20, ny=20, i=0):
+        """Returns `_make_grid()` outputs from a per-layer LRU cache keyed by (nx, ny, device, dtype)."""
+        cache = self.__dict__.setdefault("grid_cache", [OrderedDict() for _ in range(self.nl)])[i]
+        key = nx, ny, self.anchors[i].device, self.anchors[i].dtype
+        if key in cache:
+            cache.move_to_end(key)  # most recently used
+        else:
+            cache[key] = self._make_grid(nx, ny, i)
+            if len(cache) > self.grid_cache_size:
+                cache.popitem(last=False)  # evict least recently used
+        return cache[key]
+
+    def keep_classes(self, classes):
+        """Slices the output convs to the class indices in `classes`, dropping all other class logits in place."""
+        assert len(set(classes)) == len(classes) and all(0 <= c < self.nc for c in classes), (
+            f"invalid classes {classes} for nc={self.nc}"
+        )
+        nc = len(classes)
+        j = [*range(5), *(5 + c for c in classes), *range(5 + self.nc, self.no)]  # kept outputs per anchor
+        i = torch.tensor([a * self.no + k for a in range(self.na) for k in j], device=self.anchors.device)
+        for m in self.m:
+            m.weight = nn.Parameter(m.weight.data.index_select(0, i), requires_grad=m.weight.requires_grad)
+            if m.bias is not None:
+                m.bias = nn.Parameter(m.bias.data.index_select(0, i), requires_grad=m.bias.requires_grad)
+            m.out_channels = len(i)
+        self.no += nc - self.nc
+        self.nc = nc
+
+    def __getstate__(self):
+        """Returns the module state for pickling and deepcopy, excluding the grid cache to keep checkpoints small."""
+        state = super().__getstate__()
+        state.pop("grid_cache", None)
+        return state
+
 
 class Segment(Detect):
     """YOLOv5 Segment head for segmentation models, extending Detect with mask and prototype layers."""
@@ -201,6 +247,19 @@ class BaseModel(nn.Module):
         """Prints model information given verbosity and image size, e.g., `info(verbose=True, img_size=640)`."""
         model_info(self, verbose, img_size)
 
+    def keep_classes(self, classes):
+        """Restricts the Detect() head and `names` to class indices `classes`, i.e. `keep_classes([0])` for person-only
+        inference, renumbering the kept classes 0..len(classes)-1.
+        """
+        m = self.model[-1]  # Detect()
+        assert isinstance(m, (Detect, Segment)), "keep_classes() requires a Detect() or Segment() head"
+        names = self.names if isinstance(self.names, dict) else dict(enumerate(self.names))
+        m.keep_classes(classes)
+        self.names = {i: names[c] for i, c in enumerate(classes)}
+        self.nc = self.yaml["nc"] = m.nc
+        LOGGER.info(f"Detect() head restricted to {m.nc} classes {list(self.names.values())}")
+        return self
+
     def _apply(self, fn):
         """Applies transformations like to(), cpu(), cuda(), half() to model tensors excluding parameters or registered
         buffers.
@@ -62,7 +62,7 @@ from utils.general import (
     scale_segments,
     strip_optimizer,
 )
-from utils.segment.general import masks2segments, process_mask, process_mask_native
+from utils.segment.general import masks2segments, process_masks
 from utils.torch_utils import select_device, smart_inference_mode
 
 
@@ -152,6 +152,15 @@ def run(
         # Second-stage classifier (optional)
         # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
 
+        # Masks, for all images in one batch
+        if retina_masks:
+            shapes = [x.shape[:2] for x in (im0s if webcam else [im0s])]
+            for det, shape in zip(pred, shapes):  # scale bbox first the crop masks
+                det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], shape).round()  # rescale boxes to im0 size
+            masks = process_masks(proto, pred, shapes, native=True)  # list of (n,h0,w0)
+        else:
+            masks = process_masks(proto, pred, im.shape[2:], upsample=True)  # list of (n,h,w)
+
         # Process predictions
         for i, det in enumerate(pred):  # per image
             seen += 1
@@ -168,19 +177,14 @@ def run(
             imc = im0.copy() if save_crop else im0  # for save_crop
             annotator = Annotator(im0, line_width=line_thickness, example=str(names))
             if len(det):
-                if retina_masks:
-                    # scale bbox first the crop masks
-                    det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()  # rescale boxes to im0 size
-                    masks = process_mask_native(proto[i], det[:, 6:], det[:, :4], im0.shape[:2])  # HWC
-                else:
-                    masks = process_mask(proto[i], det[:, 6:], det[:, :4], im.shape[2:], upsample=True)  # HWC
+                if not retina_masks:
                     det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()  # rescale boxes to im0 size
 
                 # Segments
                 if save_txt:
                     segments = [
                         scale_segments(im0.shape if retina_masks else im.shape[2:], x, im0.shape, normalize=True)
-                        for x in reversed(masks2segments(masks))
+                        for x in reversed(masks2segments(masks[i]))
                     ]
 
                 # Print results
@@ -190,7 +194,7 @@ def run(
 
                 # Mask plotting
                 annotator.masks(
-                    masks,
+                    masks[i],
                     colors=[colors(x, True) for x in det[:, 5]],
                     im_gpu=torch.as_tensor(im0, dtype=torch.float16).to(device).permute(2, 0, 1).flip(0).contiguous()
                     / 255
@@ -24,6 +24,7 @@ import sys
 import time
 from copy import deepcopy
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 
 import numpy as np
@@ -79,6 +80,7 @@ from utils.segment.loss import ComputeLoss
 from utils.segment.metrics import KEYS, fitness
 from utils.segment.plots import plot_images_and_masks, plot_results_with_masks
 from utils.torch_utils import (
+    CheckpointWriter,
     EarlyStopping,
     ModelEMA,
     de_parallel,
@@ -138,6 +140,7 @@ def train(hyp, opt, device, callbacks):
     w = save_dir / "weights"  # weights dir
     (w.parent if evolve else w).mkdir(parents=True, exist_ok=True)  # make dir
     last, best = w / "last.pt", w / "best.pt"
+    ckpt_writer = CheckpointWriter()  # saves checkpoints in the background
 
     # Hyperparameters
     if isinstance(hyp, str):
@@ -222,7 +225,7 @@ def train(hyp, opt, device, callbacks):
     scheduler = lr_scheduler.LambdaLR(optimizer, lr_lambda=lf)  # plot_lr_scheduler(optimizer, scheduler, epochs)
 
     # EMA
-    ema = ModelEMA(model) if RANK in {-1, 0} else None
+    ema = ModelEMA(model, every=opt.ema_every) if RANK in {-1, 0} else None
 
     # Resume
     best_fitness, start_epoch = 0.0, 0
@@ -263,6 +266,7 @@ def train(hyp, opt, device, callbacks):
         shuffle=True,
         mask_downsample_ratio=mask_ratio,
         overlap_mask=overlap,
+        reduced_decode=opt.reduced_decode,
     )
     labels = np.concatenate(dataset.labels, 0)
     mlc = int(labels[:, 0].max())  # max label class
@@ -285,6 +289,7 @@ def train(hyp, opt, device, callbacks):
             mask_downsample_ratio=mask_ratio,
             overlap_mask=overlap,
             prefix=colorstr("val: "),
+            reduced_decode=opt.reduced_decode,
         )[0]
 
         if not resume:
@@ -474,13 +479,13 @@ def train(hyp, opt, device, callbacks):
                     "date": datetime.now().isoformat(),
                 }
 
-                # Save last, best and delete
-                torch.save(ckpt, last)
-                if best_fitness == fi:
-                    torch.save(ckpt, best)
+                # Save last, best and delete, serializing once in the background
+                files = [last, best] if best_fitness == fi else [last]
+                saved = None
                 if opt.save_period > 0 and epoch % opt.save_period == 0:
-                    torch.save(ckpt, w / f"epoch{epoch}.pt")
-                    logger.log_model(w / f"epoch{epoch}.pt")
+                    files.append(w / f"epoch{epoch}.pt")
+                    saved = partial(logger.log_model, w / f"epoch{epoch}.pt")  # runs on this thread once saved
+                ckpt_writer.save(ckpt, files, callback=saved)
                 del ckpt
                 # callbacks.run('on_model_save', last, epoch, final_epoch, best_fitness, fi)
 
@@ -496,7 +501,10 @@ def train(hyp, opt, device, callbacks):
         # end epoch ----------------------------------------------------------------------------------------------------
     # end training -----------------------------------------------------------------------------------------------------
     if RANK in {-1, 0}:
+        ckpt_writer.wait()
         LOGGER.info(f"\n{epoch - start_epoch + 1} epochs completed in {(time.time() - t0) / 3600:.3f} hours.")
+        if dataset.ims is not None:
+            LOGGER.info(f"Image cache: {dataset.ims}")  # i.e. RAM cache hit rate for sizing --cache ram:codec:GB
         for f in last, best:
             if f.exists():
                 strip_optimizer(f)  # strip optimizers
@@ -562,7 +570,8 @@ def parse_opt(known=False):
     parser.add_argument("--noplots", action="store_true", help="save no plot files")
     parser.add_argument("--evolve", type=int, nargs="?", const=300, help="evolve hyperparameters for x generations")
     parser.add_argument("--bucket", type=str, default="", help="gsutil bucket")
-    parser.add_argument("--cache", type=str, nargs="?", const="ram", help="image --cache ram/disk")
+    parser.add_argument("--cache", type=str, nargs="?", const="ram", help="image --cache ram[:jpeg/lz4[:GB]]/disk")
+    parser.add_argument("--reduced-decode", action="store_true", help="decode large JPEGs at reduced resolution")
     parser.add_argument("--image-weights", action="store_true", help="use weighted image selection for training")
     parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
     parser.add_argument("--multi-scale", action="store_true", help="vary img-size +/- 50%%")
@@ -576,6 +585,7 @@ def parse_opt(known=False):
     parser.add_argument("--quad", action="store_true", help="quad dataloader")
     parser.add_argument("--cos-lr", action="store_true", help="cosine LR scheduler")
     parser.add_argument("--label-smoothing", type=float, default=0.0, help="Label smoothing epsilon")
+    parser.add_argument("--ema-every", type=int, default=1, help="update EMA every N steps with their decay")
     parser.add_argument("--patience", type=int, default=100, help="EarlyStopping patience (epochs without improvement)")
     parser.add_argument("--freeze", nargs="+", type=int, default=[0], help="Freeze layers: backbone=10, first3=0 1 2")
     parser.add_argument("--save-period", type=int, default=-1, help="Save checkpoint every x epochs (disabled if < 1)")
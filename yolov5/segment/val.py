@@ -25,7 +25,6 @@ import json
 import os
 import subprocess
 import sys
-from multiprocessing.pool import ThreadPool
 from pathlib import Path
 
 import numpy as np
@@ -45,7 +44,6 @@ from models.yolo import SegmentationModel
 from utils.callbacks import Callbacks
 from utils.general import (
     LOGGER,
-    NUM_THREADS,
     TQDM_BAR_FORMAT,
     Profile,
     check_dataset,
@@ -64,7 +62,7 @@ from utils.general import (
 from utils.metrics import ConfusionMatrix, box_iou
 from utils.plots import output_to_target, plot_val_study
 from utils.segment.dataloaders import create_dataloader
-from utils.segment.general import mask_iou, process_mask, process_mask_native, scale_image
+from utils.segment.general import mask_iou_cropped, masks2rle, native_masks, process_masks, proto_masks, scale_masks
 from utils.segment.metrics import Metrics, ap_per_class_box_and_mask
 from utils.segment.plots import plot_images_and_masks
 from utils.torch_utils import de_parallel, select_device, smart_inference_mode
@@ -82,26 +80,19 @@ def save_one_txt(predn, save_conf, shape, file):
             f.write(("%g " * len(line)).rstrip() % line + "\n")
 
 
-def save_one_json(predn, jdict, path, class_map, pred_masks):
+def save_one_json(predn, jdict, path, class_map, rles):
     """
     Saves a JSON file with detection results including bounding boxes, category IDs, scores, and segmentation masks.
 
     Example JSON result: {"image_id": 42, "category_id": 18, "bbox": [258.15, 41.29, 348.26, 243.78], "score": 0.236}.
     """
-    from pycocotools.mask import encode
-
-    def single_encode(x):
-        """Encodes binary mask arrays into RLE (Run-Length Encoding) format for JSON serialization."""
-        rle = encode(np.asarray(x[:, :, None], order="F", dtype="uint8"))[0]
-        rle["counts"] = rle["counts"].decode("utf-8")
-        return rle
+    from pycocotools.mask import frPyObjects
 
     image_id = int(path.stem) if path.stem.isnumeric() else path.stem
     box = xyxy2xywh(predn[:, :4])  # xywh
     box[:, :2] -= box[:, 2:] / 2  # xy center to top-left corner
-    pred_masks = np.transpose(pred_masks, (2, 0, 1))
-    with ThreadPool(NUM_THREADS) as pool:
-        rles = pool.map(single_encode, pred_masks)
+    if rles:
+        rles = frPyObjects(rles, *rles[0]["size"])  # compress masks2rle() uncompressed RLEs
     for i, (p, b) in enumerate(zip(predn.tolist(), box.tolist())):
         jdict.append(
             {
@@ -109,7 +100,7 @@ def save_one_json(predn, jdict, path, class_map, pred_masks):
                 "category_id": class_map[int(p[5])],
                 "bbox": [round(x, 3) for x in b],
                 "score": round(p[4], 5),
-                "segmentation": rles[i],
+                "segmentation": {"size": rles[i]["size"], "counts": rles[i]["counts"].decode("utf-8")},
             }
         )
 
@@ -127,12 +118,11 @@ def process_batch(detections, labels, iouv, pred_masks=None, gt_masks=None, over
         if overlap:
             nl = len(labels)
             index = torch.arange(nl, device=gt_masks.device).view(nl, 1, 1) + 1
-            gt_masks = gt_masks.repeat(nl, 1, 1)  # shape(1,640,640) -> (n,640,640)
-            gt_masks = torch.where(gt_masks == index, 1.0, 0.0)
+            gt_masks = (gt_masks == index).float()  # shape(1,640,640) -> (n,640,640)
         if gt_masks.shape[1:] != pred_masks.shape[1:]:
             gt_masks = F.interpolate(gt_masks[None], pred_masks.shape[1:], mode="bilinear", align_corners=False)[0]
             gt_masks = gt_masks.gt_(0.5)
-        iou = mask_iou(gt_masks.view(gt_masks.shape[0], -1), pred_masks.view(pred_masks.shape[0], -1))
+        iou = mask_iou_cropped(gt_masks, pred_masks)
     else:  # boxes
         iou = box_iou(labels[:, 1:], detections[:, :4])
 
@@ -163,6 +153,7 @@ def run(
     task="val",  # train, val, test, speed or study
     device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
     workers=8,  # max dataloader workers (per RANK in DDP mode)
+    reduced_decode=False,  # decode large JPEGs at reduced resolution
     single_cls=False,  # treat as single-class dataset
     augment=False,  # augmented inference
     verbose=False,  # verbose output
@@ -189,9 +180,7 @@ def run(
     """
     if save_json:
         check_requirements("pycocotools>=2.0.6")
-        process = process_mask_native  # more accurate
-    else:
-        process = process_mask  # faster
+    native = save_json  # more accurate, else faster
 
     # Initialize/load model and set device
     training = model is not None
@@ -253,6 +242,7 @@ def run(
             rect=rect,
             workers=workers,
             prefix=colorstr(f"{task}: "),
+            reduced_decode=reduced_decode,
             overlap_mask=overlap,
             mask_downsample_ratio=mask_downsample_ratio,
         )[0]
@@ -310,9 +300,12 @@ def run(
                 preds, conf_thres, iou_thres, labels=lb, multi_label=True, agnostic=single_cls, max_det=max_det, nm=nm
             )
 
+        # Masks, for all images in one batch at protos resolution, native masks are upsampled per image below
+        batch_masks = proto_masks(protos, preds) if native else process_masks(protos, preds, im.shape[2:])
+
         # Metrics
         plot_masks = []  # masks for plotting
-        for si, (pred, proto) in enumerate(zip(preds, protos)):
+        for si, pred in enumerate(preds):
             labels = targets[targets[:, 0] == si, 1:]
             nl, npr = labels.shape[0], pred.shape[0]  # number of labels, predictions
             path, shape = Path(paths[si]), shapes[si][0]
@@ -330,7 +323,7 @@ def run(
             # Masks
             midx = [si] if overlap else targets[:, 0] == si
             gt_masks = masks[midx]
-            pred_masks = process(proto, pred[:, 6:], pred[:, :4], shape=im[si].shape[1:])
+            pred_masks = native_masks(batch_masks[si], pred, im.shape[2:]) if native else batch_masks[si]
 
             # Predictions
             if single_cls:
@@ -357,10 +350,8 @@ def run(
             if save_txt:
                 save_one_txt(predn, save_conf, shape, file=save_dir / "labels" / f"{path.stem}.txt")
             if save_json:
-                pred_masks = scale_image(
-                    im[si].shape[1:], pred_masks.permute(1, 2, 0).contiguous().cpu().numpy(), shape, shapes[si][1]
-                )
-                save_one_json(predn, jdict, path, class_map, pred_masks)  # append to COCO-JSON dictionary
+                rles = masks2rle(scale_masks(im[si].shape[1:], pred_masks, shape, shapes[si][1]))  # native-space
+                save_one_json(predn, jdict, path, class_map, rles)  # append to COCO-JSON dictionary
             # callbacks.run('on_val_image_end', pred, predn, path, names, im[si])
 
         # Plot images
@@ -461,6 +452,7 @@ def parse_opt():
     parser.add_argument("--task", default="val", help="train, val, test, speed or study")
     parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
     parser.add_argument("--workers", type=int, default=8, help="max dataloader workers (per RANK in DDP mode)")
+    parser.add_argument("--reduced-decode", action="store_true", help="decode large JPEGs at reduced resolution")
     parser.add_argument("--single-cls", action="store_true", help="treat as single-class dataset")
     parser.add_argument("--augment", action="store_true", help="augmented inference")
     parser.add_argument("--verbose", action="store_true", help="report mAP by class")
@@ -0,0 +1,315 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Label and image caches for LoadImagesAndLabels."""
+
+import os
+import sqlite3
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+from threading import Lock
+
+import cv2
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from utils.general import LOGGER, NUM_THREADS, TQDM_BAR_FORMAT, check_requirements
+
+
+class LabelCache:
+    """Incremental dataset label cache in an SQLite database, with one row per image keyed on the image and label file
+    path, modification time and size, so that only new or modified files are re-verified.
+
+    Rows store verified labels, image shape, segments, found/missing/empty/corrupt counts and the warning message as
+    plain columns and float32 blobs, so loading never unpickles data.
+    """
+
+    version = 1  # cache format version, bump to invalidate all rows
+    columns = "im_file", "key", "labels", "w", "h", "segments", "lengths", "nm", "nf", "ne", "nc", "msg"
+
+    def __init__(self, path):
+        """Opens or creates the database at `path`, replacing files of older cache formats."""
+        self.path = Path(path)
+        try:
+            self.db = self.connect()
+        except sqlite3.DatabaseError:  # i.e. a pickled *.cache of an older version
+            self.path.unlink()
+            self.db = self.connect()
+
+    def connect(self):
+        """Connects to the database, creating its tables and clearing rows of other cache versions."""
+        db = sqlite3.connect(self.path, timeout=60)
+        db.execute("CREATE TABLE IF NOT EXISTS meta (version INTEGER)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS labels (im_file TEXT PRIMARY KEY, key TEXT, labels BLOB, w INTEGER, h INTEGER, "
+            "segments BLOB, lengths BLOB, nm INTEGER, nf INTEGER, ne INTEGER, nc INTEGER, msg TEXT)"
+        )
+        if db.execute("SELECT version FROM meta").fetchone() != (self.version,):
+            with db:
+                db.execute("DELETE FROM labels")
+                db.execute("DELETE FROM meta")
+                db.execute("INSERT INTO meta VALUES (?)", (self.version,))
+        return db
+
+    @staticmethod
+    def key(im_file, lb_file):
+        """Returns the cache key of an image and label file pair from their modification times and sizes."""
+        k = []
+        for f in im_file, lb_file:
+            try:
+                st = os.stat(f)
+                k.append(f"{st.st_mtime_ns}:{st.st_size}")
+            except OSError:
+                k.append("-")  # missing
+        return f"{lb_file}|{'|'.join(k)}"
+
+    def get(self, keys, members=False):
+        """Returns `{im_file: (lb, shape, segments, nm, nf, ne, nc, msg)}` for cached rows matching `keys`, a dict of
+        `{im_file: key}`, or with `members` a dict of `{shard: key}` matching rows of tar shard members 'shard/name'.
+        """
+        x = {}
+        for im_file, key, lb, w, h, seg, lengths, *counts in self.db.execute("SELECT * FROM labels"):
+            if keys.get(im_file.rsplit(".tar/", 1)[0] + ".tar" if members else im_file) == key:
+                lb = np.frombuffer(bytearray(lb), dtype=np.float32).reshape(-1, 5)  # writable, e.g. for --single-cls
+                lengths = np.frombuffer(lengths, dtype=np.int64)
+                seg = np.frombuffer(bytearray(seg), dtype=np.float32).reshape(-1, 2)
+                segments = np.split(seg, lengths.cumsum()[:-1])
+                x[im_file] = (lb, (w, h), segments if len(lengths) else [], *counts)
+        return x
+
+    def put(self, rows):
+        """Inserts or replaces `rows` of `(im_file, key, lb, shape, segments, nm, nf, ne, nc, msg)` in one transaction."""
+        with self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO labels VALUES ({', '.join('?' * len(self.columns))})",
+                [
+                    (
+                        im_file,
+                        key,
+                        np.zeros((0, 5), np.float32).tobytes() if lb is None else np.asarray(lb, np.float32).tobytes(),
+                        *(shape or (0, 0)),
+                        np.concatenate([np.zeros((0, 2)), *(segments or [])], 0).astype(np.float32).tobytes(),
+                        np.array([len(s) for s in segments or []], dtype=np.int64).tobytes(),
+                        *counts,
+                    )
+                    for im_file, key, lb, shape, segments, *counts in rows
+                ],
+            )
+
+    def close(self):
+        """Closes the database."""
+        self.db.close()
+
+
+class MmapImageCache:
+    """Packed on-disk cache of resized images, one uint8 blob plus an offset and shape index, memory-mapped so that all
+    DataLoader workers and DDP ranks on a node share the images zero-copy through the OS page cache.
+    """
+
+    version = 1  # cache format version
+
+    def __init__(self, file, im_files, hash, img_size):
+        """Initializes the cache at `file` (blob) and `file.npz` (index) for images `im_files` with content `hash`."""
+        self.file = Path(file)
+        self.index_file = self.file.with_suffix(self.file.suffix + ".npz")
+        self.im_files = im_files
+        self.hash = hash
+        self.img_size = img_size
+        self.mm = None  # memory map, opened lazily in each process
+
+    def load(self):
+        """Loads and validates the index, returning True if the cache exists and matches the images."""
+        try:
+            with np.load(self.index_file, allow_pickle=False) as x:
+                assert x["version"] == self.version and x["img_size"] == self.img_size and x["hash"] == self.hash
+                assert self.file.stat().st_size == x["offsets"][-1]  # complete blob
+                pos = {f: i for i, f in enumerate(x["files"].tobytes().decode().split("\n"))}
+                order = np.array([pos[f] for f in self.im_files])  # cache position of each dataset image
+                self.offsets, self.shapes, self.hw0 = x["offsets"][order], x["shapes"][order], x["hw0"][order]
+        except Exception:
+            return False
+        return True
+
+    def build(self, fcn, prefix=""):
+        """Builds the cache from `fcn(i) -> (im, hw_original, hw_resized)` in parallel threads, appending images to a
+        temporary blob in dataset order before atomically moving the blob and index into place.
+        """
+        n = len(self.im_files)
+        offsets, shapes, hw0 = np.zeros(n + 1, dtype=np.int64), np.zeros((n, 3), dtype=np.int32), np.zeros((n, 2), int)
+        tmp = self.file.with_suffix(f".{os.getpid()}.tmp")
+        gb = 1 << 30  # bytes per gigabytes
+        try:
+            with open(tmp, "wb") as f, ThreadPool(NUM_THREADS) as pool:
+                pbar = tqdm(pool.imap(fcn, range(n)), total=n, bar_format=TQDM_BAR_FORMAT)
+                for i, (im, h0w0, _) in enumerate(pbar):
+                    im = np.ascontiguousarray(im)
+                    f.write(memoryview(im).cast("B"))
+                    offsets[i + 1], shapes[i], hw0[i] = offsets[i] + im.nbytes, im.shape, h0w0
+                    pbar.desc = f"{prefix}Caching images ({offsets[i + 1] / gb:.1f}GB disk)"
+                pbar.close()
+            np.savez(
+                tmp.with_suffix(".npz"),
+                files=np.frombuffer("\n".join(self.im_files).encode(), dtype=np.uint8),  # UTF-8, no object arrays
+                offsets=offsets,
+                shapes=shapes,
+                hw0=hw0,
+                hash=self.hash,
+                img_size=self.img_size,
+                version=self.version,
+            )
+            tmp.replace(self.file)
+            tmp.with_suffix(".npz").replace(self.index_file)  # index last, load() validates the blob size
+        finally:
+            tmp.unlink(missing_ok=True)
+            tmp.with_suffix(".npz").unlink(missing_ok=True)
+        self.offsets, self.shapes, self.hw0 = offsets[:-1], shapes, hw0
+        LOGGER.info(f"{prefix}New image cache created: {self.file}")
+
+    @property
+    def nbytes(self):
+        """Returns the size of the cached images in bytes."""
+        return int((self.shapes.prod(1, dtype=np.int64)).sum())
+
+    def get(self, i):
+        """Returns `(im, hw_original, hw_resized)` of cached image `i`, `im` a copy-on-write view of the memory map."""
+        if self.mm is None:
+            self.mm = np.memmap(self.file, dtype=np.uint8, mode="c")  # private writes, shared reads
+        o, s = self.offsets[i], self.shapes[i]
+        im = np.asarray(self.mm[o : o + s.prod()]).reshape(s)
+        return im, tuple(self.hw0[i].tolist()), im.shape[:2]
+
+    def put(self, i, im, hw0, hw):
+        """Ignores images loaded outside the cache, which holds every image."""
+        pass
+
+    def __len__(self):
+        """Returns the number of cached images."""
+        return len(self.im_files)
+
+    def __str__(self):
+        """Returns a summary of the cache, i.e. '12.3GB disk, memory-mapped from labels.640.images'."""
+        return f"{self.nbytes / (1 << 30):.1f}GB disk, memory-mapped from {self.file}"
+
+    def __getstate__(self):
+        """Drops the memory map when pickled, i.e. for spawned DataLoader workers, which re-open it lazily."""
+        return {**self.__dict__, "mm": None}
+
+
+class RAMImageCache:
+    """Bounded in-RAM cache of resized images with a byte budget, storing images raw or re-encoded as fast-decoding
+    'jpeg' or 'lz4' to fit more images into the budget.
+
+    The cache is filled in the main process before DataLoader workers fork, which then share it copy-on-write as a
+    static prefill: workers neither insert, reorder nor evict, so memory stays bounded by the budget regardless of the
+    number of workers and images beyond the budget are always loaded from disk. Least-recently-used eviction only
+    applies when images are loaded in the main process, i.e. with workers=0. Hit and miss counters live in shared
+    memory, with one row per process so that workers never update the same counters.
+    """
+
+    codecs = "raw", "jpeg", "lz4"
+
+    def __init__(self, budget, codec="raw", quality=95):
+        """Initializes an empty cache holding up to `budget` bytes of images encoded with `codec`."""
+        assert codec in self.codecs, f"invalid image cache codec '{codec}', valid codecs are {self.codecs}"
+        if codec == "lz4":
+            check_requirements("lz4")
+        self.budget = budget
+        self.codec = codec
+        self.quality = quality  # JPEG quality
+        self.items = OrderedDict()  # {index: (data, shape, hw_original)} in least to most recently used order
+        self.nbytes = 0  # bytes of cached data
+        self.share_stats(0)
+        self.lock = Lock()
+
+    def get(self, i):
+        """Returns `(im, hw_original, hw_resized)` of image `i` if cached, else None; marks it most recently used in
+        the main process.
+        """
+        x = self.items.get(i)
+        w = torch.utils.data.get_worker_info()
+        self.stats[0 if w is None else (w.id + 1) % len(self.stats), 0 if x is not None else 1] += 1  # row per process
+        if x is None:
+            return None
+        if w is None:  # workers only read their copy-on-write copy, reordering it would not affect eviction
+            with self.lock:
+                if i in self.items:
+                    self.items.move_to_end(i)
+        data, shape, hw0 = x
+        im = self.decode(data, shape)
+        return im, hw0, im.shape[:2]
+
+    def put(self, i, im, hw0, hw):
+        """Adds image `i`, evicting least recently used images to stay within the budget; ignored in DataLoader
+        workers.
+        """
+        if torch.utils.data.get_worker_info() is not None:
+            return
+        data = self.encode(im)
+        if data.nbytes > self.budget:
+            return
+        with self.lock:
+            if i in self.items:
+                return
+            self.items[i] = data, im.shape, hw0
+            self.nbytes += data.nbytes
+            while self.nbytes > self.budget:
+                self.nbytes -= self.items.popitem(last=False)[1][0].nbytes
+
+    def share_stats(self, workers):
+        """Allocates zeroed hit and miss counters in shared memory, one row for the main process and each of `workers`
+        DataLoader workers; call before the workers start.
+        """
+        self.stats = torch.zeros((workers + 1, 2), dtype=torch.int64).share_memory_()  # hits, misses per process
+
+    @property
+    def full(self):
+        """Returns True if the cache has reached its budget."""
+        return self.nbytes >= self.budget * 0.99
+
+    def encode(self, im):
+        """Encodes image `im` to a uint8 array with the cache codec."""
+        if self.codec == "jpeg":
+            return cv2.imencode(".jpg", im, [cv2.IMWRITE_JPEG_QUALITY, self.quality])[1]
+        elif self.codec == "lz4":
+            import lz4.frame
+
+            return np.frombuffer(lz4.frame.compress(np.ascontiguousarray(im)), dtype=np.uint8)
+        return im
+
+    def decode(self, data, shape):
+        """Decodes cached `data` to an image of `shape`."""
+        if self.codec == "jpeg":
+            return cv2.imdecode(data, cv2.IMREAD_COLOR)
+        elif self.codec == "lz4":
+            import lz4.frame
+
+            return np.frombuffer(lz4.frame.decompress(data), dtype=np.uint8).reshape(shape).copy()
+        return data
+
+    @property
+    def hit_rate(self):
+        """Returns the fraction of lookups served from the cache."""
+        hits, misses = self.stats.sum(0).tolist()
+        return hits / max(hits + misses, 1)
+
+    def __len__(self):
+        """Returns the number of cached images."""
+        return len(self.items)
+
+    def __str__(self):
+        """Returns a summary of the cache, i.e. '1000 images, 2.0/2.0GB RAM (jpeg), 95.0% hit rate (950/1000)'."""
+        gb = 1 << 30
+        hits, misses = self.stats.sum(0).tolist()
+        return (
+            f"{len(self.items)} images, {self.nbytes / gb:.1f}/{self.budget / gb:.1f}GB RAM ({self.codec}), "
+            f"{self.hit_rate:.1%} hit rate ({hits}/{hits + misses})"
+        )
+
+    def __getstate__(self):
+        """Drops the lock when pickled, i.e. for spawned DataLoader workers."""
+        return {k: v for k, v in self.__dict__.items() if k != "lock"}
+
+    def __setstate__(self, state):
+        """Restores the cache and creates a new lock."""
+        self.__dict__.update(state)
+        self.lock = Lock()
@@ -2,18 +2,24 @@
 """Dataloaders and dataset utils."""
 
 import contextlib
+import copy
 import glob
 import hashlib
+import io
 import json
 import math
 import os
 import random
+import re
 import shutil
+import tarfile
 import time
+import zlib
+from collections import deque
 from itertools import repeat
 from multiprocessing.pool import Pool, ThreadPool
 from pathlib import Path
-from threading import Thread
+from threading import Lock, Thread
 from urllib.parse import urlparse
 
 import numpy as np
@@ -23,7 +29,7 @@ import torch.nn.functional as F
 import torchvision
 import yaml
 from PIL import ExifTags, Image, ImageOps
-from torch.utils.data import DataLoader, Dataset, dataloader, distributed
+from torch.utils.data import DataLoader, Dataset, IterableDataset, dataloader, distributed
 from tqdm import tqdm
 
 from utils.augmentations import (
@@ -34,8 +40,11 @@ from utils.augmentations import (
     copy_paste,
     letterbox,
     mixup,
+    paste_tiles,
     random_perspective,
 )
+from utils.caches import LabelCache, MmapImageCache, RAMImageCache
+from utils.decoders import JPEG_FORMATS, get_decoder, reduced_flag
 from utils.general import (
     DATASETS_DIR,
     LOGGER,
@@ -175,13 +184,16 @@ def create_dataloader(
     prefix="",
     shuffle=False,
     seed=0,
+    batch_augment=False,
+    reduced_decode=False,
 ):
     """Creates and returns a configured DataLoader instance for loading and processing image datasets."""
     if rect and shuffle:
         LOGGER.warning("WARNING ⚠️ --rect is incompatible with DataLoader shuffle, setting shuffle=False")
         shuffle = False
+    shards = is_shards(path)  # stream tar shards
     with torch_distributed_zero_first(rank):  # init dataset *.cache only once if DDP
-        dataset = LoadImagesAndLabels(
+        dataset = (LoadImagesAndLabelsShards if shards else LoadImagesAndLabels)(
             path,
             imgsz,
             batch_size,
@@ -195,19 +207,25 @@ def create_dataloader(
             image_weights=image_weights,
             prefix=prefix,
             rank=rank,
+            batch_augment=batch_augment,
+            reduced=reduced_decode,
         )
 
     batch_size = min(batch_size, len(dataset))
     nd = torch.cuda.device_count()  # number of CUDA devices
     nw = min([os.cpu_count() // max(nd, 1), batch_size if batch_size > 1 else 0, workers])  # number of workers
-    sampler = None if rank == -1 else SmartDistributedSampler(dataset, shuffle=shuffle)
-    loader = DataLoader if image_weights else InfiniteDataLoader  # only DataLoader allows for attribute updates
+    if isinstance(getattr(dataset, "ims", None), RAMImageCache):
+        dataset.ims.share_stats(nw)  # per-worker RAM cache hit counters
+    sampler = None if rank == -1 or shards else SmartDistributedSampler(dataset, shuffle=shuffle)
+    loader = (
+        DataLoader if image_weights or shards else InfiniteDataLoader
+    )  # only DataLoader allows for attribute updates
     generator = torch.Generator()
     generator.manual_seed(6148914691236517205 + seed + RANK)
     return loader(
         dataset,
         batch_size=batch_size,
-        shuffle=shuffle and sampler is None,
+        shuffle=shuffle and sampler is None and not shards,  # shards shuffle in the dataset
         num_workers=nw,
         sampler=sampler,
         drop_last=quad,
@@ -322,8 +340,15 @@ class LoadScreenshots:
 class LoadImages:
     """YOLOv5 image/video dataloader, i.e. `python detect.py --source image.jpg/vid.mp4`."""
 
-    def __init__(self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
-        """Initializes YOLOv5 loader for images/videos, supporting glob patterns, directories, and lists of paths."""
+    def __init__(
+        self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1, decoder="opencv", reduced=False
+    ):
+        """Initializes YOLOv5 loader for images/videos, supporting glob patterns, directories, and lists of paths,
+        decoding with a `utils.decoders.DECODERS` backend name or Decoder instance.
+
+        With `reduced`, JPEGs at least twice `img_size` are decoded at a reduced DCT scale whose longest side is still
+        at least `img_size`, so returned `im0` images (and results scaled to them) are smaller than the originals.
+        """
         if isinstance(path, str) and Path(path).suffix == ".txt":  # *.txt file with img/vid/dir on each line
             path = Path(path).read_text().rsplit()
         files = []
@@ -351,6 +376,8 @@ class LoadImages:
         self.auto = auto
         self.transforms = transforms  # optional
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.decoder = get_decoder(decoder)
+        self.decode_size = (max(img_size) if isinstance(img_size, (list, tuple)) else img_size) if reduced else None
         if any(videos):
             self._new_video(videos[0])  # new video
         else:
@@ -392,7 +419,7 @@ class LoadImages:
         else:
             # Read image
             self.count += 1
-            im0 = cv2.imread(path)  # BGR
+            im0 = self.decoder.imread(path, self.decode_size)  # BGR
             assert im0 is not None, f"Image Not Found {path}"
             s = f"image {self.count}/{self.nf} {path}: "
 
@@ -410,7 +437,7 @@ class LoadImages:
         metadata.
         """
         self.frame = 0
-        self.cap = cv2.VideoCapture(path)
+        self.cap = self.decoder.capture(path)
         self.frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) / self.vid_stride)
         self.orientation = int(self.cap.get(cv2.CAP_PROP_ORIENTATION_META))  # rotation degrees
         # self.cap.set(cv2.CAP_PROP_ORIENTATION_AUTO, 0)  # disable https://github.com/ultralytics/yolov5/issues/8493
@@ -433,21 +460,51 @@ class LoadImages:
 class LoadStreams:
     """Loads and processes video streams for YOLOv5, supporting various sources including YouTube and IP cameras."""
 
-    def __init__(self, sources="file.streams", img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
+    def __init__(
+        self,
+        sources="file.streams",
+        img_size=640,
+        stride=32,
+        auto=True,
+        transforms=None,
+        vid_stride=1,
+        buffer=1,
+        drop="oldest",
+        device=None,
+        decoder="opencv",
+        waitkey=True,
+    ):
         """Initializes a stream loader for processing video streams with YOLOv5, supporting various sources including
         YouTube.
+
+        Each stream has a reader thread that letterboxes frames into a ring buffer of `buffer` frames, dropping the
+        'oldest' or 'newest' frame when full. `dropped` and `duplicates` count frames lost and re-used per stream.
+        Equal-shaped streams without `transforms` are letterboxed into preallocated (pinned if `device` is CUDA) uint8
+        slots and batched into a reused (bs, 3, h, w) uint8 buffer, returned as a tensor on `device` if given, else as
+        a numpy array. The returned batch is overwritten by the next iteration. Frames are decoded with `decoder`, a
+        `utils.decoders.DECODERS` backend name or Decoder instance. `waitkey` polls cv2.waitKey() for 'q' to quit, which
+        must be disabled when iterating off the main thread, as OpenCV HighGUI is not thread-safe.
         """
+        assert drop in ("oldest", "newest"), f"invalid drop policy '{drop}', valid policies are 'oldest', 'newest'"
         torch.backends.cudnn.benchmark = True  # faster for fixed-size inference
         self.mode = "stream"
         self.img_size = img_size
         self.stride = stride
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.drop = drop  # frame drop policy when a ring buffer is full
+        self.decoder = get_decoder(decoder)
+        self.waitkey = waitkey  # poll cv2.waitKey() for 'q' to quit
         sources = Path(sources).read_text().rsplit() if os.path.isfile(sources) else [sources]
         n = len(sources)
         self.sources = [clean_str(x) for x in sources]  # clean source names for later
         self.imgs, self.fps, self.frames, self.threads = [None] * n, [0] * n, [0] * n, [None] * n
+        self.buffers = [deque(maxlen=buffer) for _ in range(n)]  # (timestamp, im0, im) ring buffers
+        self.locks = [Lock() for _ in range(n)]
+        self.dropped, self.duplicates = [0] * n, [0] * n  # frame counters
+        self.last = [None] * n  # last (timestamp, im0, im) returned per stream
+        caps = [None] * n
         for i, s in enumerate(sources):  # index, source
-            # Start thread to read frames from video stream
+            # Open video stream
             st = f"{i + 1}/{n}: {s}... "
             if urlparse(s).hostname in ("www.youtube.com", "youtube.com", "youtu.be"):  # if source is YouTube video
                 # YouTube format i.e. 'https://www.youtube.com/watch?v=Zgi9g1ksQHc' or 'https://youtu.be/LNwODJXcvt4'
@@ -459,7 +516,7 @@ class LoadStreams:
             if s == 0:
                 assert not is_colab(), "--source 0 webcam unsupported on Colab. Rerun command in a local environment."
                 assert not is_kaggle(), "--source 0 webcam unsupported on Kaggle. Rerun command in a local environment."
-            cap = cv2.VideoCapture(s)
+            cap = self.decoder.capture(s)
             assert cap.isOpened(), f"{st}Failed to open {s}"
             w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -468,9 +525,8 @@ class LoadStreams:
             self.fps[i] = max((fps if math.isfinite(fps) else 0) % 100, 0) or 30  # 30 FPS fallback
 
             _, self.imgs[i] = cap.read()  # guarantee first frame
-            self.threads[i] = Thread(target=self.update, args=([i, cap, s]), daemon=True)
+            caps[i] = cap, s
             LOGGER.info(f"{st} Success ({self.frames[i]} frames {w}x{h} at {self.fps[i]:.2f} FPS)")
-            self.threads[i].start()
         LOGGER.info("")  # newline
 
         # check for common shapes
@@ -481,8 +537,28 @@ class LoadStreams:
         if not self.rect:
             LOGGER.warning("WARNING ⚠️ Stream shapes differ. For optimal performance supply similarly-shaped streams.")
 
+        # Preallocated buffers, reader threads letterbox into per-stream slots: buffer + 1 being written + 1 last
+        self.staging = transforms is None and self.rect
+        if self.staging:
+            h, w = s[0][:2]
+            self.device = device = torch.device(device) if device is not None else None
+            self.hwc = np.empty((n, h, w, 3), dtype=np.uint8)  # letterbox output per stream
+            self.shape0 = [x.shape for x in self.imgs]  # original frame shapes, re-opened streams may differ
+            self.pool = torch.empty((n, buffer + 2, 3, h, w), dtype=torch.uint8)  # RGB CHW frame slots
+            self.pool = self.pool.pin_memory() if device is not None and device.type == "cuda" else self.pool
+            self.pool_np = self.pool.numpy()  # shared-memory view written by reader threads
+            self.free = [list(range(buffer + 2)) for _ in range(n)]  # free slots per stream
+            self.batch = torch.empty((n, 3, h, w), dtype=torch.uint8, device=device)
+            self.event = torch.cuda.Event() if self.batch.is_cuda else None  # batch copied from pinned slots
+
+        # Start threads to read and letterbox frames from video streams
+        for i, (cap, s) in enumerate(caps):
+            self.put(i, self.imgs[i])  # first frame
+            self.threads[i] = Thread(target=self.update, args=([i, cap, s]), daemon=True)
+            self.threads[i].start()
+
     def update(self, i, cap, stream):
-        """Reads frames from stream `i`, updating imgs array; handles stream reopening on signal loss."""
+        """Reads frames from stream `i` into its ring buffer; handles stream reopening on signal loss."""
         n, f = 0, self.frames[i]  # frame number, frame array
         while cap.isOpened() and n < f:
             n += 1
@@ -494,9 +570,48 @@ class LoadStreams:
                 else:
                     LOGGER.warning("WARNING ⚠️ Video stream unresponsive, please check your IP camera connection.")
                     self.imgs[i] = np.zeros_like(self.imgs[i])
-                    cap.open(stream)  # re-open stream if signal was lost
+                    try:
+                        cap.open(stream)  # re-open stream if signal was lost
+                    except Exception as e:  # i.e. PyAV connection errors, retried on the next frame
+                        LOGGER.warning(f"WARNING ⚠️ Failed to re-open {stream}: {e}")
+                self.put(i, self.imgs[i])
             time.sleep(0.0)  # wait time
 
+    def put(self, i, im0):
+        """Letterboxes (or transforms) frame `im0` of stream `i` and adds it to the ring buffer, applying the drop
+        policy when full.
+        """
+        t = time.time()  # frame timestamp
+        if self.staging:  # letterbox into a free slot, im is the slot index
+            with self.locks[i]:
+                im = self.free[i].pop()
+            if im0.shape == self.shape0[i]:
+                x = letterbox(im0, self.img_size, stride=self.stride, auto=self.auto, dst=self.hwc[i])[0]  # resize
+            else:  # stream re-opened at another resolution, letterbox to the fixed slot shape
+                if self.shape0[i] is not None:
+                    LOGGER.warning(
+                        f"WARNING ⚠️ Stream {i} frame shape changed from {self.shape0[i]} to {im0.shape}, "
+                        f"letterboxing to fixed shape {self.hwc.shape[1:3]}"
+                    )
+                    self.shape0[i] = None  # warn once
+                x = letterbox(im0, self.hwc.shape[1:3], auto=False, dst=self.hwc[i])[0]  # resize
+            np.copyto(self.pool_np[i, im], x.transpose((2, 0, 1))[::-1])  # HWC to CHW, BGR to RGB
+        elif self.transforms:
+            im = self.transforms(im0)  # transforms
+        else:
+            im = letterbox(im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # resize
+            im = np.ascontiguousarray(im[..., ::-1].transpose((2, 0, 1)))  # BGR to RGB, HWC to CHW, contiguous
+        with self.locks[i]:
+            buffer = self.buffers[i]
+            if len(buffer) == buffer.maxlen:
+                self.dropped[i] += 1
+                x = (t, im0, im) if self.drop == "newest" else buffer.popleft()  # dropped frame
+                if self.staging:
+                    self.free[i].append(x[2])
+                if self.drop == "newest":
+                    return
+            buffer.append((t, im0, im))
+
     def __iter__(self):
         """Resets and returns the iterator for iterating over video frames or images in a dataset."""
         self.count = -1
@@ -507,18 +622,34 @@ class LoadStreams:
         done.
         """
         self.count += 1
-        if not all(x.is_alive() for x in self.threads) or cv2.waitKey(1) == ord("q"):  # q to quit
-            cv2.destroyAllWindows()
+        alive = all(x.is_alive() or b for x, b in zip(self.threads, self.buffers))  # stream open or frames buffered
+        if not alive or (self.waitkey and cv2.waitKey(1) == ord("q")):  # q to quit
+            if self.waitkey:
+                cv2.destroyAllWindows()
+            for i, source in enumerate(self.sources):
+                LOGGER.info(f"{source}: {self.dropped[i]} dropped, {self.duplicates[i]} duplicate frames")
             raise StopIteration
 
-        im0 = self.imgs.copy()
-        if self.transforms:
-            im = np.stack([self.transforms(x) for x in im0])  # transforms
+        if self.staging and self.event is not None:
+            self.event.synchronize()  # last batch copied, its slots can be released
+        for i, buffer in enumerate(self.buffers):
+            with self.locks[i]:
+                if buffer:
+                    if self.staging and self.last[i] is not None:
+                        self.free[i].append(self.last[i][2])
+                    self.last[i] = buffer.popleft()
+                else:  # no new frame since the last call
+                    self.duplicates[i] += 1
+        self.timestamps = [x[0] for x in self.last]  # capture time of each returned frame
+        im0 = [x[1] for x in self.last]
+        if self.staging:
+            for i, x in enumerate(self.last):
+                self.batch[i].copy_(self.pool[i, x[2]], non_blocking=True)  # async H2D from pinned slots
+            if self.event is not None:
+                self.event.record()
+            im = self.batch if self.device is not None else self.batch.numpy()
         else:
-            im = np.stack([letterbox(x, self.img_size, stride=self.stride, auto=self.auto)[0] for x in im0])  # resize
-            im = im[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW
-            im = np.ascontiguousarray(im)  # contiguous
-
+            im = np.stack([x[2] for x in self.last])
         return self.sources, im, im0, None, ""
 
     def __len__(self):
@@ -534,10 +665,57 @@ def img2label_paths(img_paths):
     return [sb.join(x.rsplit(sa, 1)).rsplit(".", 1)[0] + ".txt" for x in img_paths]
 
 
+class PackedArrays:
+    """List of variable-length arrays stored CSR-style in one contiguous array with an offsets index, so millions of
+    per-image arrays are two objects that DataLoader workers share copy-on-write without refcount writes.
+    """
+
+    def __init__(self, arrays, shape=(), dtype=np.float32):
+        """Packs `arrays`, each of shape (k, *shape), into `data` with `offsets` so that `self[i]` is `arrays[i]`."""
+        self.offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum([len(x) for x in arrays], out=self.offsets[1:])
+        self.data = np.concatenate([np.zeros((0, *shape), dtype), *arrays], 0).astype(dtype, copy=False)
+
+    def __getitem__(self, i):
+        """Returns array `i` as a view of the packed data."""
+        i = range(len(self))[i]  # supports negative indices, raises IndexError
+        return self.data[self.offsets[i] : self.offsets[i + 1]]
+
+    def __len__(self):
+        """Returns the number of arrays."""
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        """Iterates over array views."""
+        return (self[i] for i in range(len(self)))
+
+
+class PackedSegments:
+    """Per-image lists of (k, 2) segment arrays packed into one points array with per-segment and per-image offsets."""
+
+    def __init__(self, segments):
+        """Packs `segments`, a list of per-image lists of segment arrays, so that `self[i]` is `segments[i]`."""
+        self.points = PackedArrays([s for x in segments for s in x], shape=(2,))
+        self.offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+        np.cumsum([len(x) for x in segments], out=self.offsets[1:])
+
+    def __getitem__(self, i):
+        """Returns the segments of image `i` as a list of views of the packed points."""
+        i = range(len(self))[i]
+        return [self.points[j] for j in range(self.offsets[i], self.offsets[i + 1])]
+
+    def __len__(self):
+        """Returns the number of images."""
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        """Iterates over per-image segment lists."""
+        return (self[i] for i in range(len(self)))
+
+
 class LoadImagesAndLabels(Dataset):
     """Loads images and their corresponding labels for training and validation in YOLOv5."""
 
-    cache_version = 0.6  # dataset labels *.cache version
     rand_interp_methods = [cv2.INTER_NEAREST, cv2.INTER_LINEAR, cv2.INTER_CUBIC, cv2.INTER_AREA, cv2.INTER_LANCZOS4]
 
     def __init__(
@@ -557,10 +735,18 @@ class LoadImagesAndLabels(Dataset):
         prefix="",
         rank=-1,
         seed=0,
+        reduced=False,
+        batch_augment=False,
     ):
-        """Initializes the YOLOv5 dataset loader, handling images and their labels, caching, and preprocessing."""
+        """Initializes the YOLOv5 dataset loader, handling images and their labels, caching, and preprocessing.
+
+        With `reduced`, JPEGs at least twice `img_size` are decoded at 1/2, 1/4 or 1/8 scale before resizing. With
+        `batch_augment`, augmented samples are unwarped canvases for BatchAugment, see load_canvas().
+        """
         self.img_size = img_size
+        self.reduced = reduced  # reduced-resolution JPEG decode
         self.augment = augment
+        self.batch_augment = batch_augment and augment  # warp, MixUp, HSV and flips on the training device
         self.hyp = hyp
         self.image_weights = image_weights
         self.rect = False if image_weights else rect
@@ -594,24 +780,11 @@ class LoadImagesAndLabels(Dataset):
         # Check cache
         self.label_files = img2label_paths(self.im_files)  # labels
         cache_path = (p if p.is_file() else Path(self.label_files[0]).parent).with_suffix(".cache")
-        try:
-            cache, exists = np.load(cache_path, allow_pickle=True).item(), True  # load dict
-            assert cache["version"] == self.cache_version  # matches current version
-            assert cache["hash"] == get_hash(self.label_files + self.im_files)  # identical hash
-        except Exception:
-            cache, exists = self.cache_labels(cache_path, prefix), False  # run cache ops
-
-        # Display cache
+        cache = self.cache_labels(cache_path, prefix)  # verify new or modified files only
         nf, nm, ne, nc, n = cache.pop("results")  # found, missing, empty, corrupt, total
-        if exists and LOCAL_RANK in {-1, 0}:
-            d = f"Scanning {cache_path}... {nf} images, {nm + ne} backgrounds, {nc} corrupt"
-            tqdm(None, desc=prefix + d, total=n, initial=n, bar_format=TQDM_BAR_FORMAT)  # display cache results
-            if cache["msgs"]:
-                LOGGER.info("\n".join(cache["msgs"]))  # display warnings
         assert nf > 0 or not augment, f"{prefix}No labels found in {cache_path}, can not start training. {HELP_URL}"
 
         # Read cache
-        [cache.pop(k) for k in ("hash", "version", "msgs")]  # remove items
         labels, shapes, self.segments = zip(*cache.values())
         nl = len(np.concatenate(labels, 0))  # number of labels
         assert nl > 0 or not augment, f"{prefix}All labels empty in {cache_path}, can not start training. {HELP_URL}"
@@ -679,84 +852,98 @@ class LoadImagesAndLabels(Dataset):
 
             self.batch_shapes = np.ceil(np.array(shapes) * img_size / stride + pad).astype(int) * stride
 
+        # Pack labels and segments into contiguous arrays, indexing returns per-image views
+        self.labels = PackedArrays(self.labels, shape=(5,))
+        self.segments = PackedSegments(self.segments)
+
         # Cache images into RAM/disk for faster training
-        if cache_images == "ram" and not self.check_cache_ram(prefix=prefix):
-            cache_images = False
-        self.ims = [None] * n
-        self.npy_files = [Path(f).with_suffix(".npy") for f in self.im_files]
-        if cache_images:
-            b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
-            self.im_hw0, self.im_hw = [None] * n, [None] * n
-            fcn = self.cache_images_to_disk if cache_images == "disk" else self.load_image
-            with ThreadPool(NUM_THREADS) as pool:
-                results = pool.imap(lambda i: (i, fcn(i)), self.indices)
-                pbar = tqdm(results, total=len(self.indices), bar_format=TQDM_BAR_FORMAT, disable=LOCAL_RANK > 0)
-                for i, x in pbar:
-                    if cache_images == "disk":
-                        b += self.npy_files[i].stat().st_size
-                    else:  # 'ram'
-                        self.ims[i], self.im_hw0[i], self.im_hw[i] = x  # im, hw_orig, hw_resized = load_image(self, i)
-                        b += self.ims[i].nbytes * WORLD_SIZE
-                    pbar.desc = f"{prefix}Caching images ({b / gb:.1f}GB {cache_images})"
-                pbar.close()
+        self.ims = None  # image cache
+        if cache_images == "disk":  # packed memory-mapped cache, shared by DataLoader workers and DDP ranks
+            self.cache_images_to_disk(cache_path.with_suffix(f".{img_size}.images"), prefix)
+        elif cache_images:  # 'ram', 'ram:jpeg' or 'ram:lz4', optionally with a GB budget, i.e. 'ram:jpeg:16'
+            _, codec, budget = (*str(cache_images).split(":"), None, None)[:3]
+            budget = float(budget) * (1 << 30) if budget else self.check_cache_ram(prefix=prefix)
+            self.cache_images_to_ram(RAMImageCache(budget, codec or "raw"), prefix)
 
     def check_cache_ram(self, safety_margin=0.1, prefix=""):
-        """Checks if available RAM is sufficient for caching images, adjusting for a safety margin."""
-        b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
-        n = min(self.n, 30)  # extrapolate from 30 random images
-        for _ in range(n):
-            im = cv2.imread(random.choice(self.im_files))  # sample image
-            ratio = self.img_size / max(im.shape[0], im.shape[1])  # max(h, w)  # ratio
-            b += im.nbytes * ratio**2
-        mem_required = b * self.n / n  # GB required to cache dataset into RAM
+        """Returns the RAM budget in bytes for caching images, the available RAM less a safety margin shared by all
+        DDP ranks, logging if the uncompressed dataset exceeds it.
+        """
+        gb = 1 << 30  # bytes per gigabytes
+        r = self.img_size / self.shapes.max(1)  # resize ratios
+        mem_required = (np.ceil(self.shapes * r[:, None]).prod(1) * 3).sum()  # bytes to cache resized dataset in RAM
         mem = psutil.virtual_memory()
-        cache = mem_required * (1 + safety_margin) < mem.available  # to cache or not to cache, that is the question
-        if not cache:
+        budget = mem.available / (1 + safety_margin) / WORLD_SIZE
+        if mem_required > budget:
             LOGGER.info(
                 f"{prefix}{mem_required / gb:.1f}GB RAM required, "
                 f"{mem.available / gb:.1f}/{mem.total / gb:.1f}GB available, "
-                f"{'caching images ✅' if cache else 'not caching images ⚠️'}"
+                f"caching {budget / gb:.1f}GB of images ⚠️"
             )
-        return cache
+        return budget
 
     def cache_labels(self, path=Path("./labels.cache"), prefix=""):
-        """Caches dataset labels, verifies images, reads shapes, and tracks dataset integrity."""
+        """Caches dataset labels in an incremental SQLite cache, verifying only new or modified images and labels,
+        reading shapes and tracking dataset integrity.
+        """
         x = {}  # dict
         nm, nf, ne, nc, msgs = 0, 0, 0, 0, []  # number missing, found, empty, corrupt, messages
         desc = f"{prefix}Scanning {path.parent / path.stem}..."
-        with Pool(NUM_THREADS) as pool:
-            pbar = tqdm(
-                pool.imap(verify_image_label, zip(self.im_files, self.label_files, repeat(prefix))),
-                desc=desc,
-                total=len(self.im_files),
-                bar_format=TQDM_BAR_FORMAT,
-            )
-            for im_file, lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg in pbar:
-                nm += nm_f
-                nf += nf_f
-                ne += ne_f
-                nc += nc_f
-                if im_file:
-                    x[im_file] = [lb, shape, segments]
-                if msg:
-                    msgs.append(msg)
-                pbar.desc = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
-
-        pbar.close()
-        if msgs:
-            LOGGER.info("\n".join(msgs))
-        if nf == 0:
-            LOGGER.warning(f"{prefix}WARNING ⚠️ No labels found in {path}. {HELP_URL}")
-        x["hash"] = get_hash(self.label_files + self.im_files)
-        x["results"] = nf, nm, ne, nc, len(self.im_files)
-        x["msgs"] = msgs  # warnings
-        x["version"] = self.cache_version  # cache version
+        with ThreadPool(NUM_THREADS) as pool:  # image and label file stats
+            keys = dict(zip(self.im_files, pool.starmap(LabelCache.key, zip(self.im_files, self.label_files))))
         try:
-            np.save(path, x)  # save cache for next time
-            path.with_suffix(".cache.npy").rename(path)  # remove .npy suffix
-            LOGGER.info(f"{prefix}New cache created: {path}")
+            db = LabelCache(path)
+            entries = db.get(keys)  # {im_file: (lb, shape, segments, nm, nf, ne, nc, msg)}
         except Exception as e:
             LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")  # not writeable
+            db, entries = None, {}
+        for f in self.im_files:
+            if f in entries:
+                nm, nf, ne, nc = nm + entries[f][3], nf + entries[f][4], ne + entries[f][5], nc + entries[f][6]
+
+        # Verify new or modified images and labels
+        todo = [(f, lb) for f, lb in zip(self.im_files, self.label_files) if f not in entries]
+        n, rows = len(self.im_files), []
+        if todo:
+            with Pool(NUM_THREADS) as pool:
+                pbar = tqdm(
+                    pool.imap(verify_image_label, zip(*zip(*todo), repeat(prefix))),
+                    desc=desc,
+                    total=n,
+                    initial=n - len(todo),
+                    bar_format=TQDM_BAR_FORMAT,
+                )
+                for (_, lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg), (f, _) in zip(pbar, todo):
+                    nm += nm_f
+                    nf += nf_f
+                    ne += ne_f
+                    nc += nc_f
+                    entries[f] = lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg
+                    rows.append((f, keys[f], *entries[f]))
+                    pbar.desc = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
+            pbar.close()
+        elif LOCAL_RANK in {-1, 0}:
+            d = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
+            tqdm(None, desc=d, total=n, initial=n, bar_format=TQDM_BAR_FORMAT)  # display cache results
+        for f in self.im_files:
+            lb, shape, segments, *_, nc_f, msg = entries[f]
+            if not nc_f:  # not corrupt
+                x[f] = [lb, shape, segments]
+            if msg:
+                msgs.append(msg)
+        if msgs and (todo or LOCAL_RANK in {-1, 0}):
+            LOGGER.info("\n".join(msgs))
+        if nf == 0:
+            LOGGER.warning(f"{prefix}WARNING ⚠️ No labels found in {path}. {HELP_URL}")
+        x["results"] = nf, nm, ne, nc, n
+        if db is not None:
+            try:
+                db.put(rows)  # merge new and modified entries
+                if rows:
+                    LOGGER.info(f"{prefix}Label cache updated: {path} ({len(rows)} new or modified images)")
+            except Exception as e:
+                LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")
+            db.close()
         return x
 
     def __len__(self):
@@ -772,6 +959,8 @@ class LoadImagesAndLabels(Dataset):
     def __getitem__(self, index):
         """Fetches the dataset item at the given index, considering linear, shuffled, or weighted sampling."""
         index = self.indices[index]  # linear, shuffled, or image_weights
+        if self.batch_augment:
+            return self.load_canvas(index)
 
         hyp = self.hyp
         if mosaic := self.mosaic and random.random() < hyp["mosaic"]:
@@ -851,34 +1040,94 @@ class LoadImagesAndLabels(Dataset):
 
         Returns (im, original hw, resized hw)
         """
-        im, f, fn = (
-            self.ims[i],
-            self.im_files[i],
-            self.npy_files[i],
-        )
-        if im is None:  # not cached in RAM
-            if fn.exists():  # load npy
-                im = np.load(fn)
-            else:  # read image
-                im = cv2.imread(f)  # BGR
-                assert im is not None, f"Image Not Found {f}"
-            h0, w0 = im.shape[:2]  # orig hw
-            r = self.img_size / max(h0, w0)  # ratio
-            if r != 1:  # if sizes are not equal
-                interp = cv2.INTER_LINEAR if (self.augment or r > 1) else cv2.INTER_AREA
-                im = cv2.resize(im, (math.ceil(w0 * r), math.ceil(h0 * r)), interpolation=interp)
-            return im, (h0, w0), im.shape[:2]  # im, hw_original, hw_resized
-        return self.ims[i], self.im_hw0[i], self.im_hw[i]  # im, hw_original, hw_resized
-
-    def cache_images_to_disk(self, i):
-        """Saves an image to disk as an *.npy file for quicker loading, identified by index `i`."""
-        f = self.npy_files[i]
-        if not f.exists():
-            np.save(f.as_posix(), cv2.imread(self.im_files[i]))
-
-    def load_mosaic(self, index):
-        """Loads a 4-image mosaic for YOLOv5, combining 1 selected and 3 random images, with labels and segments."""
-        labels4, segments4 = [], []
+        if self.ims is not None and (x := self.ims.get(i)) is not None:
+            return x  # im, hw_original, hw_resized
+        f = self.im_files[i]
+        flag = cv2.IMREAD_COLOR
+        if self.reduced and f.rsplit(".", 1)[-1].lower() in JPEG_FORMATS:  # 1/2, 1/4 or 1/8 scale if >= img_size
+            flag = reduced_flag(self.shapes[i], self.img_size)
+        im = self.imread(i, flag)  # BGR
+        assert im is not None, f"Image Not Found {f}"
+        h0, w0 = im.shape[:2]  # orig hw
+        if flag != cv2.IMREAD_COLOR:  # reduced decode, orig hw from the labels cache in decoded orientation
+            w, h = map(int, self.shapes[i])
+            h0, w0 = (h, w) if (h0 > w0) == (h > w) else (w, h)
+        r = self.img_size / max(h0, w0)  # ratio
+        if im.shape[:2] != (h0, w0) or r != 1:  # if sizes are not equal
+            interp = cv2.INTER_LINEAR if (self.augment or r > 1) else cv2.INTER_AREA
+            im = cv2.resize(im, (math.ceil(w0 * r), math.ceil(h0 * r)), interpolation=interp)
+        if self.ims is not None:
+            self.ims.put(i, im, (h0, w0), im.shape[:2])
+        return im, (h0, w0), im.shape[:2]  # im, hw_original, hw_resized
+
+    def imread(self, i, flag=cv2.IMREAD_COLOR):
+        """Decodes image `i` with cv2.imread() `flag`, returning a BGR array or None if unreadable."""
+        return cv2.imread(self.im_files[i], flag)
+
+    def cache_images_to_disk(self, path, prefix=""):
+        """Caches resized images into a packed memory-mapped file at `path`, building it in parallel if missing or
+        stale, and uses it as the image cache.
+        """
+        cache = MmapImageCache(path, self.im_files, get_hash(sorted(self.im_files)), self.img_size)
+        if not cache.load():
+            try:
+                cache.build(self.load_image, prefix)
+            except Exception as e:
+                LOGGER.warning(f"{prefix}WARNING ⚠️ Image cache {path} could not be written, not caching images: {e}")
+                return
+        LOGGER.info(f"{prefix}Caching images ({cache})")
+        self.ims = cache
+
+    def cache_images_to_ram(self, cache, prefix=""):
+        """Fills RAM image `cache` with images loaded in parallel until its budget is reached, and uses it as the image
+        cache, adding images loaded later until evicted.
+        """
+        self.ims, gb = cache, 1 << 30  # bytes per gigabytes
+        with ThreadPool(NUM_THREADS) as pool:
+            pbar = tqdm(pool.imap(self.load_image, self.indices), total=len(self.indices), bar_format=TQDM_BAR_FORMAT)
+            for _ in pbar:
+                pbar.desc = f"{prefix}Caching images ({cache.nbytes / gb:.1f}GB ram {cache.codec})"
+                if cache.full:
+                    break
+            pbar.close()
+        cache.stats.zero_()  # count training lookups only
+        LOGGER.info(f"{prefix}Caching images ({cache})")
+
+    def load_canvas(self, index):
+        """Loads a mosaic, or a letterboxed image centered in a 114 gray canvas, of 2 * img_size without warping for
+        BatchAugment, returning (im, targets (n, 6) of 0, class and pixel xyxy, path, mosaic) like __getitem__(), with
+        whether the canvas is a mosaic in place of shapes so that BatchAugment only applies MixUp to mosaics.
+        """
+        s = self.img_size
+        if mosaic := self.mosaic and random.random() < self.hyp["mosaic"]:
+            img, labels = self.load_mosaic(index, warp=False)
+        else:
+            img, _, (h, w) = self.load_image(index)
+            img, ratio, pad = letterbox(img, s, auto=False)
+            labels = self.labels[index].copy()
+            if labels.size:  # normalized xywh to canvas pixel xyxy format
+                labels[:, 1:] = xywhn2xyxy(labels[:, 1:], ratio[0] * w, ratio[1] * h, pad[0] + s // 2, pad[1] + s // 2)
+            img = cv2.copyMakeBorder(img, s // 2, s - s // 2, s // 2, s - s // 2, cv2.BORDER_CONSTANT, value=(114,) * 3)
+
+        # Albumentations, pixel-level transforms only, on normalized labels and also for background images
+        normalize = self.albumentations.transform and len(labels)
+        if normalize:
+            labels[:, 1:] = xyxy2xywhn(labels[:, 1:], w=2 * s, h=2 * s, clip=True, eps=1e-3)
+        img, labels = self.albumentations(img, labels)
+        if normalize:
+            labels[:, 1:] = xywhn2xyxy(labels[:, 1:], w=2 * s, h=2 * s)
+
+        labels_out = torch.zeros((len(labels), 6))
+        if len(labels):
+            labels_out[:, 1:] = torch.from_numpy(labels)
+        img = np.ascontiguousarray(img.transpose((2, 0, 1))[::-1])  # HWC to CHW, BGR to RGB
+        return torch.from_numpy(img), labels_out, self.im_files[index], mosaic
+
+    def load_mosaic(self, index, warp=True):
+        """Loads a 4-image mosaic for YOLOv5, combining 1 selected and 3 random images, with labels and segments, and
+        applies random_perspective() if `warp`, otherwise returning the 2 * img_size mosaic.
+        """
+        labels4, segments4, tiles = [], [], []
         s = self.img_size
         yc, xc = (int(random.uniform(-x, 2 * s + x)) for x in self.mosaic_border)  # mosaic center x, y
         indices = [index] + random.choices(self.indices, k=3)  # 3 additional image indices
@@ -889,7 +1138,6 @@ class LoadImagesAndLabels(Dataset):
 
             # place img in img4
             if i == 0:  # top left
-                img4 = np.full((s * 2, s * 2, img.shape[2]), 114, dtype=np.uint8)  # base image with 4 tiles
                 x1a, y1a, x2a, y2a = max(xc - w, 0), max(yc - h, 0), xc, yc  # xmin, ymin, xmax, ymax (large image)
                 x1b, y1b, x2b, y2b = w - (x2a - x1a), h - (y2a - y1a), w, h  # xmin, ymin, xmax, ymax (small image)
             elif i == 1:  # top right
@@ -902,7 +1150,7 @@ class LoadImagesAndLabels(Dataset):
                 x1a, y1a, x2a, y2a = xc, yc, min(xc + w, s * 2), min(s * 2, yc + h)
                 x1b, y1b, x2b, y2b = 0, 0, min(w, x2a - x1a), min(y2a - y1a, h)
 
-            img4[y1a:y2a, x1a:x2a] = img[y1b:y2b, x1b:x2b]  # img4[ymin:ymax, xmin:xmax]
+            tiles.append((img[y1b:y2b, x1b:x2b], (x1a, y1a)))  # img4[ymin:ymax, xmin:xmax]
             padw = x1a - x1b
             padh = y1a - y1b
 
@@ -920,8 +1168,14 @@ class LoadImagesAndLabels(Dataset):
             np.clip(x, 0, 2 * s, out=x)  # clip when using random_perspective()
         # img4, labels4 = replicate(img4, labels4)  # replicate
 
-        # Augment
-        img4, labels4, segments4 = copy_paste(img4, labels4, segments4, p=self.hyp["copy_paste"])
+        # Augment, warping tiles directly into the output unless copy-paste or BatchAugment need the canvas
+        canvas, img4 = (s * 2, s * 2, 3), None  # canvas shape
+        if not warp or (self.hyp["copy_paste"] and segments4):
+            img4 = paste_tiles(canvas, tiles)
+            img4, labels4, segments4 = copy_paste(img4, labels4, segments4, p=self.hyp["copy_paste"])
+            if not warp:
+                return img4, labels4
+            tiles = None
         img4, labels4 = random_perspective(
             img4,
             labels4,
@@ -932,6 +1186,8 @@ class LoadImagesAndLabels(Dataset):
             shear=self.hyp["shear"],
             perspective=self.hyp["perspective"],
             border=self.mosaic_border,
+            tiles=tiles,
+            shape=canvas,
         )  # border to remove
 
         return img4, labels4
@@ -940,7 +1196,7 @@ class LoadImagesAndLabels(Dataset):
         """Loads 1 image + 8 random images into a 9-image mosaic for augmented YOLOv5 training, returning labels and
         segments.
         """
-        labels9, segments9 = [], []
+        labels9, segments9, tiles = [], [], []
         s = self.img_size
         indices = [index] + random.choices(self.indices, k=8)  # 8 additional image indices
         random.shuffle(indices)
@@ -951,7 +1207,6 @@ class LoadImagesAndLabels(Dataset):
 
             # place img in img9
             if i == 0:  # center
-                img9 = np.full((s * 3, s * 3, img.shape[2]), 114, dtype=np.uint8)  # base image with 4 tiles
                 h0, w0 = h, w
                 c = s, s, s + w, s + h  # xmin, ymin, xmax, ymax (base) coordinates
             elif i == 1:  # top
@@ -983,12 +1238,12 @@ class LoadImagesAndLabels(Dataset):
             segments9.extend(segments)
 
             # Image
-            img9[y1:y2, x1:x2] = img[y1 - pady :, x1 - padx :]  # img9[ymin:ymax, xmin:xmax]
+            tiles.append((img[y1 - pady : y2 - pady, x1 - padx : x2 - padx], (x1, y1)))  # img9[ymin:ymax, xmin:xmax]
             hp, wp = h, w  # height, width previous
 
         # Offset
         yc, xc = (int(random.uniform(0, s)) for _ in self.mosaic_border)  # mosaic center x, y
-        img9 = img9[yc : yc + 2 * s, xc : xc + 2 * s]
+        tiles = [(x, (x1 - xc, y1 - yc)) for x, (x1, y1) in tiles]  # img9[yc : yc + 2 * s, xc : xc + 2 * s]
 
         # Concat/clip labels
         labels9 = np.concatenate(labels9, 0)
@@ -1001,8 +1256,12 @@ class LoadImagesAndLabels(Dataset):
             np.clip(x, 0, 2 * s, out=x)  # clip when using random_perspective()
         # img9, labels9 = replicate(img9, labels9)  # replicate
 
-        # Augment
-        img9, labels9, segments9 = copy_paste(img9, labels9, segments9, p=self.hyp["copy_paste"])
+        # Augment, warping tiles directly into the output unless copy-paste needs the canvas
+        canvas, img9 = (s * 2, s * 2, 3), None  # canvas shape
+        if self.hyp["copy_paste"] and segments9:
+            img9 = paste_tiles(canvas, tiles)
+            img9, labels9, segments9 = copy_paste(img9, labels9, segments9, p=self.hyp["copy_paste"])
+            tiles = None
         img9, labels9 = random_perspective(
             img9,
             labels9,
@@ -1013,6 +1272,8 @@ class LoadImagesAndLabels(Dataset):
             shear=self.hyp["shear"],
             perspective=self.hyp["perspective"],
             border=self.mosaic_border,
+            tiles=tiles,
+            shape=canvas,
         )  # border to remove
 
         return img9, labels9
@@ -1054,6 +1315,235 @@ class LoadImagesAndLabels(Dataset):
         return torch.stack(im4, 0), torch.cat(label4, 0), path4, shapes4
 
 
+class LoadImagesAndLabelsShards(IterableDataset, LoadImagesAndLabels):
+    """Streams images and labels from tar or WebDataset-style shards, i.e. 'train-{000000..000099}.tar' with 'key.jpg'
+    and 'key.txt' members, reading each shard sequentially and shuffling within a buffer of samples that is also the
+    image pool of mosaic and MixUp.
+
+    Shards are split across DDP ranks and DataLoader workers, by sample if there are fewer shards than ranks or workers,
+    and every rank yields the same number of samples per epoch.
+    """
+
+    def __init__(
+        self,
+        path,
+        img_size=640,
+        batch_size=16,
+        augment=False,
+        hyp=None,
+        rect=False,
+        image_weights=False,
+        cache_images=False,
+        single_cls=False,
+        stride=32,
+        pad=0.0,
+        min_items=0,
+        prefix="",
+        rank=-1,
+        seed=0,
+        reduced=False,
+        batch_augment=False,
+        buffer=1000,
+    ):
+        """Initializes the shard dataset, scanning shard labels and image shapes into the label cache; arguments are
+        those of LoadImagesAndLabels plus the shuffle `buffer` size in samples, 1 (stream order) without augmentation.
+        """
+        for k, v in {
+            "rect": rect,
+            "image_weights": image_weights,
+            "cache": cache_images,
+            "min_items": min_items,
+        }.items():
+            if v:
+                LOGGER.warning(f"{prefix}WARNING ⚠️ {k} is not supported for shard datasets, ignoring {k}={v}")
+        self.img_size = img_size
+        self.reduced = reduced
+        self.augment = augment
+        self.batch_augment = batch_augment and augment
+        self.hyp = hyp
+        self.prefix = prefix  # for warnings
+        self.image_weights = False
+        self.rect = False
+        self.mosaic = augment
+        self.mosaic_border = [-img_size // 2, -img_size // 2]
+        self.stride = stride
+        self.path = path
+        self.albumentations = Albumentations(size=img_size) if augment else None
+        self.buffer = max(buffer, 1) if augment else 1
+        self.single_cls = single_cls
+        self.ims = None
+        self.rank, self.world = (RANK, WORLD_SIZE) if rank > -1 else (0, 1)
+
+        try:
+            self.shards = expand_shards(path)
+            assert self.shards, f"{prefix}No shards found"
+        except Exception as e:
+            raise Exception(f"{prefix}Error loading data from {path}: {e}\n{HELP_URL}") from e
+
+        # Check cache
+        cache_path = Path(self.shards[0]).parent.with_suffix(".cache")
+        cache = self.cache_shards(cache_path, prefix)
+        nf, nm, ne, nc, n = cache.pop("results")  # found, missing, empty, corrupt, total
+        assert nf > 0 or not augment, f"{prefix}No labels found in {path}, can not start training. {HELP_URL}"
+
+        # Read cache
+        labels, shapes, segments = zip(*cache.values())
+        assert len(np.concatenate(labels, 0)) or not augment, f"{prefix}All labels empty in {path}. {HELP_URL}"
+        self.im_files = list(cache.keys())
+        self.shapes = np.array(shapes)
+        self.n = len(self.shapes)
+        self.indices = np.arange(self.n)
+        self.labels = PackedArrays(labels, shape=(5,))
+        self.segments = PackedSegments(segments)
+        if single_cls:
+            self.labels.data[:, 0] = 0
+
+        # Split shards, or samples by path hash if there are fewer shards than ranks, equalizing rank lengths
+        shard = {f: i for i, f in enumerate(self.shards)}
+        self.shard_ids = np.array([shard[shard_file(f)] for f in self.im_files], dtype=np.int64)
+        self.hashes = np.array([zlib.crc32(f.encode()) for f in self.im_files], dtype=np.int64)
+        self.split = len(self.shards) >= self.world  # split ranks by shard
+        ranks = (self.shard_ids if self.split else self.hashes) % self.world
+        self.length = int(np.bincount(ranks, minlength=self.world).min())  # samples per rank and epoch
+        self.rank_mask = ranks == self.rank
+
+    def cache_shards(self, path, prefix=""):
+        """Caches shard labels and image shapes in the label cache keyed on shard modification time and size, scanning
+        only new or modified shards, and returns them like cache_labels().
+        """
+        x = {}
+        nm, nf, ne, nc, msgs = 0, 0, 0, 0, []  # number missing, found, empty, corrupt, messages
+        desc = f"{prefix}Scanning {path.parent / path.stem} shards..."
+        with ThreadPool(NUM_THREADS) as pool:
+            keys = dict(zip(self.shards, pool.starmap(LabelCache.key, zip(self.shards, self.shards))))
+        try:
+            db = LabelCache(path)
+            entries = db.get(keys, members=True)
+        except Exception as e:
+            LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")
+            db, entries = None, {}
+        done = {shard_file(f) for f in entries}
+        todo, rows = [f for f in self.shards if f not in done], []
+        if todo:
+            with Pool(NUM_THREADS) as pool:
+                pbar = tqdm(
+                    pool.imap(scan_shard, zip(todo, repeat(prefix))),
+                    desc=desc,
+                    total=len(self.shards),
+                    initial=len(self.shards) - len(todo),
+                    bar_format=TQDM_BAR_FORMAT,
+                )
+                for results, shard in zip(pbar, todo):
+                    for f, *entry in results:
+                        entries[f] = tuple(entry)
+                        rows.append((f, keys[shard], *entry))
+                    pbar.desc = f"{desc} {len(entries)} images"
+            pbar.close()
+        for f in sorted(entries):
+            lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg = entries[f]
+            nm, nf, ne, nc = nm + nm_f, nf + nf_f, ne + ne_f, nc + nc_f
+            if not nc_f:  # not corrupt
+                x[f] = [lb, shape, segments]
+            if msg:
+                msgs.append(msg)
+        if LOCAL_RANK in {-1, 0}:
+            n = len(entries)
+            d = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
+            tqdm(None, desc=d, total=n, initial=n, bar_format=TQDM_BAR_FORMAT)  # display cache results
+            if msgs:
+                LOGGER.info("\n".join(msgs))
+        x["results"] = nf, nm, ne, nc, len(entries)
+        if db is not None:
+            try:
+                db.put(rows)
+                if rows:
+                    LOGGER.info(f"{prefix}Label cache updated: {path} ({len(todo)} new or modified shards)")
+            except Exception as e:
+                LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")
+            db.close()
+        return x
+
+    def __len__(self):
+        """Returns the number of samples per rank and epoch."""
+        return self.length
+
+    def __iter__(self):
+        """Yields this worker's share of the rank's samples, reading its shards in a per-epoch shuffled order and
+        returning random samples of the shuffle buffer as they are replaced by new ones.
+        """
+        info = torch.utils.data.get_worker_info()
+        wid, nw = (info.id, info.num_workers) if info else (0, 1)
+        seed = info.seed - info.id if info else random.getrandbits(32)  # same shard order in all workers of an epoch
+        shards = sorted(set(self.shard_ids[self.rank_mask].tolist()))
+        if self.augment:
+            random.Random(seed).shuffle(shards)
+        split = len(shards) >= nw  # split workers by shard
+        owner = {s: i % nw for i, s in enumerate(shards)}
+        workers = (
+            np.array([owner[s] for s in self.shard_ids[self.rank_mask]], dtype=np.int64)
+            if split
+            else self.hashes[self.rank_mask] // self.world % nw
+        )
+        c = np.r_[0, np.cumsum(np.bincount(workers, minlength=nw))]
+        q = c * self.length // max(c[-1], 1)  # rank length divided over workers in proportion to their samples
+        quota = int(q[wid + 1] - q[wid])
+
+        # Shuffle buffer, indexed by LoadImagesAndLabels.__getitem__() and load_mosaic()
+        buf = copy.copy(self)
+        buf.im_files, buf.shapes, buf.labels, buf.segments, buf.samples, buf.indices = [], [], [], [], [], range(0)
+        n = 0  # yielded samples
+        for sample in self.stream(shards[wid::nw] if split else shards, None if split else (wid, nw)):
+            if len(buf.samples) < self.buffer:
+                for k, v in zip(("im_files", "shapes", "labels", "segments", "samples"), sample):
+                    getattr(buf, k).append(v)
+                buf.indices = range(len(buf.samples))
+                continue
+            if n == quota:
+                return
+            j = random.randrange(len(buf.samples))
+            yield buf[j]
+            n += 1
+            buf.im_files[j], buf.shapes[j], buf.labels[j], buf.segments[j], buf.samples[j] = sample
+        order = list(buf.indices)
+        if self.augment:
+            random.shuffle(order)
+        while n < quota and order:  # drain the buffer, repeating samples if shards changed since they were scanned
+            yield buf[order[n % len(order)]]
+            n += 1
+
+    def stream(self, shards, worker=None):
+        """Yields (im_file, shape, labels, segments, image bytes) of valid samples of this rank in `shards`, filtered
+        by path hash for `worker` (id, number of workers) if given.
+        """
+        for s in shards:
+            file = self.shards[s]
+            for key, sample in iter_shard(file):
+                ext = next((k for k in sample if k in IMG_FORMATS), None)
+                if ext is None:
+                    continue  # no image
+                f = f"{file}/{key}.{ext}"
+                h = zlib.crc32(f.encode())
+                if not self.split and h % self.world != self.rank:
+                    continue  # another rank
+                if worker and h // self.world % worker[1] != worker[0]:
+                    continue  # another worker
+                try:
+                    with Image.open(io.BytesIO(sample[ext])) as im:
+                        shape = exif_size(im)
+                    lb, segments, _ = parse_label(sample["txt"].decode(), f) if "txt" in sample else (None, [], "")
+                except Exception as e:
+                    LOGGER.warning(f"{self.prefix}WARNING ⚠️ {f}: ignoring corrupt image/label: {e}")
+                    continue
+                lb = np.zeros((0, 5), dtype=np.float32) if lb is None else lb
+                if self.single_cls:
+                    lb[:, 0] = 0
+                yield f, shape, lb, segments, sample[ext]
+
+    def imread(self, i, flag=cv2.IMREAD_COLOR):
+        """Decodes the encoded image of shuffle buffer sample `i`."""
+        return cv2.imdecode(np.frombuffer(self.samples[i], np.uint8), flag)
+
+
 # Ancillary functions --------------------------------------------------------------------------------------------------
 def flatten_recursive(path=DATASETS_DIR / "coco128"):
     """Flattens a directory by copying all files from subdirectories to a new top-level directory, preserving
@@ -1133,6 +1623,32 @@ def autosplit(path=DATASETS_DIR / "coco128/images", weights=(0.9, 0.1, 0.0), ann
                 f.write(f"./{img.relative_to(path.parent).as_posix()}" + "\n")  # add image to txt file
 
 
+def parse_label(text, im_file, prefix="", msg=""):
+    """Parses and verifies the YOLO label `text` of `im_file`, removing duplicate rows, returning (labels (n, 5) xywh,
+    segments, message).
+    """
+    segments = []
+    lb = [x.split() for x in text.strip().splitlines() if len(x)]
+    if any(len(x) > 6 for x in lb):  # is segment
+        classes = np.array([x[0] for x in lb], dtype=np.float32)
+        segments = [np.array(x[1:], dtype=np.float32).reshape(-1, 2) for x in lb]  # (cls, xy1...)
+        lb = np.concatenate((classes.reshape(-1, 1), segments2boxes(segments)), 1)  # (cls, xywh)
+    lb = np.array(lb, dtype=np.float32)
+    if nl := len(lb):
+        assert lb.shape[1] == 5, f"labels require 5 columns, {lb.shape[1]} columns detected"
+        assert (lb >= 0).all(), f"negative label values {lb[lb < 0]}"
+        assert (lb[:, 1:] <= 1).all(), f"non-normalized or out of bounds coordinates {lb[:, 1:][lb[:, 1:] > 1]}"
+        _, i = np.unique(lb, axis=0, return_index=True)
+        if len(i) < nl:  # duplicate row check
+            lb = lb[i]  # remove duplicates
+            if segments:
+                segments = [segments[x] for x in i]
+            msg = f"{prefix}WARNING ⚠️ {im_file}: {nl - len(i)} duplicate labels removed"
+    else:
+        lb = np.zeros((0, 5), dtype=np.float32)
+    return lb, segments, msg
+
+
 def verify_image_label(args):
     """Verifies a single image-label pair, ensuring image format, size, and legal label values."""
     im_file, lb_file, prefix = args
@@ -1155,25 +1671,8 @@ def verify_image_label(args):
         if os.path.isfile(lb_file):
             nf = 1  # label found
             with open(lb_file) as f:
-                lb = [x.split() for x in f.read().strip().splitlines() if len(x)]
-                if any(len(x) > 6 for x in lb):  # is segment
-                    classes = np.array([x[0] for x in lb], dtype=np.float32)
-                    segments = [np.array(x[1:], dtype=np.float32).reshape(-1, 2) for x in lb]  # (cls, xy1...)
-                    lb = np.concatenate((classes.reshape(-1, 1), segments2boxes(segments)), 1)  # (cls, xywh)
-                lb = np.array(lb, dtype=np.float32)
-            if nl := len(lb):
-                assert lb.shape[1] == 5, f"labels require 5 columns, {lb.shape[1]} columns detected"
-                assert (lb >= 0).all(), f"negative label values {lb[lb < 0]}"
-                assert (lb[:, 1:] <= 1).all(), f"non-normalized or out of bounds coordinates {lb[:, 1:][lb[:, 1:] > 1]}"
-                _, i = np.unique(lb, axis=0, return_index=True)
-                if len(i) < nl:  # duplicate row check
-                    lb = lb[i]  # remove duplicates
-                    if segments:
-                        segments = [segments[x] for x in i]
-                    msg = f"{prefix}WARNING ⚠️ {im_file}: {nl - len(i)} duplicate labels removed"
-            else:
-                ne = 1  # label empty
-                lb = np.zeros((0, 5), dtype=np.float32)
+                lb, segments, msg = parse_label(f.read(), im_file, prefix, msg)
+            ne = int(not len(lb))  # label empty
         else:
             nm = 1  # label missing
             lb = np.zeros((0, 5), dtype=np.float32)
@@ -1184,6 +1683,88 @@ def verify_image_label(args):
         return [None, None, None, None, nm, nf, ne, nc, msg]
 
 
+def is_shards(path):
+    """Returns True if dataset `path`, a path or list of paths, refers to tar shards."""
+    return all(str(p).endswith(".tar") for p in (path if isinstance(path, list) else [path]))
+
+
+def expand_shards(path):
+    """Expands tar shard `path`, a path, glob or brace range i.e. 'train-{000..099}.tar', or a list of them, to a list
+    of shard files.
+    """
+    files = []
+    for p in path if isinstance(path, list) else [path]:
+        p = str(p)
+        if m := re.search(r"\{(\d+)\.\.(\d+)\}", p):  # brace range, zero-padded like its first value
+            a, b = m.groups()
+            files += expand_shards(
+                [f"{p[: m.start()]}{str(i).zfill(len(a))}{p[m.end() :]}" for i in range(int(a), int(b) + 1)]
+            )
+        elif any(c in p for c in "*?["):  # glob
+            files += sorted(glob.glob(p))
+        else:
+            files.append(p)
+    return files
+
+
+def shard_file(im_file):
+    """Returns the tar shard of shard member path 'shard.tar/key.ext'."""
+    return im_file.rsplit(".tar/", 1)[0] + ".tar"
+
+
+def iter_shard(file):
+    """Reads tar shard `file` sequentially, yielding `(key, {ext: bytes})` samples of consecutive members sharing a key,
+    the member path up to the first dot of its name as in WebDataset, i.e. 'dir/0001.jpg' and 'dir/0001.txt'.
+    """
+    key, sample = None, {}
+    with tarfile.open(file, "r|*") as tar:
+        for m in tar:
+            if not m.isfile():
+                continue
+            d, _, name = m.name.rpartition("/")
+            k, _, ext = name.partition(".")
+            k = f"{d}/{k}" if d else k
+            if k != key:
+                if sample:
+                    yield key, sample
+                key, sample = k, {}
+            sample[ext.lower()] = tar.extractfile(m).read()
+    if sample:
+        yield key, sample
+
+
+def scan_shard(args):
+    """Verifies the images and labels of a tar shard, returning a list of verify_image_label() results of its samples
+    with image paths 'shard.tar/key.ext'.
+    """
+    file, prefix = args
+    x = []
+    for key, sample in iter_shard(file):
+        ext = next((k for k in sample if k in IMG_FORMATS), None)
+        if ext is None:
+            continue  # no image
+        im_file = f"{file}/{key}.{ext}"
+        nm, nf, ne, nc, msg, segments = 0, 0, 0, 0, "", []  # number (missing, found, empty, corrupt), message, segments
+        try:
+            im = Image.open(io.BytesIO(sample[ext]))
+            im.verify()  # PIL verify
+            shape = exif_size(im)  # image size
+            assert (shape[0] > 9) & (shape[1] > 9), f"image size {shape} <10 pixels"
+            assert im.format.lower() in IMG_FORMATS, f"invalid image format {im.format}"
+            if "txt" in sample:
+                nf = 1  # label found
+                lb, segments, msg = parse_label(sample["txt"].decode(), im_file, prefix)
+                ne = int(not len(lb))  # label empty
+            else:
+                nm = 1  # label missing
+                lb = np.zeros((0, 5), dtype=np.float32)
+            x.append((im_file, lb, shape, segments, nm, nf, ne, nc, msg))
+        except Exception as e:
+            msg = f"{prefix}WARNING ⚠️ {im_file}: ignoring corrupt image/label: {e}"
+            x.append((im_file, None, None, None, nm, nf, ne, 1, msg))
+    return x
+
+
 class HUBDatasetStats:
     """
     Class for generating HUB dataset JSON and `-hub` dataset directory.
@@ -0,0 +1,281 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Image and video decoding backends."""
+
+import math
+import time
+from pathlib import Path
+from threading import Lock
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from utils.general import LOGGER, check_requirements
+
+JPEG_FORMATS = "jpeg", "jpg"  # formats supporting reduced-resolution DCT decoding
+REDUCED_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+
+
+def reduced_flag(shape, size):
+    """Returns the cv2.imread() flag decoding a JPEG of `shape` at the smallest 1/8, 1/4 or 1/2 scale with a longest
+    side of at least `size`, or cv2.IMREAD_COLOR if the image is smaller than twice `size`.
+    """
+    for k, flag in REDUCED_FLAGS.items():
+        if math.ceil(max(shape[:2]) / k) >= size:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def exif_orient(im, orientation):
+    """Applies EXIF `orientation` (1-8) to BGR image `im` as cv2.imread() does, returning the oriented image."""
+    if orientation == 2:
+        im = cv2.flip(im, 1)
+    elif orientation == 3:
+        im = cv2.rotate(im, cv2.ROTATE_180)
+    elif orientation == 4:
+        im = cv2.flip(im, 0)
+    elif orientation == 5:
+        im = cv2.transpose(im)
+    elif orientation == 6:
+        im = cv2.rotate(im, cv2.ROTATE_90_CLOCKWISE)
+    elif orientation == 7:
+        im = cv2.rotate(cv2.transpose(im), cv2.ROTATE_180)
+    elif orientation == 8:
+        im = cv2.rotate(im, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return im
+
+
+class Decoder:
+    """OpenCV image and video decoder, the base class of all decoding backends, with decode throughput statistics."""
+
+    name = "opencv"
+
+    def __init__(self):
+        """Initializes decode counters, shared by all loader threads using this decoder."""
+        self.n, self.pixels, self.t = 0, 0, 0.0  # decoded frames, pixels and seconds
+        self.lock = Lock()
+
+    def imread(self, path, size=None):
+        """Returns image `path` as a BGR array, or None if unreadable; backends supporting scaled decode may return a
+        smaller image whose longest side is at least `size`.
+        """
+        t = time.perf_counter()
+        im = self.decode(str(path), size)
+        self.update(time.perf_counter() - t, im)
+        return im
+
+    def decode(self, path, size=None):
+        """Decodes image `path` to a BGR array, JPEGs at a reduced scale with a longest side of at least `size`."""
+        flag = cv2.IMREAD_COLOR
+        if size and path.rsplit(".", 1)[-1].lower() in JPEG_FORMATS:
+            try:
+                with Image.open(path) as im:  # reads the header only
+                    flag = reduced_flag(im.size, size)
+            except OSError:
+                pass  # missing or corrupt, handled by cv2.imread()
+        return cv2.imread(path, flag)  # BGR
+
+    def capture(self, source):
+        """Returns a cv2.VideoCapture-like object for video file or stream `source` that counts decoded frames."""
+        return TimedCapture(self.open(source), self)
+
+    def open(self, source):
+        """Opens video file or stream `source`."""
+        return cv2.VideoCapture(source)
+
+    def update(self, t, im=None):
+        """Adds `t` seconds and, if `im` is not None, one frame of `im.shape` to the decode counters."""
+        with self.lock:
+            self.t += t
+            if im is not None:
+                self.n += 1
+                self.pixels += im.shape[0] * im.shape[1]
+
+    def __str__(self):
+        """Returns a summary of the decode throughput, i.e. 'opencv: 100 frames in 1.00s (100.0 FPS, 207.4 MP/s)'."""
+        t = max(self.t, 1e-9)
+        return f"{self.name}: {self.n} frames in {self.t:.2f}s ({self.n / t:.1f} FPS, {self.pixels / t / 1e6:.1f} MP/s)"
+
+
+class TimedCapture:
+    """Wraps a cv2.VideoCapture-like object, adding the time of grab(), retrieve() and read() to decoder counters."""
+
+    def __init__(self, cap, decoder):
+        """Initializes the wrapper around `cap`, reporting to `decoder`."""
+        self.cap = cap
+        self.decoder = decoder
+
+    def grab(self):
+        """Grabs the next frame."""
+        t = time.perf_counter()
+        success = self.cap.grab()
+        self.decoder.update(time.perf_counter() - t)
+        return success
+
+    def retrieve(self):
+        """Decodes and returns the last grabbed frame as `(success, im)`."""
+        t = time.perf_counter()
+        success, im = self.cap.retrieve()
+        self.decoder.update(time.perf_counter() - t, im if success else None)
+        return success, im
+
+    def read(self):
+        """Grabs and decodes the next frame, returning `(success, im)`."""
+        return self.retrieve() if self.grab() else (False, None)
+
+    def __getattr__(self, name):
+        """Delegates other attributes, i.e. get(), isOpened(), open() and release(), to the wrapped capture."""
+        return getattr(self.cap, name)
+
+
+class PyAVCapture:
+    """cv2.VideoCapture-like reader decoding with PyAV (FFmpeg) using frame and slice threading."""
+
+    def __init__(self, source):
+        """Opens `source` with PyAV."""
+        import av
+
+        self.av = av
+        self.container = None
+        self.open(source)
+
+    def open(self, source):
+        """(Re)opens `source`, selecting its first video stream with automatic decoder threading; if re-opening fails
+        the previous container is kept, so that grab() returns False and the caller can retry.
+        """
+        container = self.av.open(source)
+        self.release()
+        self.container = container
+        self.stream = container.streams.video[0]
+        self.stream.thread_type = "AUTO"  # threaded FFmpeg decode
+        self.frames = container.decode(self.stream)
+        self.frame = None
+        return True
+
+    def isOpened(self):
+        """Returns True if a container is open."""
+        return self.container is not None
+
+    def grab(self):
+        """Decodes the next frame, returning False at the end of the stream or on decode and connection errors, as
+        cv2.VideoCapture.grab().
+        """
+        try:
+            self.frame = next(self.frames)
+        except (StopIteration, self.av.error.FFmpegError, OSError):  # FFmpegError includes EOFError
+            self.frame = None
+        return self.frame is not None
+
+    def retrieve(self):
+        """Returns the last decoded frame as `(success, BGR array)`."""
+        return (True, self.frame.to_ndarray(format="bgr24")) if self.frame is not None else (False, None)
+
+    def read(self):
+        """Decodes and returns the next frame as `(success, BGR array)`."""
+        return self.retrieve() if self.grab() else (False, None)
+
+    def get(self, prop):
+        """Returns a cv2.CAP_PROP_* property of the video stream, or 0 if unsupported."""
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.stream.average_rate or 0)
+        elif prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.stream.codec_context.width
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.stream.codec_context.height
+        elif prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.stream.frames
+        return 0
+
+    def release(self):
+        """Closes the container."""
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+
+class PyAVDecoder(Decoder):
+    """Decodes videos and streams with PyAV threaded FFmpeg decoding, images with OpenCV."""
+
+    name = "pyav"
+
+    def __init__(self):
+        """Initializes the decoder, checking for PyAV."""
+        super().__init__()
+        check_requirements("av")
+
+    def open(self, source):
+        """Opens video file or stream `source` with PyAV, local webcams (integer sources) with OpenCV."""
+        return cv2.VideoCapture(source) if isinstance(source, int) else PyAVCapture(source)
+
+
+class TurboJPEGDecoder(Decoder):
+    """Decodes JPEG images with libjpeg-turbo, using DCT-domain downscaling when `size` allows, other images and
+    videos with OpenCV.
+    """
+
+    name = "turbojpeg"
+
+    def __init__(self):
+        """Initializes the decoder, checking for PyTurboJPEG and the libturbojpeg library."""
+        super().__init__()
+        check_requirements("PyTurboJPEG")
+        from turbojpeg import TurboJPEG
+
+        self.jpeg = TurboJPEG()
+        self.factors = [f for f in self.jpeg.scaling_factors if f[0] <= f[1]]  # scale factors <= 1
+
+    def decode(self, path, size=None):
+        """Decodes JPEG `path` at the smallest DCT scale with a longest side of at least `size`, applying EXIF
+        orientation.
+        """
+        if path.rsplit(".", 1)[-1].lower() not in JPEG_FORMATS:
+            return cv2.imread(path)
+        buf = Path(path).read_bytes()
+        try:
+            scale = None  # full resolution
+            if size:
+                w, h = self.jpeg.decode_header(buf)[:2]
+                scales = [f for f in self.factors if math.ceil(max(h, w) * f[0] / f[1]) >= size]
+                scale = min(scales, key=lambda f: f[0] / f[1], default=None)
+            im = self.jpeg.decode(buf, scaling_factor=scale)  # BGR
+        except OSError:
+            return cv2.imread(path)  # corrupt or non-JPEG content
+        return exif_orient(im, exif_orientation(path))
+
+
+class PillowDecoder(Decoder):
+    """Decodes images with Pillow (or Pillow-SIMD), using JPEG draft mode downscaling when `size` allows, videos with
+    OpenCV.
+    """
+
+    name = "pillow"
+
+    def decode(self, path, size=None):
+        """Decodes image `path`, at a reduced JPEG draft scale with a longest side of at least `size`, to BGR."""
+        with Image.open(path) as im:
+            if size and im.format == "JPEG":
+                r = size / max(im.size)
+                im.draft("RGB", (math.ceil(im.width * r), math.ceil(im.height * r)))  # scale >= requested size
+            im = ImageOps.exif_transpose(im).convert("RGB")
+            return np.asarray(im)[..., ::-1].copy()  # RGB to BGR
+
+
+def exif_orientation(path):
+    """Returns the EXIF orientation (1-8) of image `path`, 1 if missing or unreadable."""
+    try:
+        with Image.open(path) as im:
+            return im.getexif().get(0x0112, 1)  # orientation tag
+    except Exception:
+        return 1
+
+
+DECODERS = {"opencv": Decoder, "pyav": PyAVDecoder, "turbojpeg": TurboJPEGDecoder, "pillow": PillowDecoder}
+
+
+def get_decoder(decoder="opencv"):
+    """Returns a Decoder instance from a `DECODERS` name or an existing Decoder instance."""
+    if isinstance(decoder, Decoder):
+        return decoder
+    assert decoder in DECODERS, f"invalid decoder '{decoder}', valid decoders are {list(DECODERS)}"
+    LOGGER.info(f"Decoding with {decoder}")
+    return DECODERS[decoder]()
@@ -9,6 +9,7 @@ import logging.config
 import math
 import os
 import platform
+import queue
 import random
 import re
 import signal
@@ -45,7 +46,7 @@ except (ImportError, AssertionError):
 
 from ultralytics.utils.checks import check_requirements
 
-from utils import TryExcept, emojis
+from utils import TryExcept, emojis, threaded
 from utils.downloads import curl_download, gsutil_getsize
 from utils.metrics import box_iou, fitness
 
@@ -256,6 +257,69 @@ class WorkingDirectory(contextlib.ContextDecorator):
         os.chdir(self.cwd)
 
 
+def prefetch(iterable, maxsize=2):
+    """Iterates `iterable` in a daemon producer thread through a bounded queue of `maxsize` items, re-raising producer
+    exceptions in the consumer.
+    """
+    q = queue.Queue(maxsize)
+
+    @threaded
+    def produce():
+        """Puts `(item, None)` tuples on the queue, then `(None, exception)` or `(q, None)` as the end marker."""
+        try:
+            for x in iterable:
+                q.put((x, None))
+            q.put((q, None))
+        except Exception as e:
+            q.put((None, e))
+
+    produce()
+    while True:
+        x, e = q.get()
+        if e is not None:
+            raise e
+        if x is q:
+            return
+        yield x
+
+
+class WriterPool:
+    """Runs tasks on `n` daemon writer threads fed by bounded queues, preserving submission order per task key."""
+
+    def __init__(self, n=2, maxsize=4):
+        """Starts `n` writer threads, each with a queue of at most `maxsize` pending tasks and its own Profile()."""
+        self.queues = [queue.Queue(maxsize) for _ in range(n)]
+        self.dt = [Profile() for _ in range(n)]  # per-thread task time
+        self.error = None
+        self.threads = [self.work(q, dt) for q, dt in zip(self.queues, self.dt)]
+
+    @threaded
+    def work(self, q, dt):
+        """Runs tasks from queue `q` until a None sentinel, recording the first exception and skipping later tasks."""
+        while (task := q.get()) is not None:
+            if self.error is None:
+                try:
+                    with dt:
+                        task[0](*task[1:])
+                except Exception as e:
+                    self.error = e
+
+    def submit(self, key, fn, *args):
+        """Queues `fn(*args)` on writer `key % n`, blocking while that queue is full; equal keys run in order."""
+        if self.error is not None:
+            raise self.error
+        self.queues[key % len(self.queues)].put((fn, *args))
+
+    def close(self):
+        """Drains all queues, joins the writer threads and re-raises the first task exception, if any."""
+        for q in self.queues:
+            q.put(None)
+        for t in self.threads:
+            t.join()
+        if self.error is not None:
+            raise self.error
+
+
 def methods(instance):
     """Returns list of method names for a class/instance excluding dunder methods."""
     return [f for f in dir(instance) if callable(getattr(instance, f)) and not f.startswith("__")]
@@ -940,14 +1004,32 @@ def segments2boxes(segments):
     return xyxy2xywh(np.array(boxes))  # cls, xywh
 
 
+def clip_segments2boxes(segments, width=640, height=640):
+    """Convert (n,m,2) segments to (n,4) xyxy boxes of their points inside the image, a vectorized segment2box()."""
+    x, y = segments[..., 0], segments[..., 1]
+    inside = (x >= 0) & (y >= 0) & (x <= width) & (y <= height)
+    boxes = np.stack(
+        (
+            np.where(inside, x, np.inf).min(1),
+            np.where(inside, y, np.inf).min(1),
+            np.where(inside, x, -np.inf).max(1),
+            np.where(inside, y, -np.inf).max(1),
+        ),
+        1,
+    )
+    return np.where((inside & (x != 0)).any(1, keepdims=True), boxes, 0.0)  # zeros like segment2box() if no points
+
+
 def resample_segments(segments, n=1000):
-    """Resamples an (n,2) segment to a fixed number of points for consistent representation."""
-    for i, s in enumerate(segments):
-        s = np.concatenate((s, s[0:1, :]), axis=0)
-        x = np.linspace(0, len(s) - 1, n)
-        xp = np.arange(len(s))
-        segments[i] = np.concatenate([np.interp(x, xp, s[:, i]) for i in range(2)]).reshape(2, -1).T  # segment xy
-    return segments
+    """Resamples (m,2) segments to a fixed number of `n` points each, returning an (len(segments),n,2) array."""
+    if not len(segments):
+        return np.zeros((0, n, 2))
+    segments = [np.concatenate((s, s[:1]), 0) for s in segments]  # closed polygons
+    lengths = np.array([len(s) - 1 for s in segments])
+    xy = np.concatenate(segments, 0)
+    x = (np.cumsum(lengths + 1) - lengths - 1)[:, None] + np.linspace(0, lengths, n, axis=1)  # positions in xy
+    xp = np.arange(len(xy))
+    return np.stack([np.interp(x, xp, xy[:, i]) for i in range(2)], -1)  # segments xy
 
 
 def scale_boxes(img1_shape, boxes, img0_shape, ratio_pad=None):
@@ -1017,13 +1099,37 @@ def non_max_suppression(
     labels=(),
     max_det=300,
     nm=0,  # number of masks
+    batched=False,  # vectorized NMS over the whole batch
+    topk=0,  # maximum candidates per image by objectness before class scoring (0 to disable)
+    topk_cls=0,  # maximum candidates per class before NMS (0 to disable)
+    argmax=False,  # prediction is (xywh, obj_conf, cls_conf, cls) from Detect.argmax
 ):
     """
     Non-Maximum Suppression (NMS) on inference results to reject overlapping detections.
 
+    Set `batched=True` to suppress all images in a single pass, see `non_max_suppression_batched()`. Set `topk` and/or
+    `topk_cls` to bound the candidates scored, sorted and suppressed per image in crowded scenes. Set `argmax=True` for
+    outputs of a `Detect.argmax` head, which carry the best class only.
+
     Returns:
          list of detections, on (n,6) tensor per image [xyxy, conf, cls]
     """
+    if batched:
+        return non_max_suppression_batched(
+            prediction,
+            conf_thres,
+            iou_thres,
+            classes,
+            agnostic,
+            multi_label,
+            labels,
+            max_det,
+            nm,
+            topk,
+            topk_cls,
+            argmax,
+        )
+
     # Checks
     assert 0 <= conf_thres <= 1, f"Invalid Confidence threshold {conf_thres}, valid values are between 0.0 and 1.0"
     assert 0 <= iou_thres <= 1, f"Invalid IoU {iou_thres}, valid values are between 0.0 and 1.0"
@@ -1044,7 +1150,7 @@ def non_max_suppression(
     max_nms = 30000  # maximum number of boxes into torchvision.ops.nms()
     time_limit = 0.5 + 0.05 * bs  # seconds to quit after
     redundant = True  # require redundant detections
-    multi_label &= nc > 1  # multiple labels per box (adds 0.5ms/img)
+    multi_label &= nc > 1 and not argmax  # multiple labels per box (adds 0.5ms/img)
     merge = False  # use merge-NMS
 
     t = time.time()
@@ -1054,6 +1160,8 @@ def non_max_suppression(
         # Apply constraints
         # x[((x[..., 2:4] < min_wh) | (x[..., 2:4] > max_wh)).any(1), 4] = 0  # width-height
         x = x[xc[xi]]  # confidence
+        if topk and x.shape[0] > topk:
+            x = x[x[:, 4].topk(topk)[1]]  # top-k objectness
 
         # Cat apriori labels if autolabelling
         if labels and len(labels[xi]):
@@ -1061,7 +1169,10 @@ def non_max_suppression(
             v = torch.zeros((len(lb), nc + nm + 5), device=x.device)
             v[:, :4] = lb[:, 1:5]  # box
             v[:, 4] = 1.0  # conf
-            v[range(len(lb)), lb[:, 0].long() + 5] = 1.0  # cls
+            if argmax:
+                v[:, 5:7] = torch.stack((torch.ones_like(lb[:, 0]), lb[:, 0]), 1)  # cls conf, cls
+            else:
+                v[range(len(lb)), lb[:, 0].long() + 5] = 1.0  # cls
             x = torch.cat((x, v), 0)
 
         # If none remain process next image
@@ -1069,14 +1180,19 @@ def non_max_suppression(
             continue
 
         # Compute conf
-        x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
+        if argmax:
+            x[:, 5] *= x[:, 4]  # conf = obj_conf * cls_conf
+        else:
+            x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
 
         # Box/Mask
         box = xywh2xyxy(x[:, :4])  # center_x, center_y, width, height) to (x1, y1, x2, y2)
         mask = x[:, mi:]  # zero columns if no masks
 
         # Detections matrix nx6 (xyxy, conf, cls)
-        if multi_label:
+        if argmax:  # best class from Detect
+            x = torch.cat((box, x[:, 5:7], mask), 1)[x[:, 5] > conf_thres]
+        elif multi_label:
             i, j = (x[:, 5:mi] > conf_thres).nonzero(as_tuple=False).T
             x = torch.cat((box[i], x[i, 5 + j, None], j[:, None].float(), mask[i]), 1)
         else:  # best class only
@@ -1087,6 +1203,12 @@ def non_max_suppression(
         if classes is not None:
             x = x[(x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)]
 
+        # Top-k candidates per class
+        if topk_cls and x.shape[0] > topk_cls:
+            i = x[:, 4].argsort(descending=True)
+            i = i[x[i, 5].sort(stable=True)[1]]  # group by class, preserving confidence order
+            x = x[i[group_rank(x[i, 5].long(), nc) < topk_cls]]
+
         # Apply finite constraint
         # if not torch.isfinite(x).all():
         #     x = x[torch.isfinite(x).all(1)]
@@ -1120,6 +1242,142 @@ def non_max_suppression(
     return output
 
 
+def non_max_suppression_batched(
+    prediction,
+    conf_thres=0.25,
+    iou_thres=0.45,
+    classes=None,
+    agnostic=False,
+    multi_label=False,
+    labels=(),
+    max_det=300,
+    nm=0,  # number of masks
+    topk=0,  # maximum candidates per image by objectness before class scoring (0 to disable)
+    topk_cls=0,  # maximum candidates per class before NMS (0 to disable)
+    argmax=False,  # prediction is (xywh, obj_conf, cls_conf, cls) from Detect.argmax
+):
+    """
+    Vectorized Non-Maximum Suppression (NMS) over a whole (bs, n, 5+nc+nm) batch with a single NMS call.
+
+    Boxes are offset by class along x and by image index along y so one `torchvision.ops.nms()` call never suppresses
+    across classes or images. Equivalent to `non_max_suppression()` without merge-NMS or the per-image time limit.
+
+    Returns:
+         list of detections, on (n,6) tensor per image [xyxy, conf, cls]
+    """
+    # Checks
+    assert 0 <= conf_thres <= 1, f"Invalid Confidence threshold {conf_thres}, valid values are between 0.0 and 1.0"
+    assert 0 <= iou_thres <= 1, f"Invalid IoU {iou_thres}, valid values are between 0.0 and 1.0"
+    if isinstance(prediction, (list, tuple)):  # YOLOv5 model in validation model, output = (inference_out, loss_out)
+        prediction = prediction[0]  # select only inference output
+
+    device = prediction.device
+    mps = "mps" in device.type  # Apple MPS
+    if mps:  # MPS not fully supported yet, convert tensors to CPU before NMS
+        prediction = prediction.cpu()
+    bs = prediction.shape[0]  # batch size
+    nc = prediction.shape[2] - nm - 5  # number of classes
+
+    # Settings
+    max_wh = 7680  # (pixels) maximum box width and height
+    max_nms = 30000  # maximum number of boxes into torchvision.ops.nms() per image
+    multi_label &= nc > 1 and not argmax  # multiple labels per box (adds 0.5ms/img)
+
+    mi = 5 + nc  # mask start index
+    if topk and prediction.shape[1] > topk:  # top-k objectness
+        obj, k = prediction[..., 4].topk(topk, dim=1)
+        k = (k + torch.arange(bs, device=k.device)[:, None] * prediction.shape[1])[obj > conf_thres]
+    else:
+        k = (prediction[..., 4] > conf_thres).view(-1).nonzero().squeeze(1)  # candidate indices into flattened batch
+    x = prediction.reshape(-1, prediction.shape[2]).index_select(0, k)  # candidates (copy)
+    bi = k.div(prediction.shape[1], rounding_mode="floor")  # image indices
+
+    # Cat apriori labels if autolabelling
+    if labels and any(len(lb) for lb in labels):
+        lb = torch.cat([lb for lb in labels if len(lb)], 0)
+        v = torch.zeros((len(lb), nc + nm + 5), device=x.device)
+        v[:, :4] = lb[:, 1:5]  # box
+        v[:, 4] = 1.0  # conf
+        if argmax:
+            v[:, 5:7] = torch.stack((torch.ones_like(lb[:, 0]), lb[:, 0]), 1)  # cls conf, cls
+        else:
+            v[range(len(lb)), lb[:, 0].long() + 5] = 1.0  # cls
+        li = torch.cat([torch.full((len(lb),), i, device=x.device) for i, lb in enumerate(labels) if len(lb)])
+        x, bi = torch.cat((x, v), 0), torch.cat((bi, li.long()), 0)
+
+    # Compute conf
+    if argmax:
+        x[:, 5] *= x[:, 4]  # conf = obj_conf * cls_conf
+    else:
+        x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
+
+    # Box/Mask
+    box = xywh2xyxy(x[:, :4])  # center_x, center_y, width, height) to (x1, y1, x2, y2)
+    mask = x[:, mi:]  # zero columns if no masks
+
+    # Detections matrix nx6 (xyxy, conf, cls)
+    if argmax:  # best class from Detect
+        i = x[:, 5] > conf_thres
+        x, bi = torch.cat((box, x[:, 5:7], mask), 1)[i], bi[i]
+    elif multi_label:
+        i, j = (x[:, 5:mi] > conf_thres).nonzero(as_tuple=False).T
+        x, bi = torch.cat((box[i], x[i, 5 + j, None], j[:, None].float(), mask[i]), 1), bi[i]
+    else:  # best class only
+        conf, j = x[:, 5:mi].max(1, keepdim=True)
+        i = conf.view(-1) > conf_thres
+        x, bi = torch.cat((box, conf, j.float(), mask), 1)[i], bi[i]
+
+    # Filter by class
+    if classes is not None:
+        i = (x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)
+        x, bi = x[i], bi[i]
+
+    # Check shape
+    if not x.shape[0]:  # no boxes
+        return [torch.zeros((0, 6 + nm), device=device)] * bs
+
+    # Top-k candidates per class
+    if topk_cls:
+        n = int(x[:, 5].max()) + 1  # class index range (nc unknown for argmax predictions)
+        i = x[:, 4].argsort(descending=True)
+        g, j = (bi[i] * n + x[i, 5].long()).sort(stable=True)  # group by image and class, preserving conf order
+        i = i[j][group_rank(g, bs * n) < topk_cls]
+        x, bi = x[i], bi[i]
+
+    # Sort by confidence within each image and remove excess boxes
+    i = x[:, 4].argsort(descending=True)
+    i = i[bi[i].sort(stable=True)[1]]  # group by image, preserving confidence order
+    i = i[group_rank(bi[i], bs) < max_nms]
+    x, bi = x[i], bi[i]
+    n = torch.bincount(bi, minlength=bs).tolist()  # boxes per image
+
+    # Batched NMS
+    c = x[:, 5:6] * (0 if agnostic else max_wh)  # classes
+    b = bi[:, None].to(x.dtype) * max_wh  # images
+    boxes, scores = x[:, :4] + torch.cat((c, b, c, b), 1), x[:, 4]  # boxes (offset by class and image), scores
+    if x.shape[0] <= (4000 if x.device.type == "cpu" else 20000):  # single NMS call
+        i = torchvision.ops.nms(boxes, scores, iou_thres)  # NMS, sorted by decreasing score
+        i = i[bi[i].sort(stable=True)[1]]  # group by image, preserving score order
+    else:  # NMS is O(n^2), so many candidates are faster per image (same heuristic as torchvision batched_nms)
+        i, j = [], 0  # kept indices, image start index
+        for bx, sc in zip(boxes.split(n), scores.split(n)):
+            i.append(torchvision.ops.nms(bx, sc, iou_thres)[:max_det] + j)
+            j += len(bx)
+        i = torch.cat(i)
+    i = i[group_rank(bi[i], bs) < max_det]  # limit detections per image
+
+    n = torch.bincount(bi[i], minlength=bs).tolist()  # detections per image
+    return [xi.to(device) for xi in x[i].split(n)] if mps else list(x[i].split(n))
+
+
+def group_rank(g, n):
+    """Returns the position of each element within its group for `n` ascending-sorted group indices `g`, i.e. [0,0,1]
+    -> [0,1,0].
+    """
+    c = torch.bincount(g, minlength=n)  # elements per group
+    return torch.arange(len(g), device=g.device) - (c.cumsum(0) - c)[g]
+
+
 def strip_optimizer(f="best.pt", s=""):
     """
     Strips optimizer and optionally saves checkpoint to finalize training; arguments are file path 'f' and save path
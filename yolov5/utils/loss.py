@@ -1,6 +1,8 @@
 # Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
 """Loss functions."""
 
+from functools import lru_cache
+
 import torch
 import torch.nn as nn
 
@@ -13,6 +15,36 @@ def smooth_BCE(eps=0.1):
     return 1.0 - 0.5 * eps, 0.5 * eps
 
 
+@lru_cache(maxsize=64)
+def grid_gain(shapes, device):
+    """Returns gains (nl,6) scaling normalized (image, class, x, y, w, h) targets to the grids of layer output `shapes`,
+    cached per shapes and device.
+    """
+    return torch.tensor([[1, 1, s[3], s[2], s[3], s[2]] for s in shapes], device=device).float()
+
+
+def match_targets(targets, gain, anchors, anchor_t, off, g=0.5):
+    """
+    Matches targets(nt,6) (image, class, x, y, w, h normalized) to the anchors and grid cells of all layers at once.
+
+    Targets match anchors(nl,na,2) with wh ratios below `anchor_t`, in their grid cell and in the neighbouring cells
+    whose boundary is closer than `g`, at `off`(5,2) offsets. Matches are ordered by layer, offset, anchor and target, as
+    per-layer assignment orders them, and returned as layer, anchor and target indices, gridspace targets(n,6) and
+    clamped grid xy(n,2).
+    """
+    t = targets * gain[:, None]  # shape(nl,nt,6)
+    r = t[:, None, :, 4:6] / anchors[:, :, None]  # wh ratio shape(nl,na,nt,2)
+    j = torch.max(r, 1 / r).max(3)[0] < anchor_t  # compare shape(nl,na,nt)
+    gxy = t[..., 2:4]  # grid xy
+    gxi = gain[:, None, 2:4] - gxy  # inverse
+    jklm = torch.cat(((gxy % 1 < g) & (gxy > 1), (gxi % 1 < g) & (gxi > 1)), 2)  # shape(nl,nt,4)
+    o = torch.cat((torch.ones_like(jklm[..., :1]), jklm), 2).transpose(1, 2)  # offsets shape(nl,5,nt)
+    i, o, a, n = (o[:, :, None] & j[:, None]).nonzero().T  # layer, offset, anchor, target
+    t = t[i, n]
+    gij = torch.minimum((t[:, 2:4] - off[o]).clamp_(0), gain[i, 2:4] - 1).long()  # clamped grid cells
+    return i, a, n, t, gij
+
+
 class BCEBlurWithLogitsLoss(nn.Module):
     """Modified BCEWithLogitsLoss to reduce missing label effects in YOLOv5 training with optional alpha smoothing."""
 
@@ -134,6 +166,7 @@ class ComputeLoss:
         self.nc = m.nc  # number of classes
         self.nl = m.nl  # number of layers
         self.anchors = m.anchors
+        self.off = torch.tensor([[0, 0], [1, 0], [0, 1], [-1, 0], [0, -1]], device=device).float() * 0.5  # j,k,l,m
         self.device = device
 
     def __call__(self, p, targets):  # predictions, targets
@@ -192,63 +225,11 @@ class ComputeLoss:
         """Prepares model targets from input targets (image,class,x,y,w,h) for loss computation, returning class, box,
         indices, and anchors.
         """
-        na, nt = self.na, targets.shape[0]  # number of anchors, targets
-        tcls, tbox, indices, anch = [], [], [], []
-        gain = torch.ones(7, device=self.device)  # normalized to gridspace gain
-        ai = torch.arange(na, device=self.device).float().view(na, 1).repeat(1, nt)  # same as .repeat_interleave(nt)
-        targets = torch.cat((targets.repeat(na, 1, 1), ai[..., None]), 2)  # append anchor indices
-
-        g = 0.5  # bias
-        off = (
-            torch.tensor(
-                [
-                    [0, 0],
-                    [1, 0],
-                    [0, 1],
-                    [-1, 0],
-                    [0, -1],  # j,k,l,m
-                    # [1, 1], [1, -1], [-1, 1], [-1, -1],  # jk,jm,lk,lm
-                ],
-                device=self.device,
-            ).float()
-            * g
-        )  # offsets
-
-        for i in range(self.nl):
-            anchors, shape = self.anchors[i], p[i].shape
-            gain[2:6] = torch.tensor(shape)[[3, 2, 3, 2]]  # xyxy gain
-
-            # Match targets to anchors
-            t = targets * gain  # shape(3,n,7)
-            if nt:
-                # Matches
-                r = t[..., 4:6] / anchors[:, None]  # wh ratio
-                j = torch.max(r, 1 / r).max(2)[0] < self.hyp["anchor_t"]  # compare
-                # j = wh_iou(anchors, t[:, 4:6]) > model.hyp['iou_t']  # iou(3,n)=wh_iou(anchors(3,2), gwh(n,2))
-                t = t[j]  # filter
-
-                # Offsets
-                gxy = t[:, 2:4]  # grid xy
-                gxi = gain[[2, 3]] - gxy  # inverse
-                j, k = ((gxy % 1 < g) & (gxy > 1)).T
-                l, m = ((gxi % 1 < g) & (gxi > 1)).T
-                j = torch.stack((torch.ones_like(j), j, k, l, m))
-                t = t.repeat((5, 1, 1))[j]
-                offsets = (torch.zeros_like(gxy)[None] + off[:, None])[j]
-            else:
-                t = targets[0]
-                offsets = 0
-
-            # Define
-            bc, gxy, gwh, a = t.chunk(4, 1)  # (image, class), grid xy, grid wh, anchors
-            a, (b, c) = a.long().view(-1), bc.long().T  # anchors, image, class
-            gij = (gxy - offsets).long()
-            gi, gj = gij.T  # grid indices
-
-            # Append
-            indices.append((b, a, gj.clamp_(0, shape[2] - 1), gi.clamp_(0, shape[3] - 1)))  # image, anchor, grid
-            tbox.append(torch.cat((gxy - gij, gwh), 1))  # box
-            anch.append(anchors[a])  # anchors
-            tcls.append(c)  # class
-
-        return tcls, tbox, indices, anch
+        gain = grid_gain(tuple(x.shape for x in p), self.device)  # normalized to gridspace gain
+        i, a, _, t, gij = match_targets(targets, gain, self.anchors, self.hyp["anchor_t"], self.off)
+        n = torch.bincount(i, minlength=self.nl).tolist()  # targets per layer
+        b, c = t[:, :2].long().T  # image, class
+        gi, gj = gij.T  # grid indices
+        tbox = torch.cat((t[:, 2:4] - gij, t[:, 4:6]), 1)  # box
+        b, a, gj, gi, tcls, tbox, anch = (x.split(n) for x in (b, a, gj, gi, c, tbox, self.anchors[i, a]))
+        return list(tcls), list(tbox), list(zip(b, a, gj, gi)), list(anch)
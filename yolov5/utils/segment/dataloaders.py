@@ -9,7 +9,8 @@ import numpy as np
 import torch
 from torch.utils.data import DataLoader
 
-from ..augmentations import augment_hsv, copy_paste, letterbox
+from ..augmentations import augment_hsv, copy_paste, letterbox, paste_tiles
+from ..caches import RAMImageCache
 from ..dataloaders import InfiniteDataLoader, LoadImagesAndLabels, SmartDistributedSampler, seed_worker
 from ..general import LOGGER, xyn2xy, xywhn2xyxy, xyxy2xywhn
 from ..torch_utils import torch_distributed_zero_first
@@ -38,6 +39,7 @@ def create_dataloader(
     mask_downsample_ratio=1,
     overlap_mask=False,
     seed=0,
+    reduced_decode=False,
 ):
     """Creates a dataloader for training, validating, or testing YOLO models with various dataset options."""
     if rect and shuffle:
@@ -60,11 +62,14 @@ def create_dataloader(
             downsample_ratio=mask_downsample_ratio,
             overlap=overlap_mask,
             rank=rank,
+            reduced=reduced_decode,
         )
 
     batch_size = min(batch_size, len(dataset))
     nd = torch.cuda.device_count()  # number of CUDA devices
     nw = min([os.cpu_count() // max(nd, 1), batch_size if batch_size > 1 else 0, workers])  # number of workers
+    if isinstance(getattr(dataset, "ims", None), RAMImageCache):
+        dataset.ims.share_stats(nw)  # per-worker RAM cache hit counters
     sampler = None if rank == -1 else SmartDistributedSampler(dataset, shuffle=shuffle)
     loader = DataLoader if image_weights else InfiniteDataLoader  # only DataLoader allows for attribute updates
     generator = torch.Generator()
@@ -105,6 +110,7 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
         overlap=False,
         rank=-1,
         seed=0,
+        reduced=False,
     ):
         """Initializes the dataset with image, label, and mask loading capabilities for training/testing."""
         super().__init__(
@@ -123,6 +129,7 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
             prefix,
             rank,
             seed,
+            reduced,
         )
         self.downsample_ratio = downsample_ratio
         self.overlap = overlap
@@ -236,7 +243,7 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
 
     def load_mosaic(self, index):
         """Loads 1 image + 3 random images into a 4-image YOLOv5 mosaic, adjusting labels and segments accordingly."""
-        labels4, segments4 = [], []
+        labels4, segments4, tiles = [], [], []
         s = self.img_size
         yc, xc = (int(random.uniform(-x, 2 * s + x)) for x in self.mosaic_border)  # mosaic center x, y
 
@@ -248,7 +255,6 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
 
             # place img in img4
             if i == 0:  # top left
-                img4 = np.full((s * 2, s * 2, img.shape[2]), 114, dtype=np.uint8)  # base image with 4 tiles
                 x1a, y1a, x2a, y2a = max(xc - w, 0), max(yc - h, 0), xc, yc  # xmin, ymin, xmax, ymax (large image)
                 x1b, y1b, x2b, y2b = w - (x2a - x1a), h - (y2a - y1a), w, h  # xmin, ymin, xmax, ymax (small image)
             elif i == 1:  # top right
@@ -261,7 +267,7 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
                 x1a, y1a, x2a, y2a = xc, yc, min(xc + w, s * 2), min(s * 2, yc + h)
                 x1b, y1b, x2b, y2b = 0, 0, min(w, x2a - x1a), min(y2a - y1a, h)
 
-            img4[y1a:y2a, x1a:x2a] = img[y1b:y2b, x1b:x2b]  # img4[ymin:ymax, xmin:xmax]
+            tiles.append((img[y1b:y2b, x1b:x2b], (x1a, y1a)))  # img4[ymin:ymax, xmin:xmax]
             padw = x1a - x1b
             padh = y1a - y1b
 
@@ -279,8 +285,12 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
             np.clip(x, 0, 2 * s, out=x)  # clip when using random_perspective()
         # img4, labels4 = replicate(img4, labels4)  # replicate
 
-        # Augment
-        img4, labels4, segments4 = copy_paste(img4, labels4, segments4, p=self.hyp["copy_paste"])
+        # Augment, warping tiles directly into the output unless copy-paste needs the canvas
+        canvas, img4 = (s * 2, s * 2, 3), None  # canvas shape
+        if self.hyp["copy_paste"] and segments4:
+            img4 = paste_tiles(canvas, tiles)
+            img4, labels4, segments4 = copy_paste(img4, labels4, segments4, p=self.hyp["copy_paste"])
+            tiles = None
         img4, labels4, segments4 = random_perspective(
             img4,
             labels4,
@@ -291,6 +301,8 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
             shear=self.hyp["shear"],
             perspective=self.hyp["perspective"],
             border=self.mosaic_border,
+            tiles=tiles,
+            shape=canvas,
         )  # border to remove
         return img4, labels4, segments4
 
@@ -304,6 +316,24 @@ class LoadImagesAndLabelsAndMasks(LoadImagesAndLabels):  # for training/testing
         return torch.stack(img, 0), torch.cat(label, 0), path, shapes, batched_masks
 
 
+def polygon2mask_box(img_size, polygon, color=1, downsample_ratio=1):
+    """Rasterizes (n,2) `polygon` within its bounding box only, returning the box of the polygon2mask() mask and its
+    (x, y) offset; the box is aligned to `downsample_ratio` so the mask is identical to polygon2mask() for image sizes
+    divisible by it.
+    """
+    r = downsample_ratio
+    nh, nw = img_size[0] // r, img_size[1] // r
+    xy = np.asarray(polygon).reshape(-1, 2).astype(np.int32)
+    x, y, w, h = cv2.boundingRect(xy)
+    x0, y0 = max(x // r, 0), max(y // r, 0)
+    x1, y1 = min((x + w - 1) // r + 1, nw), min((y + h - 1) // r + 1, nh)
+    if x1 <= x0 or y1 <= y0:  # outside the image
+        return np.zeros((0, 0), dtype=np.uint8), (0, 0)
+    mask = np.zeros(((y1 - y0) * r, (x1 - x0) * r), dtype=np.uint8)
+    cv2.fillPoly(mask, [xy - (x0 * r, y0 * r)], color=color)
+    return (cv2.resize(mask, (x1 - x0, y1 - y0)) if r > 1 else mask), (x0, y0)
+
+
 def polygon2mask(img_size, polygons, color=1, downsample_ratio=1):
     """
     Args:
@@ -332,35 +362,23 @@ def polygons2masks(img_size, polygons, color, downsample_ratio=1):
             N is the number of polygons,
             M is the number of points(Be divided by 2).
     """
-    masks = []
-    for si in range(len(polygons)):
-        mask = polygon2mask(img_size, [polygons[si].reshape(-1)], color, downsample_ratio)
-        masks.append(mask)
-    return np.array(masks)
+    masks = np.zeros((len(polygons), img_size[0] // downsample_ratio, img_size[1] // downsample_ratio), dtype=np.uint8)
+    for mask, polygon in zip(masks, polygons):
+        box, (x, y) = polygon2mask_box(img_size, polygon, color, downsample_ratio)
+        mask[y : y + box.shape[0], x : x + box.shape[1]] = box
+    return masks
 
 
 def polygons2masks_overlap(img_size, segments, downsample_ratio=1):
-    """Return a (640, 640) overlap mask."""
+    """Return a (640, 640) overlap mask, painting instances into one mask in descending area order."""
     masks = np.zeros(
         (img_size[0] // downsample_ratio, img_size[1] // downsample_ratio),
         dtype=np.int32 if len(segments) > 255 else np.uint8,
     )
-    areas = []
-    ms = []
-    for si in range(len(segments)):
-        mask = polygon2mask(
-            img_size,
-            [segments[si].reshape(-1)],
-            downsample_ratio=downsample_ratio,
-            color=1,
-        )
-        ms.append(mask)
-        areas.append(mask.sum())
-    areas = np.asarray(areas)
+    boxes = [polygon2mask_box(img_size, x, downsample_ratio=downsample_ratio) for x in segments]
+    areas = np.asarray([box.sum() for box, _ in boxes])
     index = np.argsort(-areas)
-    ms = np.array(ms)[index]
-    for i in range(len(segments)):
-        mask = ms[i] * (i + 1)
-        masks = masks + mask
-        masks = np.clip(masks, a_min=0, a_max=i + 1)
+    for i, j in enumerate(index):
+        box, (x, y) = boxes[j]
+        masks[y : y + box.shape[0], x : x + box.shape[1]][box > 0] = i + 1  # smaller instances painted on top
     return masks, index
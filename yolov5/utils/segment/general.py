@@ -4,22 +4,27 @@ import cv2
 import numpy as np
 import torch
 import torch.nn.functional as F
+from torch.nn.utils.rnn import pad_sequence
 
 
-def crop_mask(masks, boxes):
+def crop_mask(masks, boxes, inplace=False):
     """
     "Crop" predicted masks by zeroing out everything not in the predicted bbox. Vectorized by Chong (thanks Chong).
 
     Args:
         - masks should be a size [n, h, w] tensor of masks
         - boxes should be a size [n, 4] tensor of bbox coords in relative point form
+        - inplace crops masks in place, without any [n, h, w] temporaries
     """
     n, h, w = masks.shape
-    x1, y1, x2, y2 = torch.chunk(boxes[:, :, None], 4, 1)  # x1 shape(1,1,n)
-    r = torch.arange(w, device=masks.device, dtype=x1.dtype)[None, None, :]  # rows shape(1,w,1)
-    c = torch.arange(h, device=masks.device, dtype=x1.dtype)[None, :, None]  # cols shape(h,1,1)
-
-    return masks * ((r >= x1) * (r < x2) * (c >= y1) * (c < y2))
+    x1, y1, x2, y2 = torch.chunk(boxes[:, :, None], 4, 1)  # x1 shape(n,1,1)
+    r = torch.arange(w, device=masks.device, dtype=x1.dtype)[None, None, :]  # rows shape(1,1,w)
+    c = torch.arange(h, device=masks.device, dtype=x1.dtype)[None, :, None]  # cols shape(1,h,1)
+    inside_x = (r >= x1) & (r < x2)  # shape(n,1,w)
+    inside_y = (c >= y1) & (c < y2)  # shape(n,h,1)
+    if inplace:
+        return masks.mul_(inside_x).mul_(inside_y)
+    return masks * (inside_x & inside_y)
 
 
 def process_mask_upsample(protos, masks_in, bboxes, shape):
@@ -35,7 +40,7 @@ def process_mask_upsample(protos, masks_in, bboxes, shape):
     c, mh, mw = protos.shape  # CHW
     masks = (masks_in @ protos.float().view(c, -1)).sigmoid().view(-1, mh, mw)
     masks = F.interpolate(masks[None], shape, mode="bilinear", align_corners=False)[0]  # CHW
-    masks = crop_mask(masks, bboxes)  # CHW
+    masks = crop_mask(masks, bboxes, inplace=True)  # CHW
     return masks.gt_(0.5)
 
 
@@ -59,7 +64,7 @@ def process_mask(protos, masks_in, bboxes, shape, upsample=False):
     downsampled_bboxes[:, 3] *= mh / ih
     downsampled_bboxes[:, 1] *= mh / ih
 
-    masks = crop_mask(masks, downsampled_bboxes)  # CHW
+    masks = crop_mask(masks, downsampled_bboxes, inplace=True)  # CHW
     if upsample:
         masks = F.interpolate(masks[None], shape, mode="bilinear", align_corners=False)[0]  # CHW
     return masks.gt_(0.5)
@@ -84,10 +89,75 @@ def process_mask_native(protos, masks_in, bboxes, shape):
     masks = masks[:, top:bottom, left:right]
 
     masks = F.interpolate(masks[None], shape, mode="bilinear", align_corners=False)[0]  # CHW
-    masks = crop_mask(masks, bboxes)  # CHW
+    masks = crop_mask(masks, bboxes, inplace=True)  # CHW
     return masks.gt_(0.5)
 
 
+def proto_masks(protos, preds):
+    """
+    Computes the uncropped masks of all images in one bmm at protos resolution.
+    protos: [bs, mask_dim, mask_h, mask_w]
+    preds: list of [n, 6 + mask_dim] detections per image after nms
+
+    return: [bs, max(n), mask_h, mask_w] sigmoid masks, zero padded
+    """
+    b, c, mh, mw = protos.shape
+    coefs = pad_sequence([x[:, 6:] for x in preds], batch_first=True)  # [bs, max(n), mask_dim], zero padded
+    return torch.bmm(coefs.float(), protos.float().view(b, c, -1)).sigmoid_().view(b, coefs.shape[1], mh, mw)
+
+
+def native_masks(masks, det, shape):
+    """
+    Per-image process_mask_native() of proto_masks() output: crops the letterbox padding, upsamples to shape and crops.
+    masks: [>=n, mask_h, mask_w] sigmoid masks of one image
+    det: [n, >=4] detections, xyxy boxes in shape pixels
+    shape: (h, w) to upsample to.
+
+    return: [n, h, w] 0/1 masks
+    """
+    _, mh, mw = masks.shape
+    h, w = shape
+    gain = min(mh / h, mw / w)  # gain  = old / new
+    pad = (mw - w * gain) / 2, (mh - h * gain) / 2  # wh padding
+    top, left = int(pad[1]), int(pad[0])  # y, x
+    bottom, right = int(mh - pad[1]), int(mw - pad[0])
+    if not len(det):
+        return masks.new_zeros(0, h, w)
+    m = F.interpolate(masks[None, : len(det), top:bottom, left:right], (h, w), mode="bilinear", align_corners=False)[0]
+    return crop_mask(m, det[:, :4], inplace=True).gt_(0.5)
+
+
+def process_masks(protos, preds, shape, upsample=False, native=False):
+    """
+    Batched process_mask(), or process_mask_native() if native, computing the masks of all images in one bmm and
+    cropping and upsampling them on the protos device.
+    protos: [bs, mask_dim, mask_h, mask_w]
+    preds: list of [n, 6 + mask_dim] detections per image after nms, xyxy boxes in shape pixels
+    shape: input_image_size, (h, w), or if native a list of per-image (h, w) shapes to upsample to, i.e. im0 shapes.
+
+    return: list of [n, h, w] masks per image
+    """
+    b, c, mh, mw = protos.shape
+    n = [len(x) for x in preds]
+    masks = proto_masks(protos, preds)
+
+    if native:
+        shapes = [shape] * b if isinstance(shape[0], int) else shape
+        return [native_masks(m, det, s) for m, det, s in zip(masks, preds, shapes)]
+
+    ih, iw = shape
+    boxes = pad_sequence([x[:, :4] for x in preds], batch_first=True) * masks.new_tensor([mw / iw, mh / ih] * 2)
+    masks = crop_mask(masks.view(-1, mh, mw), boxes.view(-1, 4), inplace=True).view(masks.shape)  # at protos size
+    if upsample:
+        return [
+            F.interpolate(m[None, :k], shape, mode="bilinear", align_corners=False)[0].gt_(0.5)
+            if k
+            else m.new_zeros(0, ih, iw)
+            for m, k in zip(masks, n)
+        ]
+    return [m[:k] for m, k in zip(masks.gt_(0.5), n)]
+
+
 def scale_image(im1_shape, masks, im0_shape, ratio_pad=None):
     """
     img1_shape: model input shape, [h, w]
@@ -116,6 +186,46 @@ def scale_image(im1_shape, masks, im0_shape, ratio_pad=None):
     return masks
 
 
+def scale_masks(im1_shape, masks, im0_shape, ratio_pad=None):
+    """
+    Device scale_image(): crops the letterbox padding of [n, h, w] masks and resizes them to im0_shape on their device.
+    img1_shape: model input shape, [h, w]
+    img0_shape: origin pic shape, [h, w, 3]
+
+    return: [n, h0, w0] bool masks
+    """
+    if ratio_pad is None:  # calculate from im0_shape
+        gain = min(im1_shape[0] / im0_shape[0], im1_shape[1] / im0_shape[1])  # gain  = old / new
+        pad = (im1_shape[1] - im0_shape[1] * gain) / 2, (im1_shape[0] - im0_shape[0] * gain) / 2  # wh padding
+    else:
+        pad = ratio_pad[1]
+    top, left = int(pad[1]), int(pad[0])  # y, x
+    bottom, right = int(im1_shape[0] - pad[1]), int(im1_shape[1] - pad[0])
+    masks = masks[:, top:bottom, left:right].float()
+    if not len(masks):
+        return masks.new_zeros(0, *im0_shape[:2], dtype=torch.bool)
+    return F.interpolate(masks[None], im0_shape[:2], mode="bilinear", align_corners=False)[0] >= 0.5
+
+
+def masks2rle(masks):
+    """Run-length encodes [n, h, w] binary masks on their device to uncompressed COCO RLEs {'size': [h, w], 'counts':
+    [...]}, copying only the run boundaries to the host.
+    """
+    n, h, w = masks.shape
+    if not n:
+        return []
+    x = F.pad(masks.transpose(1, 2).reshape(n, -1).to(torch.uint8), (1, 1))  # column-major as COCO, zero ends
+    i, j = (x[:, 1:] != x[:, :-1]).nonzero(as_tuple=True)  # run boundaries
+    i, j = i.cpu().numpy(), j.cpu().numpy()
+    rles = []
+    for b in np.split(j, np.searchsorted(i, np.arange(1, n))):
+        counts = np.diff(b, prepend=0, append=h * w)  # alternating 0 and 1 runs, starting with 0s
+        rles.append(
+            {"size": [h, w], "counts": (counts[:-1] if counts[-1] == 0 and len(counts) > 1 else counts).tolist()}
+        )
+    return rles
+
+
 def mask_iou(mask1, mask2, eps=1e-7):
     """
     mask1: [N, n] m1 means number of predicted objects
@@ -129,6 +239,48 @@ def mask_iou(mask1, mask2, eps=1e-7):
     return intersection / (union + eps)
 
 
+def mask_boxes(masks):
+    """Returns the [n, 4] xyxy boxes in pixels enclosing the nonzero pixels of [n, h, w] masks, zeros if empty."""
+    n, h, w = masks.shape
+    rows, cols = masks.amax(2) > 0, masks.amax(1) > 0  # [n, h], [n, w]
+    x1, y1 = cols.byte().argmax(1), rows.byte().argmax(1)
+    x2, y2 = w - cols.flip(1).byte().argmax(1), h - rows.flip(1).byte().argmax(1)
+    return torch.stack((x1, y1, x2, y2), 1) * rows.any(1, keepdim=True)
+
+
+def mask_iou_cropped(mask1, mask2, eps=1e-7, budget=2**26):
+    """
+    Memory-bounded mask_iou(), computing intersections only within mask1 boxes, which contain them, if these are small
+    in total, else by one matmul, converting at most `budget` mask2 elements to float at once.
+    mask1: [N, h, w] m1 means number of gt objects
+    mask2: [M, h, w] m2 means number of predicted objects
+
+    return: masks iou, [N, M]
+    """
+    iou = torch.zeros(len(mask1), len(mask2), device=mask1.device)
+    if not iou.numel():
+        return iou
+    area1, area2 = mask1.sum((1, 2)).float(), mask2.sum((1, 2)).float()
+    boxes = mask_boxes(mask1)
+    if (boxes[:, 2:] - boxes[:, :2]).prod(1).sum() < mask1[0].numel():  # cropping reads less than one matmul
+        for i, (x1, y1, x2, y2) in enumerate(boxes.tolist()):
+            if x2 == x1:  # empty mask
+                continue
+            m1 = mask1[i, y1:y2, x1:x2].reshape(-1).float()
+            step = max(budget // len(m1), 1)
+            for j in range(0, len(mask2), step):
+                m2 = mask2[j : j + step, y1:y2, x1:x2]
+                intersection = m2.reshape(len(m2), -1).float() @ m1
+                iou[i, j : j + step] = intersection / (area1[i] + area2[j : j + step] - intersection + eps)
+    else:
+        m1 = mask1.flatten(1).float()
+        step = len(mask2) if mask2.is_floating_point() else max(budget // m1.shape[1], 1)  # float views need no copy
+        for j in range(0, len(mask2), step):
+            intersection = m1 @ mask2[j : j + step].flatten(1).float().T
+            iou[:, j : j + step] = intersection / (area1[:, None] + area2[None, j : j + step] - intersection + eps)
+    return iou
+
+
 def masks_iou(mask1, mask2, eps=1e-7):
     """
     mask1: [N, n] m1 means number of predicted objects
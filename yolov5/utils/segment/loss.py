@@ -5,7 +5,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from ..general import xywh2xyxy
-from ..loss import FocalLoss, smooth_BCE
+from ..loss import FocalLoss, grid_gain, match_targets, smooth_BCE
 from ..metrics import bbox_iou
 from ..torch_utils import de_parallel
 from .general import crop_mask
@@ -44,6 +44,7 @@ class ComputeLoss:
         self.nl = m.nl  # number of layers
         self.nm = m.nm  # number of masks
         self.anchors = m.anchors
+        self.off = torch.tensor([[0, 0], [1, 0], [0, 1], [-1, 0], [0, -1]], device=device).float() * 0.5  # j,k,l,m
         self.device = device
 
     def __call__(self, preds, targets, masks):  # predictions, targets, model
@@ -124,74 +125,17 @@ class ComputeLoss:
         """Prepares YOLOv5 targets for loss computation; inputs targets (image, class, x, y, w, h), output target
         classes/boxes.
         """
-        na, nt = self.na, targets.shape[0]  # number of anchors, targets
-        tcls, tbox, indices, anch, tidxs, xywhn = [], [], [], [], [], []
-        gain = torch.ones(8, device=self.device)  # normalized to gridspace gain
-        ai = torch.arange(na, device=self.device).float().view(na, 1).repeat(1, nt)  # same as .repeat_interleave(nt)
-        if self.overlap:
-            batch = p[0].shape[0]
-            ti = []
-            for i in range(batch):
-                num = (targets[:, 0] == i).sum()  # find number of targets of each image
-                ti.append(torch.arange(num, device=self.device).float().view(1, num).repeat(na, 1) + 1)  # (na, num)
-            ti = torch.cat(ti, 1)  # (na, nt)
-        else:
-            ti = torch.arange(nt, device=self.device).float().view(1, nt).repeat(na, 1)
-        targets = torch.cat((targets.repeat(na, 1, 1), ai[..., None], ti[..., None]), 2)  # append anchor indices
-
-        g = 0.5  # bias
-        off = (
-            torch.tensor(
-                [
-                    [0, 0],
-                    [1, 0],
-                    [0, 1],
-                    [-1, 0],
-                    [0, -1],  # j,k,l,m
-                    # [1, 1], [1, -1], [-1, 1], [-1, -1],  # jk,jm,lk,lm
-                ],
-                device=self.device,
-            ).float()
-            * g
-        )  # offsets
-
-        for i in range(self.nl):
-            anchors, shape = self.anchors[i], p[i].shape
-            gain[2:6] = torch.tensor(shape)[[3, 2, 3, 2]]  # xyxy gain
-
-            # Match targets to anchors
-            t = targets * gain  # shape(3,n,7)
-            if nt:
-                # Matches
-                r = t[..., 4:6] / anchors[:, None]  # wh ratio
-                j = torch.max(r, 1 / r).max(2)[0] < self.hyp["anchor_t"]  # compare
-                # j = wh_iou(anchors, t[:, 4:6]) > model.hyp['iou_t']  # iou(3,n)=wh_iou(anchors(3,2), gwh(n,2))
-                t = t[j]  # filter
-
-                # Offsets
-                gxy = t[:, 2:4]  # grid xy
-                gxi = gain[[2, 3]] - gxy  # inverse
-                j, k = ((gxy % 1 < g) & (gxy > 1)).T
-                l, m = ((gxi % 1 < g) & (gxi > 1)).T
-                j = torch.stack((torch.ones_like(j), j, k, l, m))
-                t = t.repeat((5, 1, 1))[j]
-                offsets = (torch.zeros_like(gxy)[None] + off[:, None])[j]
-            else:
-                t = targets[0]
-                offsets = 0
-
-            # Define
-            bc, gxy, gwh, at = t.chunk(4, 1)  # (image, class), grid xy, grid wh, anchors
-            (a, tidx), (b, c) = at.long().T, bc.long().T  # anchors, image, class
-            gij = (gxy - offsets).long()
-            gi, gj = gij.T  # grid indices
-
-            # Append
-            indices.append((b, a, gj.clamp_(0, shape[2] - 1), gi.clamp_(0, shape[3] - 1)))  # image, anchor, grid
-            tbox.append(torch.cat((gxy - gij, gwh), 1))  # box
-            anch.append(anchors[a])  # anchors
-            tcls.append(c)  # class
-            tidxs.append(tidx)
-            xywhn.append(torch.cat((gxy, gwh), 1) / gain[2:6])  # xywh normalized
-
-        return tcls, tbox, indices, anch, tidxs, xywhn
+        ti = torch.arange(len(targets), device=self.device)  # target indices
+        if self.overlap:  # 1-based indices within each image, targets are sorted by image
+            b = targets[:, 0].contiguous()
+            ti += 1 - torch.searchsorted(b, b)
+        gain = grid_gain(tuple(x.shape for x in p), self.device)  # normalized to gridspace gain
+        i, a, tidx, t, gij = match_targets(targets, gain, self.anchors, self.hyp["anchor_t"], self.off)
+        n = torch.bincount(i, minlength=self.nl).tolist()  # targets per layer
+        b, c = t[:, :2].long().T  # image, class
+        gi, gj = gij.T  # grid indices
+        tbox = torch.cat((t[:, 2:4] - gij, t[:, 4:6]), 1)  # box
+        xywhn = t[:, 2:6] / gain[i, 2:6]  # xywh normalized
+        y = b, a, gj, gi, c, tbox, self.anchors[i, a], ti[tidx], xywhn
+        b, a, gj, gi, tcls, tbox, anch, tidxs, xywhn = (x.split(n) for x in y)
+        return list(tcls), list(tbox), list(zip(b, a, gj, gi)), list(anch), list(tidxs), list(xywhn)
@@ -0,0 +1,242 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""Buffered detection result sinks."""
+
+import csv
+import json
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from utils.general import check_requirements, xyxy2xywh
+
+
+class ResultSink:
+    """Base class for buffered detection result writers, flushing every `flush_interval` seconds and on close()."""
+
+    suffix = ""  # output file suffix
+
+    def __init__(self, save_dir, names, save_conf=False, save_format=0, flush_interval=1.0):
+        """Initializes a sink writing to `save_dir`, with class `names`, txt label options and a flush interval."""
+        self.save_dir = Path(save_dir)
+        self.file = self.save_dir / f"predictions{self.suffix}"
+        self.names = names
+        self.save_conf = save_conf  # txt: append confidences
+        self.save_format = save_format  # txt: 0 for YOLO normalized xywh, 1 for Pascal-VOC normalized xyxy
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()  # write() may be called from detect.py --pipeline writer threads
+        self.t = time.time()  # last flush time
+
+    def write(self, path, det, shape, frame=None):
+        """Buffers the detections `det(n,6)` (pixel xyxy, conf, cls) of image `path` with shape `(h,w,...)`, where
+        `frame` is None for images and the frame number for videos/streams.
+        """
+        det = det.cpu().numpy() if isinstance(det, torch.Tensor) else np.asarray(det)
+        with self.lock:
+            self.add(Path(path), det, shape, frame)
+            if time.time() - self.t > self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        """Writes all buffered results to disk."""
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        """Flushes buffered results and closes open file handles."""
+        with self.lock:
+            self._flush()
+            self._close()
+
+    def add(self, path, det, shape, frame):
+        """Buffers results for one image, implemented by subclasses."""
+        raise NotImplementedError
+
+    def _flush(self):
+        """Writes buffered results, implemented by subclasses and called with the lock held."""
+        self.t = time.time()
+
+    def _close(self):
+        """Closes open file handles, called with the lock held."""
+        pass
+
+    def __enter__(self):
+        """Returns the sink for use as a context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Closes the sink on context exit."""
+        self.close()
+
+
+class CSVSink(ResultSink):
+    """Writes 'Image Name, Prediction, Confidence' rows to predictions.csv through one open file handle."""
+
+    suffix = ".csv"
+
+    def __init__(self, *args, **kwargs):
+        """Initializes the CSV sink; predictions.csv is opened on the first non-empty flush."""
+        super().__init__(*args, **kwargs)
+        self.rows = []
+        self.f = self.writer = None
+
+    def add(self, path, det, shape, frame):
+        """Buffers one row per detection, in reversed (ascending confidence) order as drawn by detect.py."""
+        self.rows.extend(
+            {"Image Name": path.name, "Prediction": self.names[int(c)], "Confidence": f"{conf:.2f}"}
+            for *_, conf, c in det[::-1]
+        )
+
+    def _flush(self):
+        """Writes buffered rows, opening predictions.csv in append mode with a header if it is new."""
+        if self.rows:
+            if self.f is None:
+                exists = self.file.is_file() and self.file.stat().st_size
+                self.f = open(self.file, mode="a", newline="")
+                self.writer = csv.DictWriter(self.f, fieldnames=("Image Name", "Prediction", "Confidence"))
+                if not exists:
+                    self.writer.writeheader()
+            self.writer.writerows(self.rows)
+            self.f.flush()
+            self.rows = []
+        super()._flush()
+
+    def _close(self):
+        """Closes predictions.csv."""
+        if self.f is not None:
+            self.f.close()
+
+
+class TxtSink(ResultSink):
+    """Writes YOLO *.txt labels to save_dir/labels, one file per image or video frame opened once per flush."""
+
+    def __init__(self, *args, **kwargs):
+        """Initializes the txt sink and creates the labels directory."""
+        super().__init__(*args, **kwargs)
+        self.file = self.save_dir / "labels"
+        self.file.mkdir(parents=True, exist_ok=True)
+        self.lines = {}  # {txt file: [lines]}
+
+    def add(self, path, det, shape, frame):
+        """Buffers one 'cls x y w h [conf]' line per detection with coordinates normalized by image size."""
+        if not len(det):
+            return
+        gn = np.array(shape, dtype=np.float32)[[1, 0, 1, 0]]  # normalization gain whwh
+        xyxy, conf, cls = det[::-1, :4], det[::-1, 4], det[::-1, 5]
+        coords = (xyxy2xywh(xyxy) if self.save_format == 0 else xyxy) / gn  # normalized xywh or xyxy
+        x = np.concatenate((cls[:, None], coords, conf[:, None]), 1) if self.save_conf else np.c_[cls, coords]
+        file = self.file / f"{path.stem}{'' if frame is None else f'_{frame}'}.txt"
+        self.lines.setdefault(file, []).extend(("%g " * x.shape[1]).rstrip() % tuple(line) + "\n" for line in x)
+
+    def _flush(self):
+        """Appends buffered lines, opening each label file once."""
+        for file, lines in self.lines.items():
+            with open(file, "a") as f:
+                f.writelines(lines)
+        self.lines = {}
+        super()._flush()
+
+
+class NDJSONSink(ResultSink):
+    """Writes one JSON line per image to predictions.ndjson with pixel xyxy boxes, classes and confidences."""
+
+    suffix = ".ndjson"
+
+    def __init__(self, *args, **kwargs):
+        """Initializes the NDJSON sink, opening predictions.ndjson in append mode."""
+        super().__init__(*args, **kwargs)
+        self.lines = []
+        self.f = open(self.file, mode="a")
+
+    def add(self, path, det, shape, frame):
+        """Buffers one JSON record for the image, including images without detections."""
+        record = {
+            "image": path.name,
+            "frame": frame,
+            "shape": [int(shape[0]), int(shape[1])],
+            "detections": [
+                {
+                    "class": int(c),
+                    "name": self.names[int(c)],
+                    "confidence": round(conf, 5),
+                    "box": [round(x, 2) for x in b],
+                }
+                for *b, conf, c in det.tolist()
+            ],
+        }
+        self.lines.append(json.dumps(record) + "\n")
+
+    def _flush(self):
+        """Writes buffered lines and flushes the file handle."""
+        self.f.writelines(self.lines)
+        self.f.flush()
+        self.lines = []
+        super()._flush()
+
+    def _close(self):
+        """Closes predictions.ndjson."""
+        self.f.close()
+
+
+class ParquetSink(ResultSink):
+    """Writes one row per detection to predictions.parquet, appending one row group per flush."""
+
+    suffix = ".parquet"
+
+    def __init__(self, *args, **kwargs):
+        """Initializes the Parquet sink, checking for pyarrow; the file is created on the first non-empty flush."""
+        super().__init__(*args, **kwargs)
+        check_requirements("pyarrow")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa, self.pq = pa, pq
+        self.schema = pa.schema(
+            [
+                ("image", pa.string()),
+                ("frame", pa.int64()),
+                ("class", pa.int32()),
+                ("name", pa.string()),
+                ("confidence", pa.float32()),
+                *((k, pa.float32()) for k in ("x1", "y1", "x2", "y2")),
+            ]
+        )
+        self.writer = None
+        self.images, self.frames, self.dets = [], [], []
+
+    def add(self, path, det, shape, frame):
+        """Buffers the detections of one image as rows."""
+        if len(det):
+            self.images += [path.name] * len(det)
+            self.frames += [frame] * len(det)
+            self.dets.append(det.astype(np.float32))
+
+    def _flush(self):
+        """Writes buffered rows as a new row group."""
+        if self.dets:
+            det = np.concatenate(self.dets, 0)
+            cls = det[:, 5].astype(np.int32)
+            columns = [
+                self.images,
+                self.frames,
+                cls,
+                [self.names[c] for c in cls.tolist()],
+                det[:, 4],
+                *det[:, :4].T,
+            ]
+            if self.writer is None:
+                self.writer = self.pq.ParquetWriter(self.file, self.schema)
+            columns = [self.pa.array(x, type=f.type) for x, f in zip(columns, self.schema)]
+            self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+            self.images, self.frames, self.dets = [], [], []
+        super()._flush()
+
+    def _close(self):
+        """Closes predictions.parquet."""
+        if self.writer is not None:
+            self.writer.close()
+
+
+SINKS = {"csv": CSVSink, "txt": TxtSink, "ndjson": NDJSONSink, "parquet": ParquetSink}  # --sinks arguments
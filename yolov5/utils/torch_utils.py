@@ -4,11 +4,14 @@
 import math
 import os
 import platform
+import shutil
 import subprocess
+import threading
 import time
 import warnings
 from contextlib import contextmanager
 from copy import deepcopy
+from functools import reduce
 from pathlib import Path
 
 import torch
@@ -399,6 +402,13 @@ def smart_hub_load(repo="ultralytics/yolov5", model="yolov5s", **kwargs):
 
 def smart_resume(ckpt, optimizer, ema=None, weights="yolov5s.pt", epochs=300, resume=True):
     """Resumes training from a checkpoint, updating optimizer, ema, and epochs, with optional resume verification."""
+    missing = [k for k in ("epoch", "best_fitness", "model", "optimizer") if k not in ckpt]
+    assert not missing and isinstance(ckpt["model"], nn.Module), (
+        f"{weights} is not a valid checkpoint, missing {missing}"
+    )
+    tmp = Path(weights).with_name(f"{Path(weights).name}.tmp")
+    if tmp.exists():
+        LOGGER.warning(f"WARNING ⚠️ Ignoring incomplete checkpoint {tmp}, resuming from last complete save {weights}")
     best_fitness = 0.0
     start_epoch = ckpt["epoch"] + 1
     if ckpt["optimizer"] is not None:
@@ -419,6 +429,68 @@ def smart_resume(ckpt, optimizer, ema=None, weights="yolov5s.pt", epochs=300, re
     return best_fitness, start_epoch, epochs
 
 
+def cpu_snapshot(x):
+    """Returns nested dicts, lists and tuples `x` with tensors copied to CPU and modules, which must be copies, moved to
+    CPU.
+    """
+    if isinstance(x, torch.Tensor):
+        return x.detach().to("cpu", copy=True)
+    if isinstance(x, nn.Module):
+        return x.cpu()
+    if isinstance(x, dict):
+        return {k: cpu_snapshot(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return type(x)(cpu_snapshot(v) for v in x)
+    return x
+
+
+class CheckpointWriter:
+    """Saves checkpoints on a background thread, one at a time, each to temporary files renamed into place so that
+    checkpoint files are always complete. Save callbacks run on the calling thread once wait() confirms the write.
+    """
+
+    def __init__(self):
+        """Initializes an idle writer; `done` is set whenever no save is in progress."""
+        self.done = threading.Event()
+        self.done.set()
+        self.error = None
+        self.callback = None  # of the save in progress
+
+    def save(self, ckpt, files, callback=None):
+        """Snapshots `ckpt` to CPU and writes it to all `files` in the background, serializing it once; waits for the
+        previous save first. `callback()` runs in the wait() confirming the write, i.e. at the next save() or wait().
+        """
+        self.wait()
+        ckpt = cpu_snapshot(ckpt)
+        self.done.clear()
+        self.callback = callback
+        threading.Thread(target=self._write, args=(ckpt, [Path(f) for f in files])).start()
+
+    def _write(self, ckpt, files):
+        """Writes `ckpt` to a temporary file for the first of `files`, copies it for the others and renames all."""
+        try:
+            tmp = [f.with_name(f"{f.name}.tmp") for f in files]
+            torch.save(ckpt, tmp[0])
+            for t in tmp[1:]:
+                shutil.copyfile(tmp[0], t)
+            for t, f in zip(tmp, files):
+                os.replace(t, f)  # atomic
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def wait(self):
+        """Waits for the save in progress, raising its exception if it failed, else running its callback."""
+        self.done.wait()
+        callback, self.callback = self.callback, None
+        if self.error:
+            e, self.error = self.error, None
+            raise e
+        if callback:
+            callback()
+
+
 class EarlyStopping:
     """Implements early stopping to halt training when no improvement is observed for a specified number of epochs."""
 
@@ -453,27 +525,53 @@ class ModelEMA:
     For EMA details see https://www.tensorflow.org/api_docs/python/tf/train/ExponentialMovingAverage.
     """
 
-    def __init__(self, model, decay=0.9999, tau=2000, updates=0):
-        """Initializes EMA with model parameters, decay rate, tau for decay adjustment, and update count; sets model to
-        evaluation mode.
+    def __init__(self, model, decay=0.9999, tau=2000, updates=0, every=1):
+        """Initializes EMA with model parameters, decay rate, tau for decay adjustment, update count, and update interval
+        `every` in steps; sets model to evaluation mode.
         """
         self.ema = deepcopy(de_parallel(model)).eval()  # FP32 EMA
         self.updates = updates  # number of EMA updates
         self.decay = lambda x: decay * (1 - math.exp(-x / tau))  # decay exponential ramp (to help early epochs)
+        self.every = every  # update every `every` steps with the decay of all of them
+        self.model, self.tensors = None, None  # model and (EMA, model) tensors, see locate()
         for p in self.ema.parameters():
             p.requires_grad_(False)
 
+    @staticmethod
+    def locate(module, keys):
+        """Returns the parameters of `module` for state_dict `keys` and the (module._buffers, name) locations of its
+        buffers, as .half(), .to() etc. keep parameters but replace buffers, i.e. the EMA in val.py.
+        """
+        params, buffers = [], []
+        for k in keys:
+            path, _, name = k.rpartition(".")
+            m = reduce(getattr, path.split("."), module) if path else module
+            if name in m._parameters:
+                params.append(m._parameters[name])
+            else:
+                buffers.append((m._buffers, name))
+        return params, buffers
+
     def update(self, model):
-        """Updates the Exponential Moving Average (EMA) parameters based on the current model's parameters."""
+        """Updates the Exponential Moving Average (EMA) parameters based on the current model's parameters, every
+        `every` steps with foreach ops and the product of the decays of all steps since the last update.
+        """
         self.updates += 1
-        d = self.decay(self.updates)
-
-        msd = de_parallel(model).state_dict()  # model state_dict
-        for k, v in self.ema.state_dict().items():
-            if v.dtype.is_floating_point:  # true for FP16 and FP32
-                v *= d
-                v += (1 - d) * msd[k].detach()
-        # assert v.dtype == msd[k].dtype == torch.float32, f'{k}: EMA {v.dtype} and model {msd[k].dtype} must be FP32'
+        if self.updates % self.every:
+            return
+        d = math.prod(self.decay(self.updates - i) for i in range(self.every))
+
+        model = de_parallel(model)
+        if model is not self.model:  # collect floating point tensors once
+            keys = [k for k, v in self.ema.state_dict().items() if v.dtype.is_floating_point]  # true for FP16 and FP32
+            self.model, self.tensors = model, [self.locate(m, keys) for m in (self.ema, model)]
+        ema, msd = (params + [b[name] for b, name in buffers] for params, buffers in self.tensors)
+        with torch.no_grad():
+            if hasattr(torch, "_foreach_lerp_") and all(v.dtype == x.dtype for v, x in zip(ema, msd)):
+                torch._foreach_lerp_(ema, msd, 1 - d)
+            else:  # mixed precision, i.e. FP16 EMA after validation
+                torch._foreach_mul_(ema, d)
+                torch._foreach_add_(ema, msd, alpha=1 - d)
 
     def update_attr(self, model, include=(), exclude=("process_group", "reducer")):
         """Updates EMA attributes by copying specified attributes from model to EMA, excluding certain attributes by
@@ -193,9 +193,12 @@ def run(
     conf_thres=0.001,  # confidence threshold
     iou_thres=0.6,  # NMS IoU threshold
     max_det=300,  # maximum detections per image
+    topk=0,  # maximum NMS candidates per image (0 to disable)
+    topk_cls=0,  # maximum NMS candidates per class (0 to disable)
     task="val",  # train, val, test, speed or study
     device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
     workers=8,  # max dataloader workers (per RANK in DDP mode)
+    reduced_decode=False,  # decode large JPEGs at reduced resolution
     single_cls=False,  # treat as single-class dataset
     augment=False,  # augmented inference
     verbose=False,  # verbose output
@@ -228,9 +231,13 @@ def run(
         conf_thres (float, optional): Confidence threshold for object detection. Default is 0.001.
         iou_thres (float, optional): IoU threshold for Non-Maximum Suppression (NMS). Default is 0.6.
         max_det (int, optional): Maximum number of detections per image. Default is 300.
+        topk (int, optional): Maximum NMS candidates per image, selected by objectness before class scoring. Default is
+            0 (disabled).
+        topk_cls (int, optional): Maximum NMS candidates per class. Default is 0 (disabled).
         task (str, optional): Task type - 'train', 'val', 'test', 'speed', or 'study'. Default is 'val'.
         device (str, optional): Device to use for computation, e.g., '0' or '0,1,2,3' for CUDA or 'cpu' for CPU. Default is ''.
         workers (int, optional): Number of dataloader workers. Default is 8.
+        reduced_decode (bool, optional): Decode JPEGs at least twice `imgsz` at a reduced DCT scale. Default is False.
         single_cls (bool, optional): Treat dataset as a single class. Default is False.
         augment (bool, optional): Enable augmented inference. Default is False.
         verbose (bool, optional): Enable verbose output. Default is False.
@@ -311,6 +318,7 @@ def run(
             rect=rect,
             workers=workers,
             prefix=colorstr(f"{task}: "),
+            reduced_decode=reduced_decode,
         )[0]
 
     seen = 0
@@ -349,7 +357,15 @@ def run(
         lb = [targets[targets[:, 0] == i, 1:] for i in range(nb)] if save_hybrid else []  # for autolabelling
         with dt[2]:
             preds = non_max_suppression(
-                preds, conf_thres, iou_thres, labels=lb, multi_label=True, agnostic=single_cls, max_det=max_det
+                preds,
+                conf_thres,
+                iou_thres,
+                labels=lb,
+                multi_label=True,
+                agnostic=single_cls,
+                max_det=max_det,
+                topk=topk,
+                topk_cls=topk_cls,
             )
 
         # Metrics
@@ -479,9 +495,12 @@ def parse_opt():
         conf_thres (float, optional): Confidence threshold for predictions. Default is 0.001.
         iou_thres (float, optional): IoU threshold for Non-Max Suppression (NMS). Default is 0.6.
         max_det (int, optional): Maximum number of detections per image. Default is 300.
+        topk (int, optional): Maximum NMS candidates per image by objectness, 0 to disable. Default is 0.
+        topk_cls (int, optional): Maximum NMS candidates per class, 0 to disable. Default is 0.
         task (str, optional): Task type - options are 'train', 'val', 'test', 'speed', or 'study'. Default is 'val'.
         device (str, optional): Device to run the model on. e.g., '0' or '0,1,2,3' or 'cpu'. Default is empty to let the system choose automatically.
         workers (int, optional): Maximum number of dataloader workers per rank in DDP mode. Default is 8.
+        reduced_decode (bool, optional): If set, decodes large JPEGs at reduced resolution. Default is False.
         single_cls (bool, optional): If set, treats the dataset as a single-class dataset. Default is False.
         augment (bool, optional): If set, performs augmented inference. Default is False.
         verbose (bool, optional): If set, reports mAP by class. Default is False.
@@ -522,9 +541,12 @@ def parse_opt():
     parser.add_argument("--conf-thres", type=float, default=0.001, help="confidence threshold")
     parser.add_argument("--iou-thres", type=float, default=0.6, help="NMS IoU threshold")
     parser.add_argument("--max-det", type=int, default=300, help="maximum detections per image")
+    parser.add_argument("--topk", type=int, default=0, help="maximum NMS candidates per image (0 to disable)")
+    parser.add_argument("--topk-cls", type=int, default=0, help="maximum NMS candidates per class (0 to disable)")
     parser.add_argument("--task", default="val", help="train, val, test, speed or study")
     parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
     parser.add_argument("--workers", type=int, default=8, help="max dataloader workers (per RANK in DDP mode)")
+    parser.add_argument("--reduced-decode", action="store_true", help="decode large JPEGs at reduced resolution")
     parser.add_argument("--single-cls", action="store_true", help="treat as single-class dataset")
     parser.add_argument("--augment", action="store_true", help="augmented inference")
     parser.add_argument("--verbose", action="store_true", help="report mAP by class")
@@ -4,14 +4,15 @@ from sensor_msgs.msg import Image
 from cv_bridge import CvBridge
 import cv2
 import torch
+from pathlib import Path
 
 class YoloHumanDetector(Node):
     def __init__(self):
         super().__init__('yolo_human_detector')
         self.sub = self.create_subscription(Image, '/image_raw', self.callback, 10)
         self.bridge = CvBridge()
-        self.model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True)
-        self.model.classes = [0]  # Class 0 = person
+        self.model = torch.hub.load(str(Path(__file__).parent), 'yolov5s', source='local', pretrained=True,
+                                    keep_classes=[0])  # Detect() head sliced to class 0 = person
         self.get_logger().info('YOLOv5 Human Detector Initialized')
 
     def callback(self, msg):